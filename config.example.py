@@ -19,3 +19,139 @@ MQTT_DEVICE_NAME = "Living Room Dashboard"  # Friendly name for Home Assistant
 
 # WebSocket port for MQTT bridge (browser connects here)
 WS_PORT = 8766
+
+# Dashboard state is only published when it changes; changes within the
+# coalesce window (tab switches, volume drags) go out as one message.
+# Uptime is published separately to skylight/<device_id>/uptime.
+MQTT_STATE_COALESCE_SECONDS = 2.0
+MQTT_UPTIME_INTERVAL = 300
+
+# HTTP server mode: "threaded" spawns a thread per connection, "pool" uses a
+# fixed set of workers and answers 503 (Retry-After) when the queue is full,
+# "asyncio" runs HTTP, the browser WebSocket (on PORT and WS_PORT) and the
+# Home Assistant client on one event loop with handlers in the worker pool
+HTTP_SERVER_MODE = "pool"
+# In pool mode HTTP_WORKERS caps requests being served at once, not open
+# connections: idle keep-alive connections wait on a selector without a worker,
+# and camera streams run on threads of their own.
+HTTP_WORKERS = 16                    # Worker threads in pool mode
+HTTP_QUEUE_SIZE = 64                 # Connections waiting for a worker before shedding
+HTTP_REQUEST_TIMEOUT = 30            # Socket timeout per request (seconds)
+
+# HTTP/1.1 keep-alive: browsers reuse one connection for the dashboard's API calls
+HTTP_KEEPALIVE = True
+HTTP_KEEPALIVE_TIMEOUT = 15          # Close idle connections after this many seconds
+
+# Compress JSON/text API responses (and proxied HA bodies) for clients that accept it.
+# Lower COMPRESSION_LEVEL to save CPU on low-power hosts, raise it to save bandwidth.
+COMPRESSION_ENABLED = True
+COMPRESSION_MIN_SIZE = 1024          # Bytes; smaller responses are sent uncompressed
+COMPRESSION_LEVEL = 5                # 1 (fastest) .. 9 (smallest)
+
+# Screenshot history: the last N screenshots are kept on disk for diagnosing
+# blank or frozen screens (GET /api/screenshot/history). Thumbnails need Pillow.
+SCREENSHOT_HISTORY_SIZE = 50         # 0 disables history
+SCREENSHOT_HISTORY_DIR = "screenshots"
+SCREENSHOT_THUMBNAIL_SIZE = (320, 200)
+
+# Kiosk health: the server asks the browser for a screenshot every
+# HEALTH_CHECK_INTERVAL seconds, checks it for a blank page and watches the
+# browser heartbeat. GET /api/health answers 200 (ok) or 503 (unhealthy) for
+# kiosk-watchdog.sh or systemd. Pillow gives a more precise blank check.
+HEALTH_CHECK_INTERVAL = 60           # 0 disables periodic captures
+HEALTH_HEARTBEAT_TIMEOUT = 90
+HEALTH_CAPTURE_TIMEOUT = 30
+HEALTH_BLANK_THRESHOLD = 2           # Consecutive blank screenshots before unhealthy
+HEALTH_BLANK_MAX_STDDEV = 4.0
+HEALTH_BLANK_MAX_PNG_BPP = 0.01
+# Only the kiosk's own browser is checked and asked for screenshots, never the
+# other screens. By default that is a browser running on this machine; set
+# its IP if the kiosk display runs elsewhere.
+HEALTH_KIOSK_ADDRESS = None
+
+# Home Assistant state mirror: /api/states and /api/states/<entity_id> are
+# answered from a replica kept current over the HA WebSocket. Requests go to
+# Home Assistant directly while the replica is syncing or the socket is down.
+HA_STATE_MIRROR = True
+HA_STATE_MAX_AGE = 120               # Seconds without HA contact before falling back
+
+# Broadcasts to the dashboard carry sequence numbers; a screen that reconnects
+# gets the ones it missed from this many recent messages, and reloads its data
+# only when it was gone for longer than that.
+BROADCAST_LOG_SIZE = 500
+
+# Calendar cache: calendar.get_events calls from the dashboard are answered
+# from one shared per-calendar window, refreshed when Home Assistant reports
+# a calendar change (or after CALENDAR_CACHE_TTL seconds for remote calendars)
+CALENDAR_CACHE = True
+CALENDAR_CACHE_TTL = 300
+CALENDAR_CACHE_MAX_DAYS = 400
+
+# Todo replica: ticking, adding and removing todos updates the server's copy of
+# the list (and every screen) immediately; the change is forwarded to Home
+# Assistant in the background and retried if Home Assistant is slow or down.
+TODO_REPLICA = True
+TODO_REPLICA_TTL = 600               # Seconds before a list is refetched without a change event
+TODO_FORWARD_ATTEMPTS = 8            # Tries per edit before the list is resynced from HA
+
+# TTS cache: audio from Home Assistant's TTS is stored on disk and reused for
+# repeated phrases (hourly callouts, prayer and event reminders). Phrases due
+# in the next few hours are rendered ahead of time.
+TTS_CACHE = True
+TTS_CACHE_MAX_MB = 100
+TTS_CACHE_MAX_FILES = 2000
+
+# Camera hub: camera streams and snapshots opened by the dashboard share one
+# upstream connection per camera, however many screens are watching. The
+# last frame is kept in memory so a newly opened viewer shows it at once.
+CAMERA_HUB = True
+CAMERA_SNAPSHOT_INTERVAL = 2         # Seconds between snapshots for cameras without MJPEG
+CAMERA_IDLE_TIMEOUT = 15             # Seconds the upstream stays open after the last viewer
+CAMERA_FRAME_TIMEOUT = 10
+
+# Quran cache: verse text and recitation audio from alquran.cloud are fetched
+# through the server and kept on disk, so the Quran tab also works offline.
+# Surahs listed in QURAN_PREFETCH are downloaded (with their audio) during
+# QURAN_PREFETCH_HOURS.
+QURAN_CACHE = True
+QURAN_API_URL = "https://api.alquran.cloud"
+QURAN_AUDIO_HOSTS = ('cdn.islamic.network', 'cdn.alquran.cloud')
+QURAN_CACHE_MAX_MB = 1000
+QURAN_PREFETCH = []                  # e.g. ['surah/36/ar.alafasy', 'surah/36/en.sahih']
+QURAN_PREFETCH_HOURS = (1, 5)        # Local hours [start, end)
+
+# NAS I/O: photo-folder access (listing, reading, browsing) runs on its own
+# threads with deadlines. A mount that keeps timing out or erroring is marked
+# unavailable: photos are then served from the local cache without touching
+# it, and the mount is re-checked in the background.
+NAS_IO_WORKERS = 4                   # Threads per mount
+NAS_IO_TIMEOUT = 5                   # Seconds for a stat or one image read
+NAS_SCAN_TIMEOUT = 30                # Seconds for listing a folder
+NAS_FAILURE_THRESHOLD = 3
+NAS_PROBE_INTERVAL = 30
+
+# Photo folder picker: listings are cached until the folder changes and
+# returned in pages of FOLDER_BROWSE_PAGE_SIZE subfolders
+FOLDER_CACHE_SIZE = 500
+FOLDER_BROWSE_PAGE_SIZE = 200
+
+# Home Assistant circuit breaker: after HA_BREAKER_THRESHOLD consecutive
+# failed calls (HA restarting or unreachable) the server answers at once with
+# the last good copy of a request, or a 503, instead of waiting out the
+# timeout, and tells the screens to stop retrying until HA answers again.
+# HA_ROUTE_DEADLINES caps how long each kind of proxied call may take.
+HA_BREAKER_THRESHOLD = 3
+HA_BREAKER_COOLDOWN = 5              # Seconds before re-checking HA (doubles while it stays down)
+HA_BREAKER_MAX_COOLDOWN = 60
+HA_ROUTE_DEADLINES = {
+    '/api/camera_proxy_stream/': 10,
+    '/api/camera_proxy/': 10,
+    '/api/services/': 15,
+    '/api/history/': 20,
+    '/api/calendars/': 15,
+    '/api/tts_get_url': 30,
+    '/api/tts_proxy/': 30,
+    '/api/states': 5,
+    '/api/': 8,
+}
+HA_STALE_CACHE_SIZE = 200
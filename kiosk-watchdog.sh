@@ -1,9 +1,8 @@
 #!/bin/bash
-# Kiosk watchdog - detects white/blank screens and restarts Chrome
+# Kiosk watchdog - restarts Chrome when the dashboard reports a blank or hung screen
 # Checks every 60 seconds
 
 LOG_FILE="$HOME/skylight-dashboard/logs/kiosk-watchdog.log"
-SCREENSHOT="/tmp/kiosk-check.png"
 KIOSK_URL="https://10.0.0.151:8765/index.html"
 
 mkdir -p "$(dirname "$LOG_FILE")"
@@ -42,43 +41,25 @@ restart_kiosk() {
 }
 
 check_screen() {
-    # Take screenshot
-    DISPLAY=:0 gnome-screenshot -f "$SCREENSHOT" 2>/dev/null
-    
-    if [ ! -f "$SCREENSHOT" ]; then
-        log "ERROR: Could not take screenshot"
+    # server.py requests screenshots from the browser itself, checks them for a
+    # blank page and tracks the browser heartbeat; just ask it for the verdict
+    HEALTH=$(curl -s --max-time 5 https://10.0.0.151:8765/api/health)
+
+    if [ -z "$HEALTH" ]; then
+        log "ERROR: Could not read dashboard health"
         return 1
     fi
-    
-    # Check if image is mostly white using ImageMagick
-    # Get the mean color values (0-255 scale)
-    if command -v convert &>/dev/null; then
-        # Get percentage of white-ish pixels (RGB all > 250)
-        WHITE_PCT=$(convert "$SCREENSHOT" -fuzz 5% -fill black +opaque white -format "%[fx:mean*100]" info: 2>/dev/null)
-        
-        # Alternative: check mean brightness
-        MEAN=$(convert "$SCREENSHOT" -colorspace Gray -format "%[fx:mean*255]" info: 2>/dev/null)
-        
-        log "Screen check - Mean brightness: ${MEAN:-unknown}, White%: ${WHITE_PCT:-unknown}"
-        
-        # If mean brightness > 250 (very white), likely blank screen
-        if [ -n "$MEAN" ]; then
-            MEAN_INT=${MEAN%.*}
-            if [ "${MEAN_INT:-0}" -gt 250 ]; then
-                log "WARNING: Screen appears blank (brightness: $MEAN)"
-                return 2
-            fi
-        fi
-    else
-        log "ImageMagick not installed, using fallback check"
-        # Fallback: just check if Chrome is responding
-        if ! curl -s --max-time 5 https://10.0.0.151:8765/api/ | grep -q "API running"; then
-            log "WARNING: Server not responding"
-            return 2
-        fi
+
+    STATUS=$(echo "$HEALTH" | grep -o '"status": *"[a-z]*"' | head -1 | sed 's/.*"\([a-z]*\)"$/\1/')
+    PROBLEMS=$(echo "$HEALTH" | grep -o '"problems": *\[[^]]*\]' | sed 's/.*\[\(.*\)\]/\1/')
+
+    log "Screen check - Status: ${STATUS:-unknown}, Problems: ${PROBLEMS:-none}"
+
+    if [ "$STATUS" = "unhealthy" ]; then
+        log "WARNING: Dashboard unhealthy ($PROBLEMS)"
+        return 2
     fi
-    
-    rm -f "$SCREENSHOT"
+
     return 0
 }
 
@@ -13,13 +13,28 @@ import urllib.parse
 import ssl
 import json
 import os
+import sys
 import threading
 import time
 import asyncio
 import subprocess
+import queue
 import sqlite3
 import hashlib
+import re
+import traceback
+import gzip
+import zlib
+import mimetypes
+import base64
+import struct
+import io
+import concurrent.futures
+import collections
+import bisect
 import shutil
+import selectors
+import socket
 from datetime import datetime, timedelta
 
 # Photo cache settings
@@ -31,18 +46,25 @@ def get_dashboard_version():
     """Extract version from index.html DASHBOARD_VERSION constant"""
     try:
         index_path = os.path.join(os.path.dirname(__file__), 'index.html')
-        with open(index_path, 'r') as f:
-            content = f.read()
         # Look for: const DASHBOARD_VERSION = '1.3.2';
-        import re
-        match = re.search(r"const\s+DASHBOARD_VERSION\s*=\s*['\"]([^'\"]+)['\"]", content)
-        if match:
-            return match.group(1)
+        pattern = re.compile(r"const\s+DASHBOARD_VERSION\s*=\s*['\"]([^'\"]+)['\"]")
+        with open(index_path, 'r') as f:
+            for line in f:
+                match = pattern.search(line)
+                if match:
+                    return match.group(1)
         return "unknown"
     except:
         return "unknown"
 
-DASHBOARD_VERSION = get_dashboard_version()
+_dashboard_version = None
+
+def dashboard_version():
+    """Dashboard version, read from index.html on first use"""
+    global _dashboard_version
+    if _dashboard_version is None:
+        _dashboard_version = get_dashboard_version()
+    return _dashboard_version
 
 # Import configuration from config.py
 try:
@@ -69,14 +91,188 @@ except ImportError:
     MQTT_DEVICE_NAME = "Skylight Dashboard"
     WS_PORT = 8766
 
-# Create SSL context that doesn't verify certificates (for self-signed certs)
-ssl_context = ssl.create_default_context()
+# Import optional MQTT state publishing settings
+try:
+    from config import MQTT_STATE_COALESCE_SECONDS, MQTT_UPTIME_INTERVAL
+except ImportError:
+    MQTT_STATE_COALESCE_SECONDS = 2.0  # Changes within this window go out as one publish
+    MQTT_UPTIME_INTERVAL = 300         # Seconds between uptime publishes
+
+# Import optional Home Assistant state mirror settings
+try:
+    from config import HA_STATE_MIRROR, HA_STATE_MAX_AGE
+except ImportError:
+    HA_STATE_MIRROR = True   # Answer /api/states from the live WebSocket replica
+    HA_STATE_MAX_AGE = 120   # Seconds without hearing from HA before falling back to the proxy
+
+# Import optional browser broadcast replay settings
+try:
+    from config import BROADCAST_LOG_SIZE
+except ImportError:
+    BROADCAST_LOG_SIZE = 500  # Recent broadcasts kept for reconnecting screens
+
+# Import optional calendar cache settings
+try:
+    from config import CALENDAR_CACHE, CALENDAR_CACHE_TTL, CALENDAR_CACHE_MAX_DAYS
+except ImportError:
+    CALENDAR_CACHE = True         # Answer calendar.get_events from a shared server-side cache
+    CALENDAR_CACHE_TTL = 300      # Seconds before a calendar is refetched without a change event
+    CALENDAR_CACHE_MAX_DAYS = 400 # Widest window kept per calendar
+
+# Import optional todo replica settings
+try:
+    from config import TODO_REPLICA, TODO_REPLICA_TTL, TODO_FORWARD_ATTEMPTS
+except ImportError:
+    TODO_REPLICA = True          # Apply todo edits locally and forward them to HA in the background
+    TODO_REPLICA_TTL = 600       # Seconds before a list is refetched without a change event
+    TODO_FORWARD_ATTEMPTS = 8    # Tries per edit (backing off up to a minute) before resyncing
+
+# Import optional TTS cache settings
+try:
+    from config import TTS_CACHE, TTS_CACHE_MAX_MB, TTS_CACHE_MAX_FILES
+except ImportError:
+    TTS_CACHE = True             # Keep rendered announcements on disk and replay them locally
+    TTS_CACHE_MAX_MB = 100       # Least recently used phrases are evicted beyond this size...
+    TTS_CACHE_MAX_FILES = 2000   # ...or this many files
+try:
+    from config import TTS_CACHE_DIR
+except ImportError:
+    TTS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tts_cache')
+
+# Import optional camera hub settings
+try:
+    from config import CAMERA_HUB, CAMERA_SNAPSHOT_INTERVAL, CAMERA_IDLE_TIMEOUT, CAMERA_FRAME_TIMEOUT
+except ImportError:
+    CAMERA_HUB = True              # One upstream feed per camera, shared by every viewer
+    CAMERA_SNAPSHOT_INTERVAL = 2   # Seconds between snapshots when the camera has no MJPEG stream
+    CAMERA_IDLE_TIMEOUT = 15       # Keep the upstream open this long after the last viewer leaves
+    CAMERA_FRAME_TIMEOUT = 10      # Give up on a viewer request if no frame arrives in this time
+
+# Import optional Quran cache settings
+try:
+    from config import (
+        QURAN_CACHE, QURAN_API_URL, QURAN_AUDIO_HOSTS, QURAN_CACHE_MAX_MB,
+        QURAN_PREFETCH, QURAN_PREFETCH_HOURS
+    )
+except ImportError:
+    QURAN_CACHE = True                        # Proxy and keep Quran text/recitations on disk
+    QURAN_API_URL = "https://api.alquran.cloud"
+    QURAN_AUDIO_HOSTS = ('cdn.islamic.network', 'cdn.alquran.cloud')  # Audio hosts we may fetch from
+    QURAN_CACHE_MAX_MB = 1000
+    QURAN_PREFETCH = []                       # API paths to download with their audio, e.g. 'surah/36/ar.alafasy'
+    QURAN_PREFETCH_HOURS = (1, 5)             # Local hours [start, end) when prefetching may run
+try:
+    from config import QURAN_CACHE_DIR
+except ImportError:
+    QURAN_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quran_cache')
+
+# Import optional NAS I/O settings
+try:
+    from config import (
+        NAS_IO_WORKERS, NAS_IO_TIMEOUT, NAS_SCAN_TIMEOUT, NAS_FAILURE_THRESHOLD, NAS_PROBE_INTERVAL
+    )
+except ImportError:
+    NAS_IO_WORKERS = 4           # Threads for photo-source filesystem calls, per mount
+    NAS_IO_TIMEOUT = 5           # Seconds allowed for a stat or a single image read
+    NAS_SCAN_TIMEOUT = 30        # Seconds allowed for listing a whole folder
+    NAS_FAILURE_THRESHOLD = 3    # Consecutive failures before a mount is marked unhealthy
+    NAS_PROBE_INTERVAL = 30      # Seconds between recovery probes of an unhealthy mount
+
+# Import optional folder picker settings
+try:
+    from config import FOLDER_CACHE_SIZE, FOLDER_BROWSE_PAGE_SIZE
+except ImportError:
+    FOLDER_CACHE_SIZE = 500          # Folder listings kept for the photo folder picker
+    FOLDER_BROWSE_PAGE_SIZE = 200    # Subfolders returned per /api/local/browse page
+
+# Import optional Home Assistant circuit breaker settings
+try:
+    from config import (
+        HA_BREAKER_THRESHOLD, HA_BREAKER_COOLDOWN, HA_BREAKER_MAX_COOLDOWN, HA_ROUTE_DEADLINES,
+        HA_STALE_CACHE_SIZE
+    )
+except ImportError:
+    HA_BREAKER_THRESHOLD = 3         # Consecutive failed HA calls before failing fast
+    HA_BREAKER_COOLDOWN = 5          # Seconds before the first recovery probe (doubles per failed probe)
+    HA_BREAKER_MAX_COOLDOWN = 60
+    HA_ROUTE_DEADLINES = {           # Seconds per proxied HA call, by longest matching path prefix
+        '/api/camera_proxy_stream/': 10,
+        '/api/camera_proxy/': 10,
+        '/api/services/': 15,
+        '/api/history/': 20,
+        '/api/calendars/': 15,
+        '/api/tts_get_url': 30,
+        '/api/tts_proxy/': 30,
+        '/api/states': 5,
+        '/api/': 8,
+    }
+    HA_STALE_CACHE_SIZE = 200        # Recent JSON GET responses served while HA is down
+
+# Import optional HTTP server tuning
+try:
+    from config import (
+        HTTP_SERVER_MODE, HTTP_WORKERS, HTTP_QUEUE_SIZE, HTTP_REQUEST_TIMEOUT
+    )
+except ImportError:
+    HTTP_SERVER_MODE = "threaded"  # "threaded", "pool" or "asyncio"
+    HTTP_WORKERS = 16
+    HTTP_QUEUE_SIZE = 64
+    HTTP_REQUEST_TIMEOUT = 30
+
+# Import optional HTTP keep-alive settings
+try:
+    from config import HTTP_KEEPALIVE, HTTP_KEEPALIVE_TIMEOUT
+except ImportError:
+    HTTP_KEEPALIVE = True          # HTTP/1.1 persistent connections
+    HTTP_KEEPALIVE_TIMEOUT = 15    # Close idle connections after this many seconds
+
+# Import optional screenshot history settings
+try:
+    from config import (
+        SCREENSHOT_HISTORY_SIZE, SCREENSHOT_HISTORY_DIR, SCREENSHOT_THUMBNAIL_SIZE
+    )
+except ImportError:
+    SCREENSHOT_HISTORY_SIZE = 50       # Screenshots kept on disk (0 disables history)
+    SCREENSHOT_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screenshots')
+    SCREENSHOT_THUMBNAIL_SIZE = (320, 200)  # Bounding box for thumbnails (needs Pillow)
+
+# Import optional kiosk health monitoring settings
+try:
+    from config import (
+        HEALTH_CHECK_INTERVAL, HEALTH_HEARTBEAT_TIMEOUT, HEALTH_CAPTURE_TIMEOUT,
+        HEALTH_BLANK_THRESHOLD, HEALTH_BLANK_MAX_STDDEV, HEALTH_BLANK_MAX_PNG_BPP
+    )
+except ImportError:
+    HEALTH_CHECK_INTERVAL = 60       # Seconds between screenshot checks (0 disables)
+    HEALTH_HEARTBEAT_TIMEOUT = 90    # Browser ping gap that counts as a hang
+    HEALTH_CAPTURE_TIMEOUT = 30      # Seconds the browser has to answer a capture request
+    HEALTH_BLANK_THRESHOLD = 2       # Consecutive blank screenshots before reporting
+    HEALTH_BLANK_MAX_STDDEV = 4.0    # Greyscale spread below which a screen is blank
+    HEALTH_BLANK_MAX_PNG_BPP = 0.01  # PNG bytes per pixel below which it is blank (no Pillow)
+try:
+    from config import HEALTH_KIOSK_ADDRESS
+except ImportError:
+    HEALTH_KIOSK_ADDRESS = None      # IP of the kiosk browser; None means a browser on this machine
+
+# Import optional response compression settings
+try:
+    from config import COMPRESSION_ENABLED, COMPRESSION_MIN_SIZE, COMPRESSION_LEVEL
+except ImportError:
+    COMPRESSION_ENABLED = True
+    COMPRESSION_MIN_SIZE = 1024    # Bytes; smaller responses are sent as-is
+    COMPRESSION_LEVEL = 5          # 1 (fast, low CPU) .. 9 (smallest)
+
+# Create SSL context that doesn't verify certificates (for self-signed certs).
+# Built directly rather than via create_default_context(), which would load the
+# system CA bundle at import time only for it to go unused.
+ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
 ssl_context.check_hostname = False
 ssl_context.verify_mode = ssl.CERT_NONE
 
 # Global state for MQTT bridge
 mqtt_client = None
 websocket_clients = set()
+kiosk_client = None  # The kiosk screen's WebSocket: health checks and captures only concern it
 websocket_loop = None  # Reference to WebSocket event loop for cross-thread communication
 dashboard_state = {
     "state": "online",
@@ -89,16 +285,452 @@ dashboard_state = {
 start_time = time.time()
 
 # Screenshot storage
-latest_screenshot = None  # Base64 PNG data
-screenshot_timestamp = 0
+latest_screenshot = None  # Screenshot, decoded once on arrival
 screenshot_lock = threading.Lock()
 
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'RIFF', 'image/webp'),
+)
+
+
+class Screenshot:
+    """Raw screenshot bytes shared by the HTTP endpoint and MQTT"""
+
+    __slots__ = ('data', 'content_type', 'timestamp', 'etag')
+
+    def __init__(self, data, content_type, timestamp=None):
+        self.data = data
+        self.content_type = content_type
+        self.timestamp = timestamp or time.time()
+        self.etag = f'"{hashlib.sha1(data).hexdigest()[:20]}"'
+
+
+def decode_screenshot(message):
+    """Return (bytes, content_type) for a binary frame or a base64 data URL"""
+    if isinstance(message, str):
+        header, _, payload = message.partition(',')
+        if not header.startswith('data:'):
+            header, payload = '', message
+        data = base64.b64decode(payload)
+    else:
+        data = bytes(message)
+    for signature, content_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return data, content_type
+    raise ValueError('not a PNG, JPEG or WebP image')
+
+
+def store_screenshot(message):
+    """Decode a screenshot once and make it the latest
+
+    Returns (screenshot, changed); changed is False when the image is
+    byte-identical to the previous one, in which case only its timestamp moves.
+    """
+    global latest_screenshot
+    data, content_type = decode_screenshot(message)
+    screenshot = Screenshot(data, content_type)
+    with screenshot_lock:
+        previous = latest_screenshot
+        changed = previous is None or previous.etag != screenshot.etag
+        if changed:
+            latest_screenshot = screenshot
+        else:
+            previous.timestamp = screenshot.timestamp
+            screenshot = previous
+    return screenshot, changed
+
+# ==================== SCREENSHOT HISTORY ====================
+
+class LatestOnlyWorker:
+    """Runs func on one background thread, keeping only the newest pending item
+
+    submit() never blocks. When items arrive faster than func handles them,
+    the item still waiting is replaced, so memory stays bounded regardless of
+    the arrival rate.
+    """
+
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.lock = threading.Lock()
+        self.pending = None
+        self.busy = False
+        self.executor = None
+        self.processed = 0
+        self.dropped = 0
+
+    def submit(self, item):
+        with self.lock:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = item
+            if self.busy:
+                return
+            self.busy = True
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=self.name.lower().replace(' ', '-')
+                )
+        self.executor.submit(self._drain)
+
+    def _drain(self):
+        while True:
+            with self.lock:
+                item = self.pending
+                self.pending = None
+                if item is None:
+                    self.busy = False
+                    return
+            try:
+                self.func(item)
+                self.processed += 1
+            except Exception as e:
+                print(f"{self.name}: Failed - {e}")
+
+
+IMAGE_EXTENSIONS = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/webp': 'webp'}
+
+
+class ScreenshotRecord:
+    """One screenshot in the history: image on disk, thumbnail in memory"""
+
+    __slots__ = ('timestamp', 'content_type', 'etag', 'size', 'path', 'thumbnail')
+
+    def __init__(self, timestamp, content_type, etag, size, path, thumbnail=None):
+        self.timestamp = timestamp
+        self.content_type = content_type
+        self.etag = etag
+        self.size = size
+        self.path = path
+        self.thumbnail = thumbnail
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def to_dict(self, index):
+        return {
+            'index': index,
+            'timestamp': self.timestamp,
+            'content_type': self.content_type,
+            'size': self.size,
+            'etag': self.etag,
+            'has_thumbnail': self.thumbnail is not None,
+        }
+
+
+def make_thumbnail(data, size=SCREENSHOT_THUMBNAIL_SIZE):
+    """Downscale an image to a small JPEG, or None when Pillow is unavailable"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail(size)
+            out = io.BytesIO()
+            image.convert('RGB').save(out, 'JPEG', quality=70)
+            return out.getvalue()
+    except Exception as e:
+        print(f"Screenshot: Thumbnail failed - {e}")
+        return None
+
+
+class ScreenshotHistory:
+    """Ring buffer of the last screenshots, persisted to SCREENSHOT_HISTORY_DIR
+
+    Images live on disk; memory holds only metadata and thumbnails, so usage
+    is bounded by the history size. Writing and thumbnailing happen on a
+    LatestOnlyWorker, so a burst of screenshots cannot queue up in memory.
+    """
+
+    def __init__(self, directory, size):
+        self.directory = directory
+        self.size = size
+        self.records = []  # oldest first
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.worker = LatestOnlyWorker('Screenshot history', self._store)
+
+    def _load(self):
+        """Pick up screenshots saved by a previous run (called under lock)"""
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return
+        content_types = {ext: ctype for ctype, ext in IMAGE_EXTENSIONS.items()}
+        for name in names:
+            stem, _, ext = name.rpartition('.')
+            millis, _, digest = stem.partition('-')
+            if ext not in content_types or not millis.isdigit() or not digest:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            self.records.append(ScreenshotRecord(
+                int(millis) / 1000, content_types[ext], f'"{digest}"', size, path
+            ))
+        self._trim()
+
+    def _trim(self):
+        while len(self.records) > self.size:
+            old = self.records.pop(0)
+            try:
+                os.remove(old.path)
+            except OSError:
+                pass
+
+    def add(self, screenshot):
+        """Queue a Screenshot for storage (callable from the event loop)"""
+        if self.size > 0:
+            self.worker.submit(screenshot)
+
+    def _store(self, screenshot):
+        with self.lock:
+            self._load()
+        os.makedirs(self.directory, exist_ok=True)
+        name = '{}-{}.{}'.format(
+            int(screenshot.timestamp * 1000),
+            screenshot.etag.strip('"'),
+            IMAGE_EXTENSIONS.get(screenshot.content_type, 'bin'),
+        )
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(screenshot.data)
+        record = ScreenshotRecord(
+            screenshot.timestamp, screenshot.content_type, screenshot.etag,
+            len(screenshot.data), path, make_thumbnail(screenshot.data)
+        )
+        with self.lock:
+            self.records.append(record)
+            self._trim()
+
+    def entries(self):
+        """Records newest first, as dicts with their lookup index"""
+        with self.lock:
+            self._load()
+            records = list(reversed(self.records))
+        return [record.to_dict(index) for index, record in enumerate(records)]
+
+    def by_index(self, index):
+        """Record by position, 0 being the newest"""
+        with self.lock:
+            self._load()
+            if 0 <= index < len(self.records):
+                return self.records[-1 - index]
+        return None
+
+    def at(self, timestamp):
+        """Newest record taken at or before timestamp"""
+        with self.lock:
+            self._load()
+            for record in reversed(self.records):
+                if record.timestamp <= timestamp:
+                    return record
+        return None
+
+    def thumbnail(self, record):
+        """Thumbnail bytes for a record, generating it for restored records"""
+        if record.thumbnail is None:
+            record.thumbnail = make_thumbnail(record.read())
+        return record.thumbnail
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'size': len(self.records),
+                'capacity': self.size,
+                'stored': self.worker.processed,
+                'dropped': self.worker.dropped,
+                'disk_bytes': sum(r.size for r in self.records),
+                'thumbnail_bytes': sum(len(r.thumbnail) for r in self.records if r.thumbnail),
+            }
+
+
+screenshot_history = ScreenshotHistory(SCREENSHOT_HISTORY_DIR, SCREENSHOT_HISTORY_SIZE)
+
+
+# ==================== KIOSK HEALTH ====================
+
+def analyze_screenshot(data, content_type):
+    """Cheap blank-screen check on a decoded screenshot
+
+    With Pillow the image is shrunk to a small greyscale copy and judged by
+    the spread of its histogram: a blank page is one flat colour. Without
+    Pillow, PNGs are judged by compressed size per pixel, which is tiny for
+    a flat image.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+
+    if Image is not None:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft('L', (160, 100))  # JPEG decodes at reduced size directly
+            histogram = image.convert('L').resize((160, 100), Image.NEAREST).histogram()
+        pixels = sum(histogram)
+        mean = sum(level * count for level, count in enumerate(histogram)) / pixels
+        variance = sum(count * (level - mean) ** 2 for level, count in enumerate(histogram)) / pixels
+        stddev = variance ** 0.5
+        return {
+            'method': 'histogram',
+            'mean_brightness': round(mean, 1),
+            'stddev': round(stddev, 2),
+            'white_fraction': round(sum(histogram[250:]) / pixels, 3),
+            'blank': stddev < HEALTH_BLANK_MAX_STDDEV,
+        }
+
+    if content_type != 'image/png' or len(data) < 24:
+        return {'method': 'none', 'blank': False}
+    width, height = struct.unpack('!II', data[16:24])
+    bytes_per_pixel = len(data) / max(width * height, 1)
+    return {
+        'method': 'png_size',
+        'bytes_per_pixel': round(bytes_per_pixel, 4),
+        'blank': bytes_per_pixel < HEALTH_BLANK_MAX_PNG_BPP,
+    }
+
+
+class KioskHealth:
+    """Tracks whether the kiosk browser is alive and showing something
+
+    Fed by the kiosk connection's heartbeats (ping messages), periodic
+    screenshot requests and the screenshots that come back; other screens
+    (tablets, phones) are ignored so a healthy one can't mask a hung kiosk.
+    status() summarises it for /api/health, which systemd or
+    kiosk-watchdog.sh can poll instead of taking X11 screenshots themselves.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.last_ping = None
+        self.max_ping_gap = 0
+        self.last_request = None
+        self.last_screenshot = None
+        self.last_analysis = None
+        self.analyzed_etag = None
+        self.blank_count = 0
+        self.screensaver_active = False  # Reported by the kiosk page; no captures meanwhile
+        self.worker = LatestOnlyWorker('Health', self._analyze)
+
+    def record_connect(self):
+        """A (re)loaded page starts with a clean slate"""
+        with self.lock:
+            self.blank_count = 0
+            self.last_request = None
+            self.screensaver_active = False
+            self.last_ping = time.time()
+
+    def record_ping(self):
+        now = time.time()
+        with self.lock:
+            if self.last_ping is not None:
+                self.max_ping_gap = max(self.max_ping_gap, now - self.last_ping)
+            self.last_ping = now
+
+    def record_request(self):
+        with self.lock:
+            self.last_request = time.time()
+
+    def record_screenshot(self, screenshot):
+        """Judge a received screenshot; identical images reuse the last verdict"""
+        with self.lock:
+            self.last_screenshot = screenshot.timestamp
+            if screenshot.etag == self.analyzed_etag and self.last_analysis:
+                self._count(self.last_analysis)
+                return
+        self.worker.submit(screenshot)
+
+    def _analyze(self, screenshot):
+        analysis = analyze_screenshot(screenshot.data, screenshot.content_type)
+        analysis['timestamp'] = screenshot.timestamp
+        with self.lock:
+            self.analyzed_etag = screenshot.etag
+            self.last_analysis = analysis
+            self._count(analysis)
+        if analysis['blank']:
+            print(f"Health: Screen appears blank ({self.blank_count} in a row)")
+
+    def _count(self, analysis):
+        self.blank_count = self.blank_count + 1 if analysis['blank'] else 0
+
+    def status(self):
+        now = time.time()
+        with self.lock:
+            problems = []
+            past_grace = now - self.started > HEALTH_HEARTBEAT_TIMEOUT
+            if past_grace and kiosk_client is None:
+                problems.append('no_browser')
+            heartbeat = self.last_ping or self.started
+            if past_grace and now - heartbeat > HEALTH_HEARTBEAT_TIMEOUT:
+                problems.append('heartbeat_stale')
+            if (self.last_request and now - self.last_request > HEALTH_CAPTURE_TIMEOUT
+                    and (self.last_screenshot or 0) < self.last_request):
+                problems.append('capture_unanswered')
+            if self.blank_count >= HEALTH_BLANK_THRESHOLD:
+                problems.append('blank_screen')
+            return {
+                'status': 'unhealthy' if problems else 'ok',
+                'problems': problems,
+                'browser_connections': len(websocket_clients),
+                'kiosk_connected': kiosk_client is not None,
+                'screensaver_active': self.screensaver_active,
+                'seconds_since_ping': round(now - self.last_ping, 1) if self.last_ping else None,
+                'max_ping_gap_seconds': round(self.max_ping_gap, 1),
+                'seconds_since_screenshot': round(now - self.last_screenshot, 1) if self.last_screenshot else None,
+                'consecutive_blank': self.blank_count,
+                'last_analysis': self.last_analysis,
+            }
+
+
+kiosk_health = KioskHealth()
+
+
+def run_health_monitor():
+    """Ask the browser for a screenshot every HEALTH_CHECK_INTERVAL seconds"""
+    while True:
+        time.sleep(HEALTH_CHECK_INTERVAL)
+        if kiosk_health.screensaver_active:
+            continue
+        if request_screenshot():
+            kiosk_health.record_request()
+
+
 # ==================== WEATHER CACHE DATABASE ====================
 
 WEATHER_DB_PATH = os.path.join(os.path.dirname(__file__), 'weather_cache.db')
 
+# Path of the database each init function last prepared; connect helpers
+# initialize lazily when this doesn't match the current path
+_weather_db_ready = None
+_habits_db_ready = None
+_db_init_lock = threading.RLock()
+
+def _weather_connect():
+    """Open a connection to the weather cache, initializing it on first use"""
+    if _weather_db_ready != WEATHER_DB_PATH:
+        init_weather_db()
+    return sqlite3.connect(WEATHER_DB_PATH)
+
 def init_weather_db():
     """Initialize SQLite database for weather cache"""
+    global _weather_db_ready
+    with _db_init_lock:
+        if _weather_db_ready == WEATHER_DB_PATH:
+            return
+        _init_weather_db()
+        _weather_db_ready = WEATHER_DB_PATH
+
+def _init_weather_db():
     conn = sqlite3.connect(WEATHER_DB_PATH)
     cursor = conn.cursor()
     
@@ -144,7 +776,7 @@ def init_weather_db():
 
 def save_daily_forecast(forecasts):
     """Save daily forecasts to cache"""
-    conn = sqlite3.connect(WEATHER_DB_PATH)
+    conn = _weather_connect()
     cursor = conn.cursor()
     now = datetime.now().isoformat()
     
@@ -170,7 +802,7 @@ def save_daily_forecast(forecasts):
 
 def save_hourly_forecast(forecasts):
     """Save hourly forecasts to cache"""
-    conn = sqlite3.connect(WEATHER_DB_PATH)
+    conn = _weather_connect()
     cursor = conn.cursor()
     now = datetime.now().isoformat()
     
@@ -205,7 +837,7 @@ def save_hourly_forecast(forecasts):
 
 def get_cached_daily_forecast():
     """Get all cached daily forecasts"""
-    conn = sqlite3.connect(WEATHER_DB_PATH)
+    conn = _weather_connect()
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -217,7 +849,7 @@ def get_cached_daily_forecast():
 
 def get_cached_hourly_forecast():
     """Get all cached hourly forecasts"""
-    conn = sqlite3.connect(WEATHER_DB_PATH)
+    conn = _weather_connect()
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -227,12 +859,122 @@ def get_cached_hourly_forecast():
     
     return [dict(row) for row in rows]
 
-# Initialize weather database on module load
-init_weather_db()
 
 
 # ==================== MQTT CLIENT ====================
 
+class StatePublisher:
+    """Publishes dashboard_state to MQTT only when it actually changes
+
+    Requests within MQTT_STATE_COALESCE_SECONDS of the first one are folded
+    into a single publish, and a publish whose state matches the last one
+    sent is skipped. uptime_seconds is left out of the comparison; it goes to
+    its own topic every MQTT_UPTIME_INTERVAL seconds instead.
+    """
+
+    def __init__(self, mqtt, window=MQTT_STATE_COALESCE_SECONDS, uptime_interval=MQTT_UPTIME_INTERVAL):
+        self.mqtt = mqtt
+        self.window = window
+        self.uptime_interval = uptime_interval
+        self.cond = threading.Condition()
+        self.dirty_since = None
+        self.next_uptime = 0
+        self.last_published = None
+        self.thread = None
+        self.counts = {
+            'requested': 0,
+            'coalesced': 0,
+            'unchanged': 0,
+            'published': 0,
+            'uptime_published': 0,
+        }
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="mqtt-state", daemon=True)
+            self.thread.start()
+
+    def request(self):
+        """Note that dashboard_state may have changed"""
+        with self.cond:
+            self.counts['requested'] += 1
+            if self.dirty_since is not None:
+                self.counts['coalesced'] += 1
+                return
+            self.dirty_since = time.monotonic()
+            self.cond.notify()
+
+    def republish(self):
+        """Publish state and uptime now, e.g. after (re)connecting to the broker"""
+        with self.cond:
+            self.last_published = None
+            self.dirty_since = time.monotonic() - self.window
+            self.next_uptime = 0
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while True:
+                    now = time.monotonic()
+                    due = self.next_uptime
+                    if self.dirty_since is not None:
+                        due = min(due, self.dirty_since + self.window)
+                    if due <= now:
+                        break
+                    self.cond.wait(due - now)
+                publish_state = self.dirty_since is not None and now >= self.dirty_since + self.window
+                if publish_state:
+                    self.dirty_since = None
+                publish_uptime = now >= self.next_uptime
+                if publish_uptime:
+                    self.next_uptime = now + self.uptime_interval
+            try:
+                if publish_state:
+                    self._publish_state()
+                if publish_uptime:
+                    self._publish_uptime()
+            except Exception as e:
+                print(f"MQTT: State publish failed - {e}")
+
+    def _publish_state(self):
+        if not self.mqtt.connected:
+            return
+        state = dict(dashboard_state)
+        state.pop('uptime_seconds', None)
+        fingerprint = json.dumps(state, sort_keys=True)
+        if fingerprint == self.last_published:
+            self.counts['unchanged'] += 1
+            return
+        # uptime_seconds stays in the payload for existing templates
+        state['uptime_seconds'] = int(time.time() - start_time)
+        self.mqtt.client.publish(
+            f"{self.mqtt.base_topic}/state",
+            json.dumps(state),
+            qos=0,
+            retain=True
+        )
+        self.last_published = fingerprint
+        self.counts['published'] += 1
+
+    def _publish_uptime(self):
+        if not self.mqtt.connected:
+            return
+        uptime = int(time.time() - start_time)
+        dashboard_state['uptime_seconds'] = uptime
+        self.mqtt.client.publish(
+            f"{self.mqtt.base_topic}/uptime",
+            str(uptime),
+            qos=0,
+            retain=True
+        )
+        self.counts['uptime_published'] += 1
+
+    def metrics(self):
+        with self.cond:
+            return dict(self.counts)
+
+
 class SkylightMQTTClient:
     """MQTT client for Home Assistant integration"""
 
@@ -242,6 +984,7 @@ class SkylightMQTTClient:
         self.device_id = MQTT_DEVICE_ID
         self.device_name = MQTT_DEVICE_NAME
         self.base_topic = f"skylight/{self.device_id}"
+        self.state_publisher = StatePublisher(self)
 
     def connect(self):
         """Connect to MQTT broker"""
@@ -277,6 +1020,7 @@ class SkylightMQTTClient:
             print(f"MQTT: Connecting to {MQTT_BROKER}:{MQTT_PORT}...")
             self.client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60)
             self.client.loop_start()
+            self.state_publisher.start()
             return True
         except Exception as e:
             print(f"MQTT: Connection failed - {e}")
@@ -308,8 +1052,8 @@ class SkylightMQTTClient:
             # Publish Home Assistant discovery configs
             self._publish_ha_discovery()
 
-            # Publish initial state
-            self.publish_state()
+            # Publish initial state (also after a reconnect)
+            self.state_publisher.republish()
         else:
             print(f"MQTT: Connection failed with code {reason_code}")
 
@@ -360,9 +1104,9 @@ class SkylightMQTTClient:
 
             print(f"MQTT: Processing command: {command}")
 
-            # Forward all other commands to browser via WebSocket
+            # Forward all other commands to browser via WebSocket (live only, never replayed)
             if websocket_loop and websocket_clients:
-                asyncio.run_coroutine_threadsafe(broadcast_to_websockets(payload), websocket_loop)
+                asyncio.run_coroutine_threadsafe(broadcast_to_websockets(payload, replay=False), websocket_loop)
 
             # Update local state based on command
             if command == 'wake':
@@ -386,11 +1130,8 @@ class SkylightMQTTClient:
     def _request_screenshot(self):
         """Request screenshot from browser via WebSocket"""
         print("MQTT: Requesting screenshot from browser...")
-        if websocket_loop and websocket_clients:
-            message = json.dumps({'type': 'screenshot_request'})
-            asyncio.run_coroutine_threadsafe(broadcast_to_websockets(message), websocket_loop)
-        else:
-            print("MQTT: No WebSocket clients connected for screenshot")
+        if not request_screenshot():
+            print("MQTT: Kiosk browser not connected for screenshot")
 
     def _publish_ha_discovery(self):
         """Publish Home Assistant MQTT discovery configurations"""
@@ -438,6 +1179,25 @@ class SkylightMQTTClient:
             retain=True
         )
 
+        # Sensor: Uptime (own topic, so it doesn't churn the state payload)
+        uptime_config = {
+            "name": "Uptime",
+            "uniq_id": f"skylight_{self.device_id}_uptime",
+            "stat_t": f"{self.base_topic}/uptime",
+            "unit_of_meas": "s",
+            "dev_cla": "duration",
+            "ent_cat": "diagnostic",
+            "avty_t": f"{self.base_topic}/availability",
+            "dev": device_info,
+            "ic": "mdi:timer-outline"
+        }
+        self.client.publish(
+            f"homeassistant/sensor/skylight_{self.device_id}/uptime/config",
+            json.dumps(uptime_config),
+            qos=1,
+            retain=True
+        )
+
         # Sensor: Current Tab
         tab_config = {
             "name": "Current Tab",
@@ -530,25 +1290,8 @@ class SkylightMQTTClient:
         print("MQTT: Published Home Assistant discovery configs")
 
     def publish_state(self):
-        """Publish current dashboard state"""
-        if not self.connected:
-            return
-
-        global dashboard_state
-        dashboard_state['uptime_seconds'] = int(time.time() - start_time)
-
-        self.client.publish(
-            f"{self.base_topic}/state",
-            json.dumps(dashboard_state),
-            qos=0,
-            retain=True
-        )
-
-    def update_state(self, updates):
-        """Update dashboard state from WebSocket client"""
-        global dashboard_state
-        dashboard_state.update(updates)
-        self.publish_state()
+        """Publish current dashboard state (deduplicated and coalesced)"""
+        self.state_publisher.request()
 
     def disconnect(self):
         """Gracefully disconnect from broker"""
@@ -563,19 +1306,12 @@ class SkylightMQTTClient:
             self.client.disconnect()
             print("MQTT: Disconnected gracefully")
 
-    def publish_screenshot(self, image_data):
-        """Publish screenshot to MQTT as camera image"""
+    def publish_screenshot(self, image_bytes):
+        """Publish screenshot bytes to MQTT as camera image"""
         if not self.connected:
             return
         
-        # Publish to camera topic (raw base64 data without the data:image/png;base64, prefix)
-        if image_data.startswith('data:'):
-            image_data = image_data.split(',', 1)[1]
-        
-        import base64
         try:
-            # Decode and republish as raw bytes for HA camera
-            image_bytes = base64.b64decode(image_data)
             self.client.publish(
                 f"{self.base_topic}/screenshot",
                 payload=image_bytes,
@@ -605,92 +1341,1681 @@ class SkylightMQTTClient:
         print("MQTT: Published screenshot camera discovery")
 
 
-# ==================== HOME ASSISTANT WEBSOCKET SUBSCRIPTION ====================
+# ==================== HA STATE MIRROR ====================
 
-class HAWebSocketClient:
-    """WebSocket client for subscribing to Home Assistant real-time events"""
+class HAStateMirror:
+    """In-memory replica of every Home Assistant entity state
+
+    Bootstrapped with get_states when the HA WebSocket connects and kept
+    current from state_changed events. Each state is serialized once when it
+    changes; the /api/states list body is assembled from those pieces only
+    when something changed since the last request.
+    """
 
     def __init__(self):
-        self.ws = None
-        self.connected = False
-        self.authenticated = False
-        self.message_id = 0
-        self.subscriptions = {}
-        self.reconnect_delay = 5
-        self.running = False
+        self.lock = threading.Lock()
+        self.states = {}   # entity_id -> serialized state (bytes)
+        self.generation = 0
+        self.boot = os.urandom(4).hex()  # generation restarts with the process; keeps old ETags from matching
+        self.list_body = None
+        self.list_generation = -1
+        self.synced = False
+        self.last_heard = 0
+        self.counts = {'hits': 0, 'fallbacks': 0, 'events': 0, 'resyncs': 0}
+
+    def load(self, states):
+        """Replace the replica with a full get_states result"""
+        encoded = {
+            state['entity_id']: json.dumps(state).encode()
+            for state in states if state.get('entity_id')
+        }
+        with self.lock:
+            self.states = encoded
+            self.generation += 1
+            self.synced = True
+            self.last_heard = time.time()
+            self.counts['resyncs'] += 1
+        print(f"HA-WS: State mirror synced ({len(encoded)} entities)")
+
+    def apply(self, event_data):
+        """Apply a state_changed event"""
+        entity_id = event_data.get('entity_id')
+        if not entity_id:
+            return
+        new_state = event_data.get('new_state')
+        with self.lock:
+            if new_state:
+                self.states[entity_id] = json.dumps(new_state).encode()
+            else:
+                self.states.pop(entity_id, None)
+            self.generation += 1
+            self.counts['events'] += 1
+
+    def heard(self):
+        self.last_heard = time.time()
+
+    def disconnected(self):
+        """The event stream stopped; the replica can no longer be trusted"""
+        with self.lock:
+            self.synced = False
+
+    def age(self):
+        return time.time() - self.last_heard
+
+    def ready(self):
+        """True when requests can be answered from memory"""
+        ready = HA_STATE_MIRROR and self.synced and self.age() <= HA_STATE_MAX_AGE
+        if not ready:
+            self.counts['fallbacks'] += 1
+        return ready
+
+    def get(self, entity_id):
+        with self.lock:
+            self.counts['hits'] += 1
+            return self.states.get(entity_id)
+
+    def all(self):
+        """(body, etag) for the full state list; the ETag is for the identity encoding"""
+        with self.lock:
+            self.counts['hits'] += 1
+            if self.list_generation != self.generation:
+                self.list_body = b'[' + b','.join(self.states.values()) + b']'
+                self.list_generation = self.generation
+            return self.list_body, f'"states-{self.boot}-{self.generation}"'
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'enabled': HA_STATE_MIRROR,
+                'synced': self.synced,
+                'entities': len(self.states),
+                'age_seconds': round(self.age(), 1) if self.last_heard else None,
+                **self.counts,
+            }
 
-    async def connect(self):
-        """Connect to Home Assistant WebSocket API"""
-        try:
-            import websockets
-        except ImportError:
-            print("HA-WS: websockets not installed. Run: pip install websockets")
-            return False
 
-        # Convert HTTP URL to WebSocket URL
-        ws_url = HA_URL.replace('https://', 'wss://').replace('http://', 'ws://')
-        ws_url = f"{ws_url}/api/websocket"
+ha_states = HAStateMirror()
 
-        print(f"HA-WS: Connecting to {ws_url}...")
 
-        try:
-            # Create SSL context for self-signed certs
-            import ssl
-            ssl_ctx = ssl.create_default_context()
-            ssl_ctx.check_hostname = False
-            ssl_ctx.verify_mode = ssl.CERT_NONE
+# ==================== CALENDAR CACHE ====================
 
-            self.ws = await websockets.connect(
-                ws_url,
-                ssl=ssl_ctx,
-                ping_interval=30,
-                ping_timeout=10
-            )
-            self.connected = True
-            print("HA-WS: Connected")
-            return True
-        except Exception as e:
-            print(f"HA-WS: Connection failed - {e}")
-            return False
+def parse_calendar_time(value):
+    """HA calendar start/end (date, dateTime or ISO string) as a naive local datetime"""
+    if isinstance(value, dict):
+        value = value.get('dateTime') or value.get('date') or ''
+    value = str(value).replace('Z', '+00:00')
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
 
-    async def authenticate(self):
-        """Authenticate with Home Assistant"""
-        if not self.ws:
-            return False
 
-        try:
-            # Wait for auth_required message
-            msg = await asyncio.wait_for(self.ws.recv(), timeout=10)
-            data = json.loads(msg)
+class CalendarWindow:
+    """Events of one calendar for a date range, indexed by start time
 
-            if data.get('type') != 'auth_required':
-                print(f"HA-WS: Unexpected message: {data}")
-                return False
+    Overlap queries bisect the sorted start times: an event can only overlap
+    [start, end) if it starts before end and no earlier than start minus the
+    longest event duration, so only that slice is scanned.
+    """
 
-            # Send authentication
-            await self.ws.send(json.dumps({
-                'type': 'auth',
-                'access_token': HA_TOKEN
-            }))
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.fetched_at = time.time()
+        self.stale = False
+        self.events = {}  # instance key -> (start, end, event)
+        self.starts = []
+        self.ordered = []
+        self.longest = timedelta(0)
 
-            # Wait for auth response
-            msg = await asyncio.wait_for(self.ws.recv(), timeout=10)
-            data = json.loads(msg)
+    @staticmethod
+    def instance_key(event, start):
+        # Recurring events share a uid; each instance has its own start
+        return (event.get('uid') or event.get('summary'), event.get('recurrence_id'), start)
 
-            if data.get('type') == 'auth_ok':
-                self.authenticated = True
-                print(f"HA-WS: Authenticated (HA version: {data.get('ha_version', 'unknown')})")
-                return True
+    def merge(self, events):
+        """Add fetched events, replacing instances already present"""
+        for event in events:
+            try:
+                start = parse_calendar_time(event.get('start'))
+                end = parse_calendar_time(event.get('end'))
+            except (TypeError, ValueError):
+                continue
+            self.events[self.instance_key(event, start)] = (start, end, event)
+        self.ordered = sorted(self.events.values(), key=lambda item: item[0])
+        self.starts = [item[0] for item in self.ordered]
+        self.longest = max((end - start for start, end, _ in self.ordered), default=timedelta(0))
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    def query(self, start, end):
+        lo = bisect.bisect_left(self.starts, start - self.longest)
+        hi = bisect.bisect_left(self.starts, end)
+        return [event for s, e, event in self.ordered[lo:hi] if e > start or s == e == start]
+
+
+def call_ha_service(domain, service, data, return_response=False):
+    """Call a Home Assistant service over REST and return the decoded JSON
+
+    Goes through the HA circuit breaker, so it raises HAUnavailable while HA is down.
+    """
+    url = f"{HA_URL}/api/services/{domain}/{service}"
+    if return_response:
+        url += "?return_response"
+    req = urllib.request.Request(url, data=json.dumps(data).encode(), method='POST')
+    req.add_header('Authorization', f'Bearer {HA_TOKEN}')
+    req.add_header('Content-Type', 'application/json')
+    with ha_urlopen(req) as response:
+        return json.loads(response.read() or b'null')
+
+
+def fetch_calendar_events(entity_id, start, end):
+    """Fetch events from Home Assistant's calendar.get_events service"""
+    result = call_ha_service('calendar', 'get_events', {
+        'entity_id': entity_id,
+        'start_date_time': start.strftime('%Y-%m-%dT%H:%M:%S'),
+        'end_date_time': end.strftime('%Y-%m-%dT%H:%M:%S'),
+    }, return_response=True)
+    return result.get('service_response', {}).get(entity_id, {}).get('events', [])
+
+
+class CalendarStore:
+    """Shared, change-invalidated cache of calendar event windows
+
+    Each calendar keeps one contiguous window. A query inside a fresh window
+    is answered from memory; a query next to it fetches only the missing
+    part and merges it in; anything else refetches. Fetches for one calendar
+    are serialized, so screens asking at the same time share a single
+    request to Home Assistant.
+    """
+
+    def __init__(self, fetch=fetch_calendar_events):
+        self.fetch = fetch
+        self.windows = {}
+        self.locks = {}
+        self.invalidations = {}  # entity_id -> count, so a fetch can tell it raced a change
+        self.invalidated_all = 0
+        self.lock = threading.Lock()
+        self.counts = {'hits': 0, 'fetches': 0, 'invalidations': 0, 'stale_served': 0}
+
+    def _calendar_lock(self, entity_id):
+        with self.lock:
+            return self.locks.setdefault(entity_id, threading.Lock())
+
+    def events(self, entity_id, start, end):
+        """Events overlapping [start, end); returns (events, stale)"""
+        with self._calendar_lock(entity_id):
+            window = self.windows.get(entity_id)
+            fresh = window and not window.stale and time.time() - window.fetched_at < CALENDAR_CACHE_TTL
+            if fresh and window.covers(start, end):
+                self.counts['hits'] += 1
+                return window.query(start, end), False
+            try:
+                window = self._refresh(entity_id, window if fresh else None, start, end, window)
+            except Exception as e:
+                if window and window.covers(start, end):
+                    print(f"Calendar: Refresh of {entity_id} failed, serving cached events - {e}")
+                    self.counts['stale_served'] += 1
+                    return window.query(start, end), True
+                raise
+            return window.query(start, end), False
+
+    def _invalidation_mark(self, entity_id):
+        with self.lock:
+            return self.invalidated_all, self.invalidations.get(entity_id, 0)
+
+    def _refresh(self, entity_id, fresh, start, end, previous):
+        """Fetch what is needed for [start, end) and install the new window"""
+        mark = self._invalidation_mark(entity_id)
+        if fresh and start <= fresh.end and end >= fresh.start and \
+                (max(end, fresh.end) - min(start, fresh.start)).days <= CALENDAR_CACHE_MAX_DAYS:
+            # Extend the fresh window with just the missing edges
+            window = fresh
+            if start < window.start:
+                window.merge(self._fetch(entity_id, start, window.start))
+                window.start = start
+            if end > window.end:
+                window.merge(self._fetch(entity_id, window.end, end))
+                window.end = end
+            return window
+        # Stale or unrelated: refetch, keeping the old range when it fits
+        if previous and (max(end, previous.end) - min(start, previous.start)).days <= CALENDAR_CACHE_MAX_DAYS:
+            start, end = min(start, previous.start), max(end, previous.end)
+        window = CalendarWindow(start, end)
+        window.merge(self._fetch(entity_id, start, end))
+        with self.lock:
+            # Changed while we were fetching: the data may predate it
+            window.stale = mark != (self.invalidated_all, self.invalidations.get(entity_id, 0))
+            self.windows[entity_id] = window
+        return window
+
+    def _fetch(self, entity_id, start, end):
+        self.counts['fetches'] += 1
+        return self.fetch(entity_id, start, end)
+
+    def invalidate(self, entity_id=None):
+        """Mark one calendar (or all) for refetch on next use"""
+        with self.lock:
+            windows = [self.windows[entity_id]] if entity_id in self.windows else \
+                [] if entity_id else list(self.windows.values())
+            for window in windows:
+                window.stale = True
+            if entity_id:
+                self.invalidations[entity_id] = self.invalidations.get(entity_id, 0) + 1
             else:
-                print(f"HA-WS: Authentication failed: {data}")
-                return False
+                self.invalidated_all += 1
+            self.counts['invalidations'] += 1
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'enabled': CALENDAR_CACHE,
+                'calendars': {
+                    entity_id: {
+                        'start': window.start.isoformat(),
+                        'end': window.end.isoformat(),
+                        'events': len(window.events),
+                        'age_seconds': round(time.time() - window.fetched_at, 1),
+                        'stale': window.stale,
+                    }
+                    for entity_id, window in self.windows.items()
+                },
+                **self.counts,
+            }
 
-        except Exception as e:
-            print(f"HA-WS: Authentication error - {e}")
-            return False
 
-    def get_next_id(self):
-        """Get next message ID"""
+calendar_store = CalendarStore()
+
+
+def calendar_entities(entity_id):
+    """Normalize a service call's entity_id (string, list or None) to a list"""
+    if isinstance(entity_id, str):
+        return [e.strip() for e in entity_id.split(',') if e.strip()]
+    return list(entity_id or [])
+
+
+# ==================== TODO REPLICA ====================
+
+TODO_WRITE_SERVICES = ('add_item', 'update_item', 'remove_item')
+
+
+def apply_todo_op(items, op):
+    """Apply a todo write to a list of HA todo items
+
+    Returns (items, delta) where delta lists the upserted items and removed
+    uids. Items are matched by uid or summary, like Home Assistant does.
+    """
+    data = op['data']
+    upserts, removed = [], []
+
+    def matches(item, ref):
+        return ref in (item.get('uid'), item.get('summary'))
+
+    if op['service'] == 'add_item':
+        item = {'uid': op['uid'], 'summary': data.get('item', ''), 'status': 'needs_action'}
+        if data.get('description'):
+            item['description'] = data['description']
+        if data.get('due_date') or data.get('due_datetime'):
+            item['due'] = data.get('due_date') or data.get('due_datetime')
+        items = items + [item]
+        upserts.append(item)
+    elif op['service'] == 'update_item':
+        updated = []
+        for item in items:
+            if matches(item, data.get('item')) and not upserts:
+                item = dict(item)
+                if 'rename' in data:
+                    item['summary'] = data['rename']
+                if 'status' in data:
+                    item['status'] = data['status']
+                if 'description' in data:
+                    item['description'] = data['description']
+                if data.get('due_date') or data.get('due_datetime'):
+                    item['due'] = data.get('due_date') or data.get('due_datetime')
+                upserts.append(item)
+            updated.append(item)
+        items = updated
+    elif op['service'] == 'remove_item':
+        refs = data.get('item')
+        refs = refs if isinstance(refs, list) else [refs]
+        kept = []
+        for item in items:
+            if any(matches(item, ref) for ref in refs):
+                removed.append(item.get('uid'))
+            else:
+                kept.append(item)
+        items = kept
+    return items, {'upserts': upserts, 'removed': removed}
+
+
+class TodoReplica:
+    """Server-side copy of each todo list with optimistic writes
+
+    Reads are served from the replica (fetched on first use, after a todo.*
+    state change, or after TODO_REPLICA_TTL). Writes change the replica at
+    once and are queued for Home Assistant; a single worker forwards them in
+    order, retrying with backoff. Writes not yet accepted by Home Assistant
+    are re-applied on top of every refetch, so a refresh never undoes them.
+    New items carry a temporary uid until Home Assistant assigns one; the
+    refetch after their add picks up the real uid and points queued writes
+    at it. While Home Assistant is unreachable writes wait for it rather than
+    using up their attempts.
+    """
+
+    def __init__(self, call=call_ha_service):
+        self.call = call
+        self.lists = {}  # entity_id -> {'items': [...], 'loaded_at': t, 'stale': bool}
+        self.pending = collections.defaultdict(list)  # entity_id -> ops not yet in HA
+        self.temp_items = {}  # temporary uid -> [entity_id, summary as Home Assistant knows it]
+        self.resolved = {}  # temporary uid -> real uid, once Home Assistant has assigned one
+        self.lock = threading.Lock()
+        self.list_locks = collections.defaultdict(threading.Lock)
+        self.queue = queue.Queue()
+        self.forwarder = None
+        self.refresher = None
+        self.next_temp_id = 0
+        self.counts = {'hits': 0, 'fetches': 0, 'writes': 0, 'forwarded': 0, 'retries': 0, 'waits': 0, 'failed': 0}
+
+    def items(self, entity_id):
+        """Current items of a list, fetching it if needed"""
+        with self.lock:
+            list_lock = self.list_locks[entity_id]
+        with list_lock:
+            entry = self.lists.get(entity_id)
+            if entry and not entry['stale'] and time.time() - entry['loaded_at'] < TODO_REPLICA_TTL:
+                self.counts['hits'] += 1
+                return entry['items']
+            return self._refresh(entity_id)[0]
+
+    def _refresh(self, entity_id):
+        """Refetch a list (caller holds its list lock); returns (items, changed)"""
+        self.counts['fetches'] += 1
+        result = self.call('todo', 'get_items', {'entity_id': entity_id}, return_response=True)
+        items = result.get('service_response', {}).get(entity_id, {}).get('items', [])
+        with self.lock:
+            self._resolve_temp_uids(entity_id, items)
+            for op in self.pending[entity_id]:
+                items = apply_todo_op(items, {**op, 'data': self._upstream_data(op)})[0]
+            previous = self.lists.get(entity_id)
+            self.lists[entity_id] = {'items': items, 'loaded_at': time.time(), 'stale': False}
+        return items, previous is None or previous['items'] != items
+
+    def _resolve_temp_uids(self, entity_id, items):
+        """Map forwarded new items to their real uids and retarget queued writes
+
+        Caller holds self.lock.
+        """
+        still_adding = {op['uid'] for op in self.pending[entity_id] if op['service'] == 'add_item'}
+        entry = self.lists.get(entity_id)
+        # Items we already knew (by real uid) can't be the new one, even with the same summary
+        taken = {item.get('uid') for item in entry['items']} if entry else set()
+        taken |= set(self.resolved.values())
+        for uid, (owner, summary) in self.temp_items.items():
+            if owner != entity_id or uid in still_adding or uid in self.resolved:
+                continue
+            matches = [item['uid'] for item in items
+                       if item.get('summary') == summary and item.get('uid') and item['uid'] not in taken]
+            if not matches:
+                continue
+            real = matches[-1]  # Home Assistant appends new items
+            self.resolved[uid] = real
+            taken.add(real)
+        if self.resolved:
+            for op in self.pending[entity_id]:
+                op['data'] = self._resolve_refs(op['data'])
+
+    def _resolve_refs(self, data):
+        """Service data with resolved temporary uids replaced by real ones (caller holds self.lock)"""
+        refs = data.get('item')
+        if isinstance(refs, list):
+            return {**data, 'item': [self.resolved.get(ref, ref) for ref in refs]}
+        if isinstance(refs, str) and refs in self.resolved:
+            return {**data, 'item': self.resolved[refs]}
+        return data
+
+    def refresh_and_notify(self, entity_id):
+        """Refetch a list and push it to the screens if it changed"""
+        with self.lock:
+            list_lock = self.list_locks[entity_id]
+        try:
+            with list_lock:
+                items, changed = self._refresh(entity_id)
+        except Exception as e:
+            print(f"Todo: Refresh of {entity_id} failed - {e}")
+            return
+        if changed:
+            notify_todo_changed({'entity_id': entity_id, 'items': items})
+
+    def changed(self, entity_id):
+        """A todo.* entity changed in Home Assistant: refetch it in the background"""
+        with self.lock:
+            if entity_id in self.lists:
+                self.lists[entity_id]['stale'] = True
+            if self.refresher is None:
+                self.refresher = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix='todo-refresh'
+                )
+        self.refresher.submit(self.refresh_and_notify, entity_id)
+
+    def write(self, service, data):
+        """Apply a write locally, queue it for Home Assistant and return the delta"""
+        entity_id = data['entity_id']
+        op = {'service': service, 'entity_id': entity_id, 'data': dict(data)}
+        with self.lock:
+            if service == 'add_item':
+                self.next_temp_id += 1
+                op['uid'] = f"pending-{self.next_temp_id}"
+                self.temp_items[op['uid']] = [entity_id, data.get('item', '')]
+            else:
+                # A screen may still know the item by its temporary uid
+                op['data'] = self._resolve_refs(op['data'])
+            entry = self.lists.get(entity_id)
+            if entry:
+                entry['items'], delta = apply_todo_op(entry['items'], op)
+            else:
+                delta = apply_todo_op([], op)[1]
+            self.pending[entity_id].append(op)
+            self.counts['writes'] += 1
+            if self.forwarder is None:
+                self.forwarder = threading.Thread(target=self._forward_loop, name="todo-forward", daemon=True)
+                self.forwarder.start()
+        self.queue.put(op)
+        delta['entity_id'] = entity_id
+        notify_todo_changed(delta)
+        return delta
+
+    def _upstream_data(self, op):
+        """Service data for Home Assistant, with temporary uids replaced by summaries
+
+        Caller holds self.lock.
+        """
+        data = dict(op['data'])
+        refs = data.get('item')
+        if isinstance(refs, list):
+            data['item'] = [self.temp_items[ref][1] if ref in self.temp_items else ref for ref in refs]
+        elif op['service'] != 'add_item' and refs in self.temp_items:
+            data['item'] = self.temp_items[refs][1]
+        return data
+
+    def _forward_loop(self):
+        while True:
+            op = self.queue.get()
+            accepted = self._forward(op)
+            entity_id = op['entity_id']
+            with self.lock:
+                self.pending[entity_id].remove(op)
+                ref = op['data'].get('item')
+                if accepted and op['service'] == 'update_item' and 'rename' in op['data'] \
+                        and isinstance(ref, str) and ref in self.temp_items:
+                    # Home Assistant now knows the new item by its new name
+                    self.temp_items[ref][1] = op['data']['rename']
+                if not accepted and entity_id in self.lists:
+                    # Refetch on next use even if the refresh below fails
+                    self.lists[entity_id]['stale'] = True
+            if op['service'] == 'add_item' or not accepted:
+                # Pick up the real uid, or undo what Home Assistant refused
+                self.refresh_and_notify(entity_id)
+            with self.lock:
+                if not self.pending[entity_id]:
+                    # Nothing queued can refer to this list's temporary uids any more
+                    for uid in [uid for uid, (owner, _) in self.temp_items.items() if owner == entity_id]:
+                        del self.temp_items[uid]
+                        self.resolved.pop(uid, None)
+
+    def _forward(self, op):
+        """Send one write to Home Assistant; False if it was refused or kept failing
+
+        Home Assistant being down (breaker open, connection errors, 502-504)
+        doesn't use up attempts: the write waits for it to come back.
+        """
+        delay = 1
+        attempt = 0
+        while True:
+            try:
+                with self.lock:
+                    data = self._upstream_data(op)
+                self.call('todo', op['service'], data)
+                self.counts['forwarded'] += 1
+                return True
+            except HAUnavailable:
+                self.counts['waits'] += 1
+                time.sleep(max(1, ha_breaker.status()['retry_after']))
+                continue
+            except urllib.error.HTTPError as e:
+                if e.code < 500:
+                    print(f"Todo: Home Assistant rejected {op['service']} on {op['entity_id']} ({e.code})")
+                    break
+                error = e
+            except Exception as e:
+                error = e
+            if is_ha_outage(error):
+                self.counts['waits'] += 1
+                print(f"Todo: {op['service']} waiting for Home Assistant ({error}), retrying in {delay}s")
+            else:
+                attempt += 1
+                if attempt >= TODO_FORWARD_ATTEMPTS:
+                    break
+                self.counts['retries'] += 1
+                print(f"Todo: {op['service']} failed ({error}), retrying in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+        self.counts['failed'] += 1
+        return False
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'enabled': TODO_REPLICA,
+                'lists': {entity_id: len(entry['items']) for entity_id, entry in self.lists.items()},
+                'pending': sum(len(ops) for ops in self.pending.values()),
+                **self.counts,
+            }
+
+
+todo_replica = TodoReplica()
+
+
+def notify_todo_changed(delta):
+    """Push a todo change to all screens (callable from any thread)
+
+    delta has either 'items' (the whole list) or 'upserts' and 'removed'.
+    """
+    if websocket_loop:
+        message = json.dumps({'type': 'todo_updated', **delta, 'version': dashboard_version()})
+        asyncio.run_coroutine_threadsafe(broadcast_to_websockets(message), websocket_loop)
+
+
+# ==================== DISK CACHE ====================
+
+class DiskLRU:
+    """Files in one directory, evicted least recently used first
+
+    Entries are stored as <key>.<ext>, key being a 32-digit hex hash. A
+    file's mtime is its last use, so the LRU order survives restarts.
+    Concurrent get() calls for the same missing key share one create().
+    """
+
+    NAME = re.compile(r'^[0-9a-f]{32}\.[a-z0-9]+$')
+
+    def __init__(self, directory, max_bytes, max_files):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.entries = collections.OrderedDict()  # key -> (filename, size), least recently used first
+        self.creating = {}  # key -> lock held while that entry is created
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.counts = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:32]
+
+    def _load(self):
+        """Index files left by a previous run, oldest use first (called under lock)"""
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        found = []
+        for name in names:
+            if not self.NAME.match(name):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            found.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(found):
+            self.entries[name.partition('.')[0]] = (name, size)
+        self._trim()
+
+    def _trim(self):
+        total = sum(size for _, size in self.entries.values())
+        # The newest entry always stays, even if it alone is over the limit
+        while len(self.entries) > 1 and (total > self.max_bytes or len(self.entries) > self.max_files):
+            _, (name, size) = self.entries.popitem(last=False)
+            total -= size
+            self.counts['evictions'] += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def lookup(self, key):
+        """Filename of a cached entry, marking it as recently used"""
+        with self.lock:
+            self._load()
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+        try:
+            os.utime(os.path.join(self.directory, entry[0]))
+        except OSError:
+            pass
+        return entry[0]
+
+    def get(self, key, create):
+        """Filename for key, calling create() -> (ext, data) on a miss"""
+        name = self.lookup(key)
+        if name:
+            self.counts['hits'] += 1
+            return name
+        with self.lock:
+            create_lock = self.creating.setdefault(key, threading.Lock())
+        try:
+            with create_lock:
+                name = self.lookup(key)
+                if name:
+                    self.counts['hits'] += 1
+                    return name
+                self.counts['misses'] += 1
+                ext, data = create()
+                return self.store(key, ext, data)
+        finally:
+            with self.lock:
+                self.creating.pop(key, None)
+
+    def store(self, key, ext, data):
+        name = f"{key}.{ext}"
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+        with self.lock:
+            self.entries[key] = (name, len(data))
+            self._trim()
+        return name
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'files': len(self.entries),
+                'disk_bytes': sum(size for _, size in self.entries.values()),
+                'in_progress': len(self.creating),
+                **self.counts,
+            }
+
+
+def file_extension(url_path, content_type):
+    """Extension for a downloaded file, from its URL or else its content type"""
+    ext = os.path.splitext(url_path)[1].lstrip('.').lower()
+    if not re.fullmatch(r'[a-z0-9]+', ext):
+        ext = (mimetypes.guess_extension(content_type) or '.bin').lstrip('.')
+    return ext
+
+
+# ==================== TTS CACHE ====================
+
+class TTSCache:
+    """Audio rendered by Home Assistant's TTS, kept on disk for repeated phrases
+
+    Entries are keyed by a hash of the message, language, engine and options
+    and kept in a DiskLRU under TTS_CACHE_DIR. Pre-rendering runs on a
+    LatestOnlyWorker and gives way to live requests.
+    """
+
+    KEY_FIELDS = ('message', 'language', 'platform', 'engine_id', 'options')
+
+    def __init__(self, directory, max_bytes, max_files):
+        self.files = DiskLRU(directory, max_bytes, max_files)
+        self.live_renders = 0
+        self.lock = threading.Lock()
+        self.prerenderer = LatestOnlyWorker('TTS prerender', self._prerender)
+        self.counts = {'prerendered': 0, 'errors': 0}
+
+    @classmethod
+    def key(cls, request):
+        return DiskLRU.key({field: request.get(field) for field in cls.KEY_FIELDS})
+
+    def get(self, request, live=True):
+        """Filename of the audio for a tts_get_url request, rendering it on a miss"""
+        if live:
+            with self.lock:
+                self.live_renders += 1
+        try:
+            return self.files.get(self.key(request), lambda: self._render(request))
+        finally:
+            if live:
+                with self.lock:
+                    self.live_renders -= 1
+
+    def _render(self, request):
+        req = urllib.request.Request(
+            f"{HA_URL}/api/tts_get_url", data=json.dumps(request).encode(), method='POST'
+        )
+        req.add_header('Authorization', f'Bearer {HA_TOKEN}')
+        req.add_header('Content-Type', 'application/json')
+        with ha_urlopen(req) as response:
+            result = json.loads(response.read())
+        path = result.get('path') or urllib.parse.urlparse(result['url']).path
+        req = urllib.request.Request(f"{HA_URL}{path}")
+        req.add_header('Authorization', f'Bearer {HA_TOKEN}')
+        with ha_urlopen(req) as response:
+            audio = response.read()
+            content_type = response.headers.get_content_type()
+        return file_extension(path, content_type), audio
+
+    def prerender(self, requests):
+        """Render phrases that will be spoken soon (replaces any batch still waiting)"""
+        self.prerenderer.submit(requests)
+
+    def _prerender(self, requests):
+        for request in requests:
+            if self.files.lookup(self.key(request)):
+                continue
+            # Idle time only: let phrases being spoken right now go first
+            while self.live_renders:
+                time.sleep(0.5)
+            try:
+                self.get(request, live=False)
+                self.counts['prerendered'] += 1
+            except HAUnavailable:
+                return  # The rest can wait for the next batch
+            except Exception as e:
+                self.counts['errors'] += 1
+                print(f"TTS cache: Pre-render of {request.get('message')!r} failed - {e}")
+
+    def metrics(self):
+        return {'enabled': TTS_CACHE, **self.files.metrics(), **self.counts}
+
+
+tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_MB * 1024 * 1024, TTS_CACHE_MAX_FILES)
+
+
+# ==================== CAMERA HUB ====================
+
+def read_mjpeg_frames(response):
+    """Yield (content_type, image bytes) from a multipart/x-mixed-replace body"""
+    match = re.search(r'boundary="?([^";]+)"?', response.headers.get('Content-Type', ''))
+    marker = (match.group(1) if match else 'frame').encode().lstrip(b'-')
+
+    def is_boundary(line):
+        return line.strip().lstrip(b'-').rstrip(b'-') == marker
+
+    at_boundary = False
+    while True:
+        while not at_boundary:
+            line = response.readline()
+            if not line:
+                return
+            at_boundary = is_boundary(line)
+        at_boundary = False
+        headers = {}
+        while True:
+            line = response.readline()
+            if not line:
+                return
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.partition(b':')
+            headers[name.strip().lower()] = value.strip().decode('latin-1')
+        length = headers.get(b'content-length', '')
+        if length.isdigit():
+            data = response.read(int(length))
+        else:
+            # No length given: the part runs up to the next boundary
+            lines = []
+            while True:
+                line = response.readline()
+                if not line:
+                    return
+                if is_boundary(line):
+                    at_boundary = True
+                    break
+                lines.append(line)
+            data = b''.join(lines)[:-2] if lines and lines[-1].endswith(b'\r\n') else b''.join(lines)
+        if data:
+            yield headers.get(b'content-type', 'image/jpeg'), data
+
+
+class CameraFeed:
+    """One camera's upstream connection and its latest frame
+
+    A single thread reads Home Assistant's MJPEG stream for the camera, or
+    polls snapshots if the stream fails, and publishes each frame to every
+    waiting viewer. The thread runs while there are viewers and stops
+    CAMERA_IDLE_TIMEOUT seconds after the last one leaves; the last frame
+    stays in memory so the next viewer gets a picture immediately.
+    """
+
+    def __init__(self, entity_id):
+        self.entity_id = entity_id
+        self.cond = threading.Condition()
+        self.viewers = 0
+        self.last_viewer = time.time()
+        self.thread = None
+        self.response = None
+        self.mode = 'stream'
+        self.frame = None
+        self.content_type = 'image/jpeg'
+        self.frame_time = 0
+        self.seq = 0
+        self.upstream_opens = 0
+        self.error = None
+
+    def acquire(self):
+        with self.cond:
+            self.viewers += 1
+            if self.thread is None:
+                self.mode = 'stream'
+                self.thread = threading.Thread(
+                    target=self._run, name=f"camera-{self.entity_id}", daemon=True
+                )
+                self.thread.start()
+
+    def release(self):
+        with self.cond:
+            self.viewers -= 1
+            self.last_viewer = time.time()
+
+    def _idle(self):
+        """True once nobody has watched for CAMERA_IDLE_TIMEOUT (caller holds cond)"""
+        return self.viewers <= 0 and time.time() - self.last_viewer > CAMERA_IDLE_TIMEOUT
+
+    def wait_frame(self, after_seq, timeout=CAMERA_FRAME_TIMEOUT):
+        """Next frame newer than after_seq as (seq, content_type, data), or None"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > after_seq, timeout):
+                return None
+            return self.seq, self.content_type, self.frame
+
+    def snapshot(self, max_age):
+        """Latest frame if it is recent enough, otherwise the next one"""
+        with self.cond:
+            if self.frame is not None and time.time() - self.frame_time <= max_age:
+                return self.seq, self.content_type, self.frame
+            seq = self.seq
+        return self.wait_frame(seq)
+
+    def _publish(self, content_type, data):
+        with self.cond:
+            self.frame = data
+            self.content_type = content_type
+            self.frame_time = time.time()
+            self.seq += 1
+            self.error = None
+            self.cond.notify_all()
+
+    def _open(self, path):
+        req = urllib.request.Request(f"{HA_URL}{path}")
+        req.add_header('Authorization', f'Bearer {HA_TOKEN}')
+        self.upstream_opens += 1
+        return ha_urlopen(req)
+
+    def _run(self):
+        delay = CAMERA_SNAPSHOT_INTERVAL
+        while True:
+            with self.cond:
+                if self._idle():
+                    self.thread = None
+                    return
+            try:
+                if self.mode == 'stream':
+                    self._stream()
+                else:
+                    with self._open(f"/api/camera_proxy/{self.entity_id}") as response:
+                        self._publish(response.headers.get_content_type(), response.read())
+                    time.sleep(CAMERA_SNAPSHOT_INTERVAL)
+                delay = CAMERA_SNAPSHOT_INTERVAL
+            except HAUnavailable as e:
+                # Not the camera's fault: keep the mode and wait for the breaker
+                self.error = str(e)
+                time.sleep(max(1, ha_breaker.status()['retry_after']))
+            except Exception as e:
+                self.error = str(e)
+                if self.mode == 'stream':
+                    print(f"Camera hub: {self.entity_id} stream failed ({e}), polling snapshots")
+                    self.mode = 'snapshot'
+                    continue
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def _stream(self):
+        with self._open(f"/api/camera_proxy_stream/{self.entity_id}") as response:
+            frames = 0
+            for content_type, data in read_mjpeg_frames(response):
+                self._publish(content_type, data)
+                frames += 1
+                with self.cond:
+                    if self._idle():
+                        return
+            if not frames:
+                raise ConnectionError("stream ended without a frame")
+
+    def metrics(self):
+        with self.cond:
+            return {
+                'viewers': self.viewers,
+                'running': self.thread is not None,
+                'mode': self.mode,
+                'frames': self.seq,
+                'frame_age': round(time.time() - self.frame_time, 1) if self.frame else None,
+                'upstream_opens': self.upstream_opens,
+                'error': self.error,
+            }
+
+
+class CameraHub:
+    """CameraFeed per camera entity, created on first use"""
+
+    def __init__(self):
+        self.feeds = {}
+        self.lock = threading.Lock()
+
+    def feed(self, entity_id):
+        with self.lock:
+            if entity_id not in self.feeds:
+                self.feeds[entity_id] = CameraFeed(entity_id)
+            return self.feeds[entity_id]
+
+    def metrics(self):
+        with self.lock:
+            feeds = dict(self.feeds)
+        return {'enabled': CAMERA_HUB, 'cameras': {entity_id: feed.metrics() for entity_id, feed in feeds.items()}}
+
+
+camera_hub = CameraHub()
+
+
+# ==================== QURAN CACHE ====================
+
+def fetch_url(url, timeout=60):
+    """GET a URL, returning (content_type, body)"""
+    req = urllib.request.Request(url, headers={'User-Agent': 'skylight-dashboard'})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return response.headers.get_content_type(), response.read()
+
+
+class QuranCache:
+    """Caching proxy for the alquran.cloud API and its recitation audio
+
+    API responses are stored with their audio URLs rewritten to
+    /api/quran/audio?src=..., so verses and recitations both come from the
+    server's DiskLRU and keep working offline once fetched. Only audio from
+    the API host or QURAN_AUDIO_HOSTS is proxied. The upstream is
+    QURAN_API_URL fetched with fetch(url) -> (content_type, body), so both
+    can be pointed at a local stand-in.
+    """
+
+    def __init__(self, api_url, audio_hosts, directory, max_bytes, fetch=fetch_url):
+        self.api_url = api_url.rstrip('/')
+        self.audio_hosts = set(audio_hosts) | {urllib.parse.urlsplit(self.api_url).netloc}
+        self.files = DiskLRU(directory, max_bytes, max_files=1_000_000)
+        self.fetch = fetch
+        self.prefetcher = None
+        self.counts = {'prefetched': 0, 'errors': 0}
+
+    def is_audio_url(self, value):
+        parts = urllib.parse.urlsplit(value)
+        return parts.scheme in ('http', 'https') and parts.netloc in self.audio_hosts
+
+    def _rewrite(self, value, sources):
+        """Point audio URLs in an API response at the local proxy, collecting them"""
+        if isinstance(value, dict):
+            return {k: self._rewrite(v, sources) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._rewrite(v, sources) for v in value]
+        if isinstance(value, str) and self.is_audio_url(value):
+            sources.append(value)
+            return '/api/quran/audio?src=' + urllib.parse.quote(value, safe='')
+        return value
+
+    def api(self, path):
+        """Cached filename of the API response for path (e.g. 'surah/36/ar.alafasy')"""
+        def create():
+            _, body = self.fetch(f"{self.api_url}/v1/{path}")
+            result = json.loads(body)
+            if result.get('code') != 200:
+                raise ValueError(f"alquran.cloud answered {result.get('code')}: {result.get('status')}")
+            return 'json', json.dumps(self._rewrite(result, [])).encode()
+        return self.files.get(DiskLRU.key('api', path), create)
+
+    def audio(self, src):
+        """Cached filename of a recitation; src must be on an allowed host"""
+        if not self.is_audio_url(src):
+            raise PermissionError(f"Not a Quran audio URL: {src}")
+
+        def create():
+            content_type, body = self.fetch(src)
+            return file_extension(urllib.parse.urlsplit(src).path, content_type), body
+        return self.files.get(DiskLRU.key('audio', src), create)
+
+    def audio_sources(self, name):
+        """Original audio URLs referenced by a cached API response"""
+        with open(self.files.path(name), 'rb') as f:
+            result = json.loads(f.read())
+        sources = []
+
+        def collect(value):
+            if isinstance(value, dict):
+                for v in value.values():
+                    collect(v)
+            elif isinstance(value, list):
+                for v in value:
+                    collect(v)
+            elif isinstance(value, str) and value.startswith('/api/quran/audio?src='):
+                sources.append(urllib.parse.unquote(value.partition('src=')[2]))
+        collect(result)
+        return sources
+
+    def start_prefetch(self):
+        """Download QURAN_PREFETCH (text and audio) during QURAN_PREFETCH_HOURS"""
+        if QURAN_PREFETCH and self.prefetcher is None:
+            self.prefetcher = threading.Thread(target=self._prefetch_loop, name="quran-prefetch", daemon=True)
+            self.prefetcher.start()
+
+    def _quiet_hours(self):
+        start, end = QURAN_PREFETCH_HOURS
+        hour = datetime.now().hour
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def _prefetch_loop(self):
+        while True:
+            if self._quiet_hours():
+                self._prefetch()
+            time.sleep(600)
+
+    def _prefetch(self):
+        for path in QURAN_PREFETCH:
+            try:
+                sources = self.audio_sources(self.api(path))
+            except Exception as e:
+                self.counts['errors'] += 1
+                print(f"Quran cache: Prefetch of {path} failed - {e}")
+                continue
+            for src in sources:
+                if not self._quiet_hours():
+                    return
+                if self.files.lookup(DiskLRU.key('audio', src)):
+                    continue
+                try:
+                    self.audio(src)
+                    self.counts['prefetched'] += 1
+                except Exception as e:
+                    self.counts['errors'] += 1
+                    print(f"Quran cache: Prefetch of {src} failed - {e}")
+                time.sleep(0.2)  # Gentle on the CDN and the uplink
+
+    def metrics(self):
+        return {'enabled': QURAN_CACHE, **self.files.metrics(), **self.counts}
+
+
+quran_cache = QuranCache(
+    QURAN_API_URL, QURAN_AUDIO_HOSTS, QURAN_CACHE_DIR, QURAN_CACHE_MAX_MB * 1024 * 1024
+)
+
+
+# ==================== NAS I/O ====================
+
+PHOTO_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
+
+class NASTimeout(OSError):
+    """A filesystem call on a photo source missed its deadline"""
+
+
+class NASUnavailable(OSError):
+    """The photo source's mount is marked unhealthy"""
+
+
+class MountBreaker:
+    """Circuit breaker and worker pool for one mount point"""
+
+    def __init__(self, mount):
+        self.mount = mount
+        self.executor = None
+        self.in_flight = 0  # submitted calls not finished yet, including stuck ones
+        self.failures = 0
+        self.open = False
+        self.opened_at = None
+        self.probe = None  # thread probing the mount while open
+        self.last_error = None
+
+
+class NASExecutor:
+    """Runs filesystem calls on photo sources off the request threads
+
+    Each call runs on its mount's own pool with a deadline, so workers stuck
+    on a hung mount never delay calls to a healthy one. A request that misses
+    the deadline gets NASTimeout at once; its call is cancelled if it has not
+    started, otherwise the stuck worker finishes (or hangs) on its own. Every mount has a MountBreaker: NAS_FAILURE_THRESHOLD consecutive
+    timeouts or I/O errors open it, further calls fail immediately with
+    NASUnavailable so handlers fall back to the photo cache, and a background
+    probe closes it again once the mount answers. Missing files and permission
+    errors are the caller's problem, not the mount's, and do not count.
+    """
+
+    CALLER_ERRORS = (FileNotFoundError, PermissionError, NotADirectoryError, IsADirectoryError)
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.mounts = None
+        self.counts = {'calls': 0, 'timeouts': 0, 'errors': 0, 'rejected': 0}
+
+    def mount_of(self, path):
+        """Mount point holding path, from /proc/mounts (no I/O on the mount itself)"""
+        path = os.path.abspath(path)
+        if self.mounts is None:
+            try:
+                with open('/proc/mounts') as f:
+                    mounts = [line.split()[1].replace('\\040', ' ') for line in f if line.strip()]
+            except OSError:
+                mounts = []
+            self.mounts = sorted(set(mounts), key=len, reverse=True)
+        for mount in self.mounts:
+            if path == mount or path.startswith(mount.rstrip('/') + '/'):
+                if mount != '/':
+                    return mount
+                break
+        # Unknown layout: treat the first two levels (/mnt/nas, /Volumes/Photos) as the mount
+        return '/' + '/'.join(path.strip('/').split('/')[:2])
+
+    def call(self, path, func, *args, timeout=NAS_IO_TIMEOUT):
+        """Run func(*args) for something under path, within timeout seconds"""
+        mount = self.mount_of(path)
+        with self.lock:
+            breaker = self.breakers.setdefault(mount, MountBreaker(mount))
+            if breaker.open:
+                self.counts['rejected'] += 1
+                raise NASUnavailable(f"{mount} is unavailable ({breaker.last_error})")
+            if breaker.executor is None:
+                breaker.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='nas-io'
+                )
+            self.counts['calls'] += 1
+            breaker.in_flight += 1
+        future = breaker.executor.submit(func, *args)
+        future.add_done_callback(lambda f: self._done(breaker))
+        try:
+            result = future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # Nobody is waiting any more: don't run it later against a recovering mount
+            future.cancel()
+            self.counts['timeouts'] += 1
+            self._failure(breaker, f"timed out after {timeout}s")
+            raise NASTimeout(f"{path}: no answer from {mount} within {timeout}s")
+        except self.CALLER_ERRORS:
+            raise
+        except OSError as e:
+            self.counts['errors'] += 1
+            self._failure(breaker, str(e))
+            raise
+        with self.lock:
+            breaker.failures = 0
+        return result
+
+    def _done(self, breaker):
+        with self.lock:
+            breaker.in_flight -= 1
+
+    def _failure(self, breaker, error):
+        with self.lock:
+            breaker.failures += 1
+            breaker.last_error = error
+            if breaker.open or breaker.failures < NAS_FAILURE_THRESHOLD:
+                return
+            breaker.open = True
+            breaker.opened_at = time.time()
+            breaker.probe = threading.Thread(
+                target=self._probe_until_healthy, args=(breaker,), name="nas-probe", daemon=True
+            )
+        print(f"NAS: {breaker.mount} marked unavailable ({error})")
+        breaker.probe.start()
+
+    def _probe_until_healthy(self, breaker):
+        """Stat the mount root every NAS_PROBE_INTERVAL until it answers in time"""
+        attempt = None
+        while True:
+            time.sleep(NAS_PROBE_INTERVAL)
+            # A previous probe may still be stuck in the kernel; never stack them
+            if attempt is None or not attempt.is_alive():
+                answered = threading.Event()
+
+                def probe():
+                    # Any prompt answer will do: an error now fails fast instead of hanging
+                    try:
+                        os.stat(breaker.mount)
+                    except OSError:
+                        pass
+                    answered.set()
+                attempt = threading.Thread(target=probe, daemon=True)
+                attempt.start()
+                attempt.join(NAS_IO_TIMEOUT)
+                if answered.is_set():
+                    with self.lock:
+                        breaker.open = False
+                        breaker.failures = 0
+                        breaker.probe = None
+                    print(f"NAS: {breaker.mount} is back")
+                    return
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'workers_per_mount': self.workers,
+                'in_flight': sum(b.in_flight for b in self.breakers.values()),
+                'mounts': {
+                    mount: {
+                        'healthy': not b.open,
+                        'in_flight': b.in_flight,
+                        'failures': b.failures,
+                        'unavailable_for': int(time.time() - b.opened_at) if b.open else 0,
+                        'last_error': b.last_error,
+                    }
+                    for mount, b in self.breakers.items()
+                },
+                **self.counts,
+            }
+
+
+nas_io = NASExecutor(NAS_IO_WORKERS)
+
+
+def scan_photo_folder(folder_path):
+    """Photos directly in folder_path, newest first (runs on the NAS executor)"""
+    photos = []
+    for entry in os.scandir(folder_path):
+        if is_photo_entry(entry):
+            stat = entry.stat()
+            photos.append({
+                'name': entry.name,
+                'path': entry.path,
+                'mtime': stat.st_mtime,
+                'size': stat.st_size
+            })
+    # Sort by modification time (newest first)
+    photos.sort(key=lambda x: x['mtime'], reverse=True)
+    return photos
+
+
+def read_photo(image_path):
+    """Bytes of a photo, or None if it is not a file (runs on the NAS executor)"""
+    if not os.path.isfile(image_path):
+        return None
+    with open(os.path.realpath(image_path), 'rb') as f:
+        return f.read()
+
+
+def folder_version(path):
+    """(folder, mtime_ns) for path, a file standing for its parent folder (runs on the NAS executor)"""
+    if os.path.isfile(path):
+        path = os.path.dirname(path)
+    return path, os.stat(path).st_mtime_ns
+
+
+def is_photo_entry(entry):
+    """True for a visible photo file (AppleDouble ._ files and other hidden names are skipped)"""
+    return (not entry.name.startswith('.') and os.path.splitext(entry.name)[1].lower() in PHOTO_EXTENSIONS
+            and entry.is_file())
+
+
+def scan_folder(path):
+    """Subfolders and photo count of one folder (runs on the NAS executor)
+
+    Subfolders are not opened: os.access flags the ones we cannot enter.
+    """
+    directories = []
+    image_count = 0
+    for entry in os.scandir(path):
+        if entry.name.startswith('.'):
+            continue  # Skip hidden files/folders
+        if entry.is_dir():
+            directory = {'name': entry.name, 'path': entry.path, 'type': 'directory'}
+            if not os.access(entry.path, os.R_OK | os.X_OK):
+                directory['locked'] = True
+            directories.append(directory)
+        elif is_photo_entry(entry):
+            image_count += 1
+    directories.sort(key=lambda e: e['name'].lower())
+    return directories, image_count
+
+
+def count_photos(path):
+    """Number of photos directly in path, without listing anything else (runs on the NAS executor)"""
+    return sum(1 for entry in os.scandir(path) if is_photo_entry(entry))
+
+
+class FolderListingCache:
+    """Folder picker listings, reused until the folder's mtime changes
+
+    Adding, removing or renaming an entry changes a directory's mtime, so a
+    single stat tells whether a cached listing is still valid. The newest
+    FOLDER_CACHE_SIZE folders are kept. Photo counts the picker shows next to
+    subfolders are kept separately (they are only a number each), so counting
+    a page of subfolders never pushes real listings out.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.listings = collections.OrderedDict()  # folder -> (mtime_ns, directories, image_count)
+        self.image_counts = collections.OrderedDict()  # folder -> (mtime_ns, image_count)
+        self.lock = threading.Lock()
+        self.counts = {'hits': 0, 'scans': 0, 'photo_counts': 0}
+
+    def get(self, path):
+        """(folder, directories, image_count, cached) for path; errors come from nas_io"""
+        folder, mtime = nas_io.call(path, folder_version, path)
+        with self.lock:
+            listing = self.listings.get(folder)
+            if listing and listing[0] == mtime:
+                self.listings.move_to_end(folder)
+                self.counts['hits'] += 1
+                return folder, listing[1], listing[2], True
+        directories, image_count = nas_io.call(folder, scan_folder, folder, timeout=NAS_SCAN_TIMEOUT)
+        with self.lock:
+            self.counts['scans'] += 1
+            self.listings[folder] = (mtime, directories, image_count)
+            self.listings.move_to_end(folder)
+            while len(self.listings) > self.size:
+                self.listings.popitem(last=False)
+        return folder, directories, image_count, False
+
+    def image_count(self, path):
+        """(folder, image_count) for path, from a cached listing or a files-only scan"""
+        folder, mtime = nas_io.call(path, folder_version, path)
+        with self.lock:
+            listing = self.listings.get(folder)
+            if listing and listing[0] == mtime:
+                self.counts['hits'] += 1
+                return folder, listing[2]
+            cached = self.image_counts.get(folder)
+            if cached and cached[0] == mtime:
+                self.image_counts.move_to_end(folder)
+                self.counts['hits'] += 1
+                return folder, cached[1]
+        image_count = nas_io.call(folder, count_photos, folder, timeout=NAS_SCAN_TIMEOUT)
+        with self.lock:
+            self.counts['photo_counts'] += 1
+            self.image_counts[folder] = (mtime, image_count)
+            self.image_counts.move_to_end(folder)
+            while len(self.image_counts) > self.size * 10:
+                self.image_counts.popitem(last=False)
+        return folder, image_count
+
+    def metrics(self):
+        with self.lock:
+            return {'folders': len(self.listings), 'counted_folders': len(self.image_counts), **self.counts}
+
+
+folder_listings = FolderListingCache(FOLDER_CACHE_SIZE)
+
+
+# ==================== HA CIRCUIT BREAKER ====================
+
+class HAUnavailable(Exception):
+    """The circuit breaker is refusing Home Assistant calls"""
+
+
+def ha_deadline(path):
+    """Timeout for a proxied Home Assistant call, from HA_ROUTE_DEADLINES"""
+    best = None
+    for prefix in HA_ROUTE_DEADLINES:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return HA_ROUTE_DEADLINES[best] if best else 30
+
+
+def is_ha_outage(error):
+    """True for errors meaning Home Assistant is down, not that a request was bad"""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in (502, 503, 504)
+    return isinstance(error, (urllib.error.URLError, TimeoutError, ConnectionError))
+
+
+class HACircuitBreaker:
+    """Fails Home Assistant calls fast while HA is down
+
+    HA_BREAKER_THRESHOLD consecutive outages (connection errors, timeouts,
+    502-504) open the breaker: calls then raise HAUnavailable at once instead
+    of waiting out their deadline. A background probe tries HA after
+    HA_BREAKER_COOLDOWN seconds (half-open), doubling the wait after each
+    failed probe, and closes the breaker when HA answers. Any successful call,
+    including the HA WebSocket authenticating, closes it too. Every change is
+    pushed to the screens as an ha_status message.
+    """
+
+    def __init__(self):
+        self.state = 'closed'  # closed | open | half_open
+        self.failures = 0
+        self.cooldown = HA_BREAKER_COOLDOWN
+        self.retry_at = 0
+        self.last_error = None
+        self.probe = None
+        self.lock = threading.Lock()
+        self.counts = {'opened': 0, 'rejected': 0, 'probes': 0}
+
+    def before_call(self):
+        if self.state != 'closed':
+            self.counts['rejected'] += 1
+            raise HAUnavailable(f"Home Assistant unavailable ({self.last_error})")
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state == 'closed':
+                return
+            self.state = 'closed'
+            self.cooldown = HA_BREAKER_COOLDOWN
+        print("HA breaker: Home Assistant is back")
+        notify_ha_status()
+
+    def record_failure(self, error):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state != 'closed' or self.failures < HA_BREAKER_THRESHOLD:
+                return
+            self.state = 'open'
+            self.retry_at = time.time() + self.cooldown
+            self.counts['opened'] += 1
+            if self.probe is None:
+                self.probe = threading.Thread(target=self._probe_loop, name="ha-breaker-probe", daemon=True)
+                self.probe.start()
+        print(f"HA breaker: Open after {self.failures} failures ({error})")
+        notify_ha_status()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(max(0, self.retry_at - time.time()))
+            with self.lock:
+                if self.state == 'closed':
+                    self.probe = None
+                    return
+                self.state = 'half_open'
+                self.counts['probes'] += 1
+            try:
+                req = urllib.request.Request(f"{HA_URL}/api/")
+                req.add_header('Authorization', f'Bearer {HA_TOKEN}')
+                urllib.request.urlopen(req, context=ssl_context, timeout=5).close()
+                answered = True
+            except urllib.error.HTTPError as e:
+                answered = not is_ha_outage(e)
+                self.last_error = str(e)
+            except Exception as e:
+                answered = False
+                self.last_error = str(e)
+            if answered:
+                self.record_success()
+                with self.lock:
+                    if self.state == 'closed':
+                        self.probe = None
+                        return
+                continue
+            with self.lock:
+                if self.state == 'closed':
+                    self.probe = None
+                    return
+                self.state = 'open'
+                self.cooldown = min(self.cooldown * 2, HA_BREAKER_MAX_COOLDOWN)
+                self.retry_at = time.time() + self.cooldown
+            notify_ha_status()
+
+    def status(self):
+        return {
+            'state': self.state,
+            'retry_after': max(0, round(self.retry_at - time.time())) if self.state != 'closed' else 0,
+        }
+
+    def metrics(self):
+        with self.lock:
+            return {**self.status(), 'failures': self.failures, 'last_error': self.last_error, **self.counts}
+
+
+ha_breaker = HACircuitBreaker()
+
+
+def ha_urlopen(req):
+    """urlopen a Home Assistant request through the breaker, with its route's deadline
+
+    Raises HAUnavailable at once while the breaker is open.
+    """
+    ha_breaker.before_call()
+    try:
+        response = urllib.request.urlopen(
+            req, context=ssl_context, timeout=ha_deadline(urllib.parse.urlsplit(req.full_url).path)
+        )
+    except Exception as e:
+        if is_ha_outage(e):
+            ha_breaker.record_failure(e)
+        else:
+            ha_breaker.record_success()
+        raise
+    ha_breaker.record_success()
+    return response
+
+
+class HAResponseCache:
+    """Last good body of recent JSON GETs, served stale while HA is down"""
+
+    MAX_BODY = 512 * 1024
+
+    def __init__(self, size):
+        self.size = size
+        self.responses = collections.OrderedDict()  # path -> (content_type, body)
+        self.lock = threading.Lock()
+        self.served = 0
+
+    def put(self, path, content_type, body):
+        with self.lock:
+            self.responses[path] = (content_type, body)
+            self.responses.move_to_end(path)
+            while len(self.responses) > self.size:
+                self.responses.popitem(last=False)
+
+    def get(self, path):
+        with self.lock:
+            return self.responses.get(path)
+
+    def metrics(self):
+        with self.lock:
+            return {'entries': len(self.responses), 'served_stale': self.served}
+
+
+ha_response_cache = HAResponseCache(HA_STALE_CACHE_SIZE)
+
+
+def notify_ha_status():
+    """Tell all screens whether Home Assistant is reachable (callable from any thread)"""
+    if websocket_loop:
+        message = json.dumps({'type': 'ha_status', **ha_breaker.status(), 'version': dashboard_version()})
+        asyncio.run_coroutine_threadsafe(broadcast_to_websockets(message), websocket_loop)
+
+
+# ==================== HOME ASSISTANT WEBSOCKET SUBSCRIPTION ====================
+
+class HAWebSocketClient:
+    """WebSocket client for subscribing to Home Assistant real-time events"""
+
+    def __init__(self):
+        self.ws = None
+        self.connected = False
+        self.authenticated = False
+        self.message_id = 0
+        self.subscriptions = {}
+        self.reconnect_delay = 5
+        self.running = False
+
+    async def connect(self):
+        """Connect to Home Assistant WebSocket API"""
+        try:
+            import websockets
+        except ImportError:
+            print("HA-WS: websockets not installed. Run: pip install websockets")
+            return False
+
+        # Convert HTTP URL to WebSocket URL
+        ws_url = HA_URL.replace('https://', 'wss://').replace('http://', 'ws://')
+        ws_url = f"{ws_url}/api/websocket"
+
+        print(f"HA-WS: Connecting to {ws_url}...")
+
+        try:
+            self.ws = await websockets.connect(
+                ws_url,
+                ssl=ssl_context if ws_url.startswith('wss://') else None,  # Accepts self-signed certs
+                ping_interval=30,
+                ping_timeout=10,
+                max_size=WEBSOCKET_MAX_MESSAGE  # get_states can be several MB
+            )
+            self.connected = True
+            print("HA-WS: Connected")
+            return True
+        except Exception as e:
+            print(f"HA-WS: Connection failed - {e}")
+            return False
+
+    async def authenticate(self):
+        """Authenticate with Home Assistant"""
+        if not self.ws:
+            return False
+
+        try:
+            # Wait for auth_required message
+            msg = await asyncio.wait_for(self.ws.recv(), timeout=10)
+            data = json.loads(msg)
+
+            if data.get('type') != 'auth_required':
+                print(f"HA-WS: Unexpected message: {data}")
+                return False
+
+            # Send authentication
+            await self.ws.send(json.dumps({
+                'type': 'auth',
+                'access_token': HA_TOKEN
+            }))
+
+            # Wait for auth response
+            msg = await asyncio.wait_for(self.ws.recv(), timeout=10)
+            data = json.loads(msg)
+
+            if data.get('type') == 'auth_ok':
+                self.authenticated = True
+                ha_breaker.record_success()
+                print(f"HA-WS: Authenticated (HA version: {data.get('ha_version', 'unknown')})")
+                return True
+            else:
+                print(f"HA-WS: Authentication failed: {data}")
+                return False
+
+        except Exception as e:
+            print(f"HA-WS: Authentication error - {e}")
+            return False
+
+    def get_next_id(self):
+        """Get next message ID"""
         self.message_id += 1
         return self.message_id
 
@@ -767,6 +3092,28 @@ class HAWebSocketClient:
             except Exception as e:
                 pass  # Event type might not exist
 
+    async def sync_states(self):
+        """Bootstrap the state mirror with get_states
+
+        Called after subscribing to state_changed. Events that arrive before
+        the result are older than the snapshot, so they are handled normally
+        and then superseded by it.
+        """
+        msg_id = self.get_next_id()
+        await self.ws.send(json.dumps({'id': msg_id, 'type': 'get_states'}))
+        while True:
+            msg = await asyncio.wait_for(self.ws.recv(), timeout=30)
+            data = json.loads(msg)
+            if data.get('type') == 'event':
+                await self.handle_event(data.get('event', {}))
+            elif data.get('id') == msg_id:
+                break
+        if data.get('success'):
+            ha_states.load(data.get('result') or [])
+            return True
+        print(f"HA-WS: get_states failed: {data.get('error')}")
+        return False
+
     async def listen(self):
         """Listen for events and forward to browser clients"""
         if not self.ws:
@@ -778,6 +3125,7 @@ class HAWebSocketClient:
         while self.running:
             try:
                 msg = await asyncio.wait_for(self.ws.recv(), timeout=60)
+                ha_states.heard()
                 data = json.loads(msg)
 
                 if data.get('type') == 'event':
@@ -788,6 +3136,7 @@ class HAWebSocketClient:
                 try:
                     pong = await self.ws.ping()
                     await asyncio.wait_for(pong, timeout=10)
+                    ha_states.heard()
                 except:
                     print("HA-WS: Connection lost, reconnecting...")
                     break
@@ -798,6 +3147,7 @@ class HAWebSocketClient:
 
         self.connected = False
         self.authenticated = False
+        ha_states.disconnected()
 
     async def handle_event(self, event):
         """Process incoming HA event and forward to browsers"""
@@ -817,6 +3167,7 @@ class HAWebSocketClient:
         event_category = None
 
         if event_type == 'state_changed':
+            ha_states.apply(event_data)
             new_state = event_data.get('new_state', {})
             old_state = event_data.get('old_state', {})
             
@@ -837,6 +3188,8 @@ class HAWebSocketClient:
             elif entity_id.startswith('todo.'):
                 forward = True
                 event_category = 'todo'
+                if TODO_REPLICA:
+                    todo_replica.changed(entity_id)
             elif entity_id.startswith('weather.'):
                 forward = True
                 event_category = 'weather'
@@ -865,6 +3218,9 @@ class HAWebSocketClient:
         elif event_type in ['calendar_event_created', 'calendar_event_deleted', 'calendar_event_updated']:
             forward = True
             event_category = 'calendar'
+            # Drop cached events before screens reload them
+            for calendar in calendar_entities(entity_id) or [None]:
+                calendar_store.invalidate(calendar)
         elif event_type == 'call_service':
             # Check if it's a notification service call
             # NOTE: Do NOT forward calendar call_service events - they create a feedback loop
@@ -872,20 +3228,23 @@ class HAWebSocketClient:
             # Calendar changes are already caught by calendar_event_created/deleted/updated events
             service_data = event_data.get('service_data', {})
             domain = event_data.get('domain', '')
+            if domain == 'calendar' and event_data.get('service') != 'get_events':
+                for calendar in calendar_entities(service_data.get('entity_id')) or [None]:
+                    calendar_store.invalidate(calendar)
             if domain == 'persistent_notification':
                 forward = True
                 event_category = 'notification'
                 print(f"HA-WS: Notification service called - {event_data.get('service')}")
 
-        # Forward to browser clients
-        if forward and websocket_clients:
+        # Forward to browser clients (logged for replay even when none are connected)
+        if forward:
             message = json.dumps({
                 'type': 'ha_event',
                 'category': event_category,
                 'event_type': event_type,
                 'entity_id': entity_id,
                 'data': event_data,
-                'version': DASHBOARD_VERSION
+                'version': dashboard_version()
             })
             print(f"HA-WS: Broadcasting {event_category} event to {len(websocket_clients)} clients")
             await broadcast_to_websockets(message)
@@ -914,10 +3273,14 @@ async def run_ha_websocket():
                     await ha_ws.subscribe_to_calendar_events()
                     # Subscribe to notification events (HA 2025+)
                     await ha_ws.subscribe_to_notification_events()
+                    # (Re)build the entity state mirror
+                    if HA_STATE_MIRROR:
+                        await ha_ws.sync_states()
                     # Listen for events
                     await ha_ws.listen()
         except Exception as e:
             print(f"HA-WS: Error - {e}")
+        ha_states.disconnected()
 
         # Reconnect after delay
         print(f"HA-WS: Reconnecting in {ha_ws.reconnect_delay} seconds...")
@@ -941,37 +3304,147 @@ def start_ha_websocket_thread():
 
 # ==================== WEBSOCKET SERVER ====================
 
+class BroadcastLog:
+    """Sequence numbers and a replay buffer for broadcasts to the browser
+
+    Every replayable broadcast gets the next sequence number and is kept in a
+    ring buffer, so a screen that reconnects can ask for what it missed. The
+    session id changes on every server start, which tells screens that their
+    old sequence numbers mean nothing here.
+    """
+
+    def __init__(self, size):
+        self.session = os.urandom(6).hex()
+        self.seq = 0
+        self.entries = collections.deque(maxlen=size)  # (seq, message)
+        self.lock = threading.Lock()
+        self.replayed = 0
+        self.resyncs = 0
+
+    def append(self, message):
+        """Number a JSON object message and remember it; returns the new text"""
+        with self.lock:
+            self.seq += 1
+            message = f'{{"seq": {self.seq}, {message[1:]}'
+            self.entries.append((self.seq, message))
+            return message
+
+    def covers(self, seq):
+        """True if every broadcast after seq is still in the buffer"""
+        with self.lock:
+            if seq > self.seq:
+                return False
+            oldest = self.entries[0][0] if self.entries else self.seq + 1
+            return seq >= oldest - 1
+
+    def since(self, seq):
+        with self.lock:
+            return [(s, m) for s, m in self.entries if s > seq]
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'seq': self.seq,
+                'buffered': len(self.entries),
+                'capacity': self.entries.maxlen,
+                'replayed': self.replayed,
+                'resyncs': self.resyncs,
+            }
+
+
+broadcast_log = BroadcastLog(BROADCAST_LOG_SIZE)
+websocket_pending = set()  # Connected, but not yet caught up with the log
+
+
+async def catch_up(websocket, after_seq):
+    """Send logged broadcasts newer than after_seq, then make the client live
+
+    Live broadcasts skip pending clients, so anything sent while replaying is
+    picked up by the next pass; the last check and the switch to live happen
+    without yielding to the event loop, so nothing falls in between.
+    """
+    while True:
+        missed = broadcast_log.since(after_seq)
+        if not missed:
+            websocket_pending.discard(websocket)
+            return
+        for seq, message in missed:
+            await websocket.send(message)
+            after_seq = seq
+        broadcast_log.replayed += len(missed)
+
+
+def is_kiosk_connection(websocket):
+    """True if this browser is the kiosk: HEALTH_KIOSK_ADDRESS, or by default one on this machine"""
+    try:
+        remote = websocket.remote_address[0]
+        local = websocket.local_address[0]
+    except (AttributeError, TypeError, IndexError):
+        return False
+    remote = remote.removeprefix('::ffff:')
+    if HEALTH_KIOSK_ADDRESS:
+        return remote == HEALTH_KIOSK_ADDRESS
+    return remote == local.removeprefix('::ffff:') or remote in ('127.0.0.1', '::1')
+
+
 async def websocket_handler(websocket):
     """Handle WebSocket connections from browser"""
-    global websocket_clients
+    global websocket_clients, kiosk_client
 
     websocket_clients.add(websocket)
-    print(f"WebSocket: Client connected ({len(websocket_clients)} total)")
+    websocket_pending.add(websocket)
+    connected_seq = broadcast_log.seq
+    if is_kiosk_connection(websocket):
+        # A reloaded kiosk page replaces its old connection
+        kiosk_client = websocket
+        kiosk_health.record_connect()
+    print(f"WebSocket: Client connected ({len(websocket_clients)} total{', kiosk' if kiosk_client is websocket else ''})")
 
     try:
+        await websocket.send(json.dumps({
+            'type': 'hello',
+            'session': broadcast_log.session,
+            'seq': connected_seq,
+            'ha_status': ha_breaker.status(),
+            'version': dashboard_version()
+        }))
         async for message in websocket:
+            if isinstance(message, bytes):
+                # Binary frames carry raw screenshot images (only the kiosk is asked)
+                if websocket is kiosk_client:
+                    receive_screenshot(message)
+                continue
             try:
                 data = json.loads(message)
                 msg_type = data.get('type', '')
 
+                if websocket in websocket_pending:
+                    # The first message tells us whether the screen is resuming.
+                    # Older dashboards open with a state_update instead.
+                    if msg_type == 'resume':
+                        await resume_client(websocket, data, connected_seq)
+                        continue
+                    await catch_up(websocket, connected_seq)
+
                 if msg_type == 'state_update':
-                    # Browser reporting state change
-                    if mqtt_client and mqtt_client.connected:
-                        mqtt_client.update_state(data.get('state', {}))
+                    # Browser reporting state change; kept even without MQTT,
+                    # the health monitor needs screensaver_active
+                    state = data.get('state')
+                    if isinstance(state, dict):
+                        dashboard_state.update(state)
+                        if websocket is kiosk_client and 'screensaver_active' in state:
+                            kiosk_health.screensaver_active = bool(state['screensaver_active'])
+                        if mqtt_client and mqtt_client.connected:
+                            mqtt_client.publish_state()
 
                 elif msg_type == 'ping':
-                    await websocket.send(json.dumps({'type': 'pong', 'version': DASHBOARD_VERSION}))
-
-                elif msg_type == 'screenshot_data':
-                    # Browser sending screenshot data
-                    global latest_screenshot, screenshot_timestamp
-                    with screenshot_lock:
-                        latest_screenshot = data.get('image', '')
-                        screenshot_timestamp = time.time()
-                    print(f"Screenshot: Received ({len(latest_screenshot)} bytes)")
-                    # Publish to MQTT if connected
-                    if mqtt_client and mqtt_client.connected:
-                        mqtt_client.publish_screenshot(latest_screenshot)
+                    if websocket is kiosk_client:
+                        kiosk_health.record_ping()
+                    await websocket.send(json.dumps({'type': 'pong', 'version': dashboard_version()}))
+
+                elif msg_type == 'screenshot_data' and websocket is kiosk_client:
+                    # Older dashboards send a base64 data URL inside JSON
+                    receive_screenshot(data.get('image', ''))
 
             except json.JSONDecodeError:
                 print(f"WebSocket: Invalid JSON: {message}")
@@ -980,16 +3453,79 @@ async def websocket_handler(websocket):
         print(f"WebSocket: Connection error - {e}")
     finally:
         websocket_clients.discard(websocket)
+        websocket_pending.discard(websocket)
+        if kiosk_client is websocket:
+            kiosk_client = None
         print(f"WebSocket: Client disconnected ({len(websocket_clients)} remaining)")
 
 
-async def broadcast_to_websockets(message):
-    """Send message to all connected WebSocket clients"""
+async def resume_client(websocket, data, connected_seq):
+    """Replay what a reconnecting screen missed, or tell it to reload its data"""
+    last_seq = data.get('last_seq')
+    if (data.get('session') == broadcast_log.session and isinstance(last_seq, int)
+            and broadcast_log.covers(last_seq)):
+        print(f"WebSocket: Client resuming after seq {last_seq} ({broadcast_log.seq - last_seq} missed)")
+        await catch_up(websocket, last_seq)
+        return
+    broadcast_log.resyncs += 1
+    await websocket.send(json.dumps({
+        'type': 'resync',
+        'session': broadcast_log.session,
+        'seq': connected_seq,
+        'version': dashboard_version()
+    }))
+    await catch_up(websocket, connected_seq)
+
+
+def receive_screenshot(message):
+    """Store a screenshot from the browser and publish it to MQTT if it changed"""
+    try:
+        screenshot, changed = store_screenshot(message)
+    except (ValueError, TypeError) as e:
+        print(f"Screenshot: Ignoring invalid image - {e}")
+        return
+    print(f"Screenshot: Received ({len(screenshot.data)} bytes{'' if changed else ', unchanged'})")
+    kiosk_health.record_screenshot(screenshot)
+    if not changed:
+        return
+    screenshot_history.add(screenshot)
+    if mqtt_client and mqtt_client.connected:
+        mqtt_client.publish_screenshot(screenshot.data)
+
+
+def request_screenshot():
+    """Ask the kiosk browser for a screenshot; False if it is not connected"""
+    client = kiosk_client
+    if not (websocket_loop and client):
+        return False
+    asyncio.run_coroutine_threadsafe(send_screenshot_request(client), websocket_loop)
+    return True
+
+
+async def send_screenshot_request(websocket):
+    try:
+        await websocket.send(json.dumps({'type': 'screenshot_request'}))
+    except Exception as e:
+        print(f"Screenshot: Request to kiosk failed - {e}")
+
+
+async def broadcast_to_websockets(message, replay=True):
+    """Send message to all connected WebSocket clients
+
+    JSON object messages are sequenced and kept for reconnecting screens
+    unless replay is False (one-off commands that make no sense late).
+    """
+    if replay and message.startswith('{"'):
+        message = broadcast_log.append(message)
+    else:
+        replay = False
     if not websocket_clients:
         return
 
     disconnected = set()
-    for ws in websocket_clients:
+    for ws in list(websocket_clients):
+        if replay and ws in websocket_pending:
+            continue  # Gets it from the log when it catches up
         try:
             await ws.send(message)
         except Exception:
@@ -998,6 +3534,17 @@ async def broadcast_to_websockets(message):
     websocket_clients.difference_update(disconnected)
 
 
+def notify_habits_changed(habits):
+    """Push updated habit stats to all screens (callable from any thread)"""
+    if websocket_loop:
+        message = json.dumps({
+            'type': 'habits_updated',
+            'habits': habits,
+            'version': dashboard_version()
+        })
+        asyncio.run_coroutine_threadsafe(broadcast_to_websockets(message), websocket_loop)
+
+
 async def start_websocket_server():
     """Start the WebSocket server"""
     try:
@@ -1012,7 +3559,8 @@ async def start_websocket_server():
         "0.0.0.0",  # Bind to all interfaces for network access
         WS_PORT,
         ping_interval=30,
-        ping_timeout=10
+        ping_timeout=10,
+        max_size=WEBSOCKET_MAX_MESSAGE
     ):
         await asyncio.Future()  # Run forever
 
@@ -1029,30 +3577,845 @@ def run_websocket_server():
         print(f"WebSocket: Server error - {e}")
 
 
+# ==================== HTTP WORKER POOL ====================
+
+class PooledHTTPServer(socketserver.TCPServer):
+    """TCP server that hands connections to a fixed pool of worker threads
+
+    Accepted connections wait in a bounded queue. When the queue is full, or a
+    connection has waited longer than the request timeout, the client gets an
+    immediate 503 with Retry-After instead of another thread being spawned.
+
+    Workers serve requests, not connections: an idle keep-alive connection is
+    parked on a selector and queued again when its next request arrives (or
+    closed after HTTP_KEEPALIVE_TIMEOUT), so open browser tabs don't hold
+    workers. Responses that may never end (MJPEG streams) are handed off to
+    their own thread.
+    """
+    allow_reuse_address = True
+    park_idle_connections = True
+
+    def __init__(self, server_address, handler_class, workers=HTTP_WORKERS,
+                 queue_size=HTTP_QUEUE_SIZE, request_timeout=HTTP_REQUEST_TIMEOUT):
+        super().__init__(server_address, handler_class)
+        self.workers = workers
+        self.request_timeout = request_timeout
+        self.request_queue = queue.Queue(maxsize=queue_size)
+        self.stats_lock = threading.Lock()
+        self.active_workers = 0
+        self.handled_count = 0
+        self.shed_count = 0
+        self.streams = 0
+        self.selector = selectors.DefaultSelector()
+        self.parking = queue.SimpleQueue()  # connections for the selector thread to watch
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ)
+        self.parked = 0
+        threading.Thread(target=self._watch_parked, name="http-keepalive", daemon=True).start()
+        self.worker_threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"http-worker-{i}", daemon=True)
+            thread.start()
+            self.worker_threads.append(thread)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def process_request(self, request, client_address):
+        """Queue the connection for a worker (called from the accept loop)"""
+        try:
+            self.request_queue.put_nowait((request, client_address, time.monotonic()))
+        except queue.Full:
+            self._shed(request)
+
+    def _worker(self):
+        while True:
+            item = self.request_queue.get()
+            if item is None:
+                break
+            request, client_address, queued_at = item
+            if time.monotonic() - queued_at > self.request_timeout:
+                # Client has most likely given up already
+                self._shed(request)
+                continue
+
+            with self.stats_lock:
+                self.active_workers += 1
+            handler = None
+            try:
+                request.settimeout(self.request_timeout)
+                handler = self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                if getattr(handler, 'idle', False):
+                    self.parking.put((request, client_address))
+                    self.wakeup_w.send(b'\0')
+                elif not getattr(handler, 'handed_off', False):
+                    self.shutdown_request(request)
+                with self.stats_lock:
+                    self.active_workers -= 1
+                    self.handled_count += 1
+
+    def _watch_parked(self):
+        """Queue parked keep-alive connections again once their next request arrives"""
+        while True:
+            for key, _ in self.selector.select(timeout=1):
+                if key.fileobj is self.wakeup_r:
+                    try:
+                        while self.wakeup_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                self.selector.unregister(key.fileobj)
+                self.parked -= 1
+                self.process_request(key.fileobj, key.data[0])
+            while True:
+                try:
+                    request, client_address = self.parking.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    self.selector.register(request, selectors.EVENT_READ, (client_address, time.monotonic()))
+                    self.parked += 1
+                except (ValueError, OSError):
+                    self.shutdown_request(request)
+            # Idle too long: close, as a thread-per-connection server would
+            now = time.monotonic()
+            for key in list(self.selector.get_map().values()):
+                if key.data and now - key.data[1] > HTTP_KEEPALIVE_TIMEOUT:
+                    self.selector.unregister(key.fileobj)
+                    self.parked -= 1
+                    self.shutdown_request(key.fileobj)
+
+    def hand_off(self, handler, func, *args):
+        """Finish handler's response with func(*args) on a thread of its own"""
+        handler.handed_off = True
+        handler.close_connection = True
+
+        def run():
+            with self.stats_lock:
+                self.streams += 1
+            try:
+                func(*args)
+            except Exception:
+                self.handle_error(handler.request, handler.client_address)
+            finally:
+                handler.finish_handed_off()
+                self.shutdown_request(handler.request)
+                with self.stats_lock:
+                    self.streams -= 1
+        threading.Thread(target=run, name="http-stream", daemon=True).start()
+
+    def _shed(self, request):
+        """Reject a connection with 503 Service Unavailable"""
+        with self.stats_lock:
+            self.shed_count += 1
+        body = json.dumps({'error': 'Server busy, retry shortly'}).encode()
+        retry_after = max(1, int(self.request_timeout // 10))
+        response = (
+            "HTTP/1.1 503 Service Unavailable\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Retry-After: {retry_after}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode() + body
+        try:
+            request.settimeout(1)
+            request.sendall(response)
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def metrics(self):
+        """Snapshot of pool utilisation"""
+        with self.stats_lock:
+            return {
+                'mode': 'pool',
+                'workers': self.workers,
+                'active_workers': self.active_workers,
+                'queue_depth': self.request_queue.qsize(),
+                'queue_capacity': self.request_queue.maxsize,
+                'handled': self.handled_count,
+                'shed': self.shed_count,
+                'idle_keepalive_connections': self.parked,
+                'streams': self.streams,
+            }
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.worker_threads:
+            try:
+                self.request_queue.put_nowait(None)
+            except queue.Full:
+                break
+
+
+class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Thread-per-connection server (HTTP_SERVER_MODE = "threaded")"""
+    allow_reuse_address = True
+    daemon_threads = True  # Don't wait for threads on shutdown
+
+    def metrics(self):
+        return {'mode': 'threaded', 'threads': threading.active_count()}
+
+
+def create_http_server(address, handler_class):
+    """Build the HTTP server for the configured HTTP_SERVER_MODE"""
+    if HTTP_SERVER_MODE == "pool":
+        return PooledHTTPServer(address, handler_class)
+    return ThreadedTCPServer(address, handler_class)
+
+
+def get_server_metrics(httpd):
+    """Collect runtime metrics for /api/server/metrics"""
+    return {
+        'uptime_seconds': int(time.time() - start_time),
+        'http': httpd.metrics() if hasattr(httpd, 'metrics') else {},
+        'static_assets': static_assets.metrics(),
+        'compression': dict(compression_stats),
+        'routes': ROUTES.metrics(),
+        'screenshot_history': screenshot_history.metrics(),
+        'health': kiosk_health.status(),
+        'mqtt_state': mqtt_client.state_publisher.metrics() if mqtt_client else {},
+        'ha_states': ha_states.metrics(),
+        'broadcast_log': broadcast_log.metrics(),
+        'calendar_cache': calendar_store.metrics(),
+        'todo_replica': todo_replica.metrics(),
+        'tts_cache': tts_cache.metrics(),
+        'camera_hub': camera_hub.metrics(),
+        'quran_cache': quran_cache.metrics(),
+        'nas_io': nas_io.metrics(),
+        'folder_listings': folder_listings.metrics(),
+        'ha_breaker': ha_breaker.metrics(),
+        'ha_stale_cache': ha_response_cache.metrics(),
+    }
+
+
+# ==================== UNIFIED ASYNCIO RUNTIME ====================
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WEBSOCKET_MAX_MESSAGE = 16 * 1024 * 1024  # Full-screen screenshots
+HTTP_MAX_HEADER = 64 * 1024
+
+
+class AsyncWebSocket:
+    """Minimal RFC 6455 server connection on top of asyncio streams
+
+    Provides the subset of the websockets connection interface that
+    websocket_handler and broadcast_to_websockets use: async iteration over
+    incoming messages, send(), close() and the remote/local addresses.
+    """
+
+    def __init__(self, reader, writer, ping_interval=30, ping_timeout=10):
+        self.reader = reader
+        self.writer = writer
+        self.remote_address = writer.get_extra_info('peername')
+        self.local_address = writer.get_extra_info('sockname')
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.closed = False
+        self.last_seen = time.monotonic()
+
+    @staticmethod
+    def accept_key(key):
+        digest = hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()
+        return base64.b64encode(digest).decode()
+
+    async def handshake(self, headers):
+        """Send the 101 Switching Protocols response"""
+        accept = self.accept_key(headers.get('sec-websocket-key', ''))
+        self.writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+        await self.writer.drain()
+
+    async def _send_frame(self, opcode, payload):
+        if self.closed and opcode != 0x8:
+            raise ConnectionError("WebSocket is closed")
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        self.writer.write(header + payload)
+        await self.writer.drain()
+
+    async def send(self, message):
+        if isinstance(message, str):
+            await self._send_frame(0x1, message.encode('utf-8'))
+        else:
+            await self._send_frame(0x2, bytes(message))
+
+    async def close(self, code=1000):
+        if self.closed:
+            return
+        try:
+            await self._send_frame(0x8, struct.pack('!H', code))
+        except Exception:
+            pass
+        self.closed = True
+        self.writer.close()
+
+    async def _read_frame(self):
+        head = await self.reader.readexactly(2)
+        fin = head[0] & 0x80
+        opcode = head[0] & 0x0F
+        masked = head[1] & 0x80
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+        if length > WEBSOCKET_MAX_MESSAGE:
+            raise ValueError(f"WebSocket frame too large ({length} bytes)")
+        mask = await self.reader.readexactly(4) if masked else None
+        payload = await self.reader.readexactly(length)
+        if mask:
+            # XOR the whole payload at once as big integers (much faster than per byte)
+            key = (mask * (length // 4 + 1))[:length]
+            payload = (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+        self.last_seen = time.monotonic()
+        return fin, opcode, payload
+
+    async def _keepalive(self):
+        """Ping idle clients and drop the ones that stop answering"""
+        while not self.closed:
+            await asyncio.sleep(self.ping_interval)
+            if time.monotonic() - self.last_seen > self.ping_interval + self.ping_timeout:
+                print("WebSocket: Client stopped responding, closing")
+                await self.close(1011)
+                return
+            try:
+                await self._send_frame(0x9, b'')
+            except Exception:
+                return
+
+    async def __aiter__(self):
+        keepalive = asyncio.ensure_future(self._keepalive())
+        fragments = []
+        fragment_opcode = None
+        try:
+            while not self.closed:
+                fin, opcode, payload = await self._read_frame()
+                if opcode == 0x8:
+                    await self.close()
+                    return
+                if opcode == 0x9:
+                    await self._send_frame(0xA, payload)
+                    continue
+                if opcode == 0xA:
+                    continue
+                if opcode in (0x1, 0x2):
+                    fragment_opcode = opcode
+                    fragments = [payload]
+                elif opcode == 0x0:
+                    fragments.append(payload)
+                if not fin:
+                    continue
+                data = b''.join(fragments)
+                fragments = []
+                yield data.decode('utf-8') if fragment_opcode == 0x1 else data
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            keepalive.cancel()
+            self.closed = True
+
+
+class _ExecutorSocket:
+    """Socket stand-in that lets a ProxyHandler run in an executor thread
+
+    Reads come from the already-buffered request; writes are forwarded to the
+    asyncio StreamWriter and block the worker until the data is drained.
+    """
+
+    def __init__(self, raw_request, writer, loop):
+        self.raw_request = raw_request
+        self.writer = writer
+        self.loop = loop
+
+    def makefile(self, mode, bufsize=-1):
+        return io.BytesIO(self.raw_request)
+
+    def settimeout(self, timeout):
+        pass
+
+    async def _write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def sendall(self, data):
+        asyncio.run_coroutine_threadsafe(self._write(bytes(data)), self.loop).result(HTTP_REQUEST_TIMEOUT)
+
+
+class AsyncHTTPServer:
+    """HTTP + WebSocket server running on a single asyncio event loop
+
+    Connection handling, request parsing and the browser WebSocket bridge run
+    on the loop. Request handlers, which may block on disk, the NAS or Home
+    Assistant, run in a bounded executor.
+    """
+
+    def __init__(self, handler_class, workers=HTTP_WORKERS, queue_size=HTTP_QUEUE_SIZE):
+        self.handler_class = handler_class
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+        self.loop = None
+        self.pending = 0
+        self.stats_lock = threading.Lock()
+        self.active_workers = 0
+        self.handled_count = 0
+        self.shed_count = 0
+        self.open_connections = 0
+
+    def metrics(self):
+        return {
+            'mode': 'asyncio',
+            'workers': self.workers,
+            'active_workers': self.active_workers,
+            'queue_depth': max(0, self.pending - self.active_workers),
+            'queue_capacity': self.queue_size,
+            'handled': self.handled_count,
+            'shed': self.shed_count,
+            'open_connections': self.open_connections,
+            'websocket_clients': len(websocket_clients),
+        }
+
+    async def handle_connection(self, reader, writer):
+        self.open_connections += 1
+        peer = writer.get_extra_info('peername') or ('', 0)
+        try:
+            await self._serve(reader, writer, peer)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            print(f"HTTP: Connection error from {peer[0]} - {e}")
+        finally:
+            self.open_connections -= 1
+            if not writer.is_closing():
+                writer.close()
+
+    async def _serve(self, reader, writer, peer):
+        """Serve requests on one connection until it closes or goes idle"""
+        timeout = HTTP_REQUEST_TIMEOUT
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+            except asyncio.IncompleteReadError:
+                return  # Client closed an idle keep-alive connection
+            keep_alive = await self._serve_request(reader, writer, peer, head)
+            if not keep_alive:
+                return
+            timeout = HTTP_KEEPALIVE_TIMEOUT
+
+    async def _serve_request(self, reader, writer, peer, head):
+        """Handle one request; returns True if the connection stays open"""
+        headers = {}
+        for line in head.decode('latin-1').split('\r\n')[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get('upgrade', '').lower() == 'websocket':
+            websocket = AsyncWebSocket(reader, writer)
+            await websocket.handshake(headers)
+            await websocket_handler(websocket)
+            return False
+
+        body = b''
+        length = int(headers.get('content-length', 0) or 0)
+        if length:
+            body = await asyncio.wait_for(reader.readexactly(length), HTTP_REQUEST_TIMEOUT)
+
+        if self.pending >= self.workers + self.queue_size:
+            self.shed_count += 1
+            payload = json.dumps({'error': 'Server busy, retry shortly'}).encode()
+            writer.write((
+                "HTTP/1.1 503 Service Unavailable\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Retry-After: {max(1, int(HTTP_REQUEST_TIMEOUT // 10))}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode() + payload)
+            await writer.drain()
+            return False
+
+        self.pending += 1
+        try:
+            close_connection = await self.loop.run_in_executor(
+                self.executor, self._run_handler, head + body, peer, writer)
+        finally:
+            self.pending -= 1
+            self.handled_count += 1
+        await writer.drain()
+        return not close_connection
+
+    def _run_handler(self, raw_request, peer, writer):
+        """Run one request through the handler class (executor thread)"""
+        with self.stats_lock:
+            self.active_workers += 1
+        try:
+            handler = self.handler_class.__new__(self.handler_class)
+            handler.request = _ExecutorSocket(raw_request, writer, self.loop)
+            handler.client_address = peer
+            handler.server = self
+            handler.directory = os.getcwd()
+            handler.setup()
+            try:
+                handler.handle_one_request()
+            finally:
+                handler.finish()
+            return handler.close_connection
+        finally:
+            with self.stats_lock:
+                self.active_workers -= 1
+
+    async def serve(self, ports):
+        self.loop = asyncio.get_running_loop()
+        servers = []
+        for port in ports:
+            servers.append(await asyncio.start_server(
+                self.handle_connection, "0.0.0.0", port, limit=HTTP_MAX_HEADER))
+        print(f"Asyncio runtime listening on ports {', '.join(str(p) for p in ports)}")
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+def run_asyncio_runtime(handler_class):
+    """Serve HTTP, the browser WebSocket bridge and the HA client on one loop"""
+    async def run():
+        global websocket_loop
+        websocket_loop = asyncio.get_running_loop()
+        httpd = AsyncHTTPServer(handler_class)
+        ha_task = asyncio.ensure_future(run_ha_websocket())
+        try:
+            # Browser WebSocket accepted on the dashboard port (upgrade) and on
+            # WS_PORT for existing clients
+            await httpd.serve(sorted({PORT, WS_PORT}))
+        finally:
+            ha_task.cancel()
+            httpd.executor.shutdown(wait=False)
+
+    asyncio.run(run())
+
+
+# ==================== STATIC ASSET CACHE ====================
+
+STATIC_CACHE_MAX_FILE = 8 * 1024 * 1024    # Larger files are served from disk
+STATIC_CACHE_MAX_TOTAL = 64 * 1024 * 1024
+STATIC_COMPRESS_MIN = 1024                 # Not worth compressing below this
+STATIC_COMPRESSIBLE = ('text/', 'application/javascript', 'application/json',
+                       'application/xml', 'image/svg+xml')
+
+
+class StaticAsset:
+    """In-memory copy of a static file with precompressed variants"""
+
+    def __init__(self, path, stat, data):
+        self.path = path
+        self.mtime = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'application/json'):
+            self.content_type += '; charset=utf-8'
+        digest = hashlib.sha1(data).hexdigest()[:20]
+        # Strong ETags must differ per representation
+        self.variants = {'identity': (data, f'"{digest}"')}
+        if len(data) >= STATIC_COMPRESS_MIN and self.content_type.startswith(STATIC_COMPRESSIBLE):
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                self.variants['gzip'] = (gz, f'"{digest}-gz"')
+            try:
+                import brotli
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data):
+                    self.variants['br'] = (br, f'"{digest}-br"')
+            except ImportError:
+                pass
+
+    @property
+    def memory(self):
+        return sum(len(body) for body, _ in self.variants.values())
+
+
+class StaticAssetCache:
+    """Loads static files into memory once and revalidates them by mtime"""
+
+    def __init__(self):
+        self.assets = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.not_modified = 0
+
+    def get(self, path):
+        """Return a StaticAsset for path, or None if it should be served from disk"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size > STATIC_CACHE_MAX_FILE:
+            return None
+
+        with self.lock:
+            asset = self.assets.get(path)
+            if asset and asset.mtime == stat.st_mtime_ns and asset.size == stat.st_size:
+                self.hits += 1
+                return asset
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        asset = StaticAsset(path, stat, data)
+
+        with self.lock:
+            self.assets.pop(path, None)
+            if self.memory() + asset.memory > STATIC_CACHE_MAX_TOTAL:
+                return asset  # Serve it, but don't keep it
+            self.assets[path] = asset
+            self.loads += 1
+        return asset
+
+    def memory(self):
+        return sum(asset.memory for asset in self.assets.values())
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'files': len(self.assets),
+                'memory_bytes': self.memory(),
+                'hits': self.hits,
+                'loads': self.loads,
+                'not_modified': self.not_modified,
+            }
+
+
+def choose_encoding(accept_encoding, available, preference=('br', 'gzip', 'deflate')):
+    """Pick the best available content coding for an Accept-Encoding header"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        fields = part.strip().split(';')
+        coding = fields[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+
+    for coding in preference:
+        if coding in available and accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return 'identity'
+
+
+static_assets = StaticAssetCache()
+
+
+# ==================== RESPONSE COMPRESSION ====================
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml')
+# Codings we can produce on the fly, in order of preference
+DYNAMIC_ENCODINGS = ('gzip', 'deflate')
+
+compression_stats = {'responses': 0, 'bytes_in': 0, 'bytes_out': 0}
+compression_stats_lock = threading.Lock()
+
+
+def is_compressible(content_type):
+    """True for text-like bodies; event streams are left alone so they aren't delayed"""
+    content_type = (content_type or '').lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and 'event-stream' not in content_type
+
+
+def make_compressor(encoding):
+    """Streaming compressor for 'gzip' or 'deflate' (zlib format, per RFC 9110)"""
+    wbits = 31 if encoding == 'gzip' else 15
+    return zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, wbits)
+
+
+def record_compression(bytes_in, bytes_out):
+    with compression_stats_lock:
+        compression_stats['responses'] += 1
+        compression_stats['bytes_in'] += bytes_in
+        compression_stats['bytes_out'] += bytes_out
+
+
 # ==================== HTTP SERVER ====================
 
 class ProxyHandler(http.server.SimpleHTTPRequestHandler):
-    def do_GET(self):
-        if self.path.startswith('/api/local/browse'):
-            self.handle_folder_browse()
-        elif self.path.startswith('/api/local/'):
-            self.handle_local_request()
-        elif self.path.startswith('/api/synology/'):
-            self.proxy_synology_request()
-        elif self.path == '/api/notifications':
-            self.handle_notifications_request()
-        elif self.path == '/api/screenshot':
-            self.handle_screenshot_request()
-        elif self.path == '/api/screenshot/take':
-            self.handle_take_screenshot()
-        elif self.path == '/api/weather/cache':
-            self.handle_get_weather_cache()
-        elif self.path.startswith('/api/habits'):
-            self.handle_habits_request()
-        elif self.path.startswith('/api/'):
-            self.proxy_request('GET')
+    # HTTP/1.1 keeps connections open between requests; every response path
+    # must then send Content-Length or use chunked encoding.
+    protocol_version = "HTTP/1.1" if HTTP_KEEPALIVE else "HTTP/1.0"
+    # Socket timeout while a request is read and served; waiting for the next
+    # request on a keep-alive connection uses HTTP_KEEPALIVE_TIMEOUT instead
+    timeout = HTTP_REQUEST_TIMEOUT
+    # Set when a pooled server takes the connection back between requests
+    # (idle) or another thread finishes the response (handed_off)
+    idle = False
+    handed_off = False
+
+    def handle(self):
+        """Serve requests until the connection closes, or goes idle on a pooled server"""
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if getattr(self.server, 'park_idle_connections', False) and not self.request_waiting():
+                self.idle = True
+                return
+            self.handle_one_request()
+
+    def handle_one_request(self):
+        """Wait up to HTTP_KEEPALIVE_TIMEOUT for a request, then serve it under HTTP_REQUEST_TIMEOUT"""
+        if HTTP_KEEPALIVE and hasattr(self.rfile, 'peek'):
+            try:
+                self.connection.settimeout(HTTP_KEEPALIVE_TIMEOUT)
+                self.rfile.peek(1)  # An empty peek (client closed) is handled below
+            except OSError:  # Idle too long (TimeoutError) or reset
+                self.close_connection = True
+                return
+            finally:
+                self.connection.settimeout(self.timeout)
+        super().handle_one_request()
+
+    def request_waiting(self):
+        """True if the next request is already here (buffered or on the socket)"""
+        try:
+            self.connection.setblocking(False)
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def finish(self):
+        if not self.handed_off:
+            super().finish()
+
+    def finish_handed_off(self):
+        """finish() for a response completed on another thread"""
+        super().finish()
+
+    def run_long_lived(self, func, *args):
+        """Serve a response that may never end without tying up a pool worker"""
+        hand_off = getattr(self.server, 'hand_off', None)
+        if hand_off:
+            hand_off(self, func, *args)
         else:
-            super().do_GET()
+            func(*args)
+
+    def do_GET(self):
+        self.dispatch(fallback=self.serve_static)
+
+    def do_POST(self):
+        self.dispatch()
+
+    def do_DELETE(self):
+        self.dispatch()
+
+    def dispatch(self, fallback=None):
+        """Route the request through ROUTES, timing the matched handler"""
+        self.parsed_url = urllib.parse.urlsplit(self.path)
+        self.query = urllib.parse.parse_qs(self.parsed_url.query)
+        route, params = ROUTES.match(self.command, self.parsed_url.path)
+        if route is None:
+            if fallback:
+                return fallback()
+            return self.send_error(405, "Method Not Allowed")
+
+        self.response_status = None
+        started = time.perf_counter()
+        try:
+            route.handler(self, **params)
+        except Exception as e:
+            print(f"{route.name} error: {e}")
+            traceback.print_exc()
+            if self.response_status is None:
+                self.send_error(500, f'{route.name} error: {e}')
+            self.response_status = 500
+        finally:
+            ROUTES.record(route, time.perf_counter() - started, self.response_status)
+
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+
+    def fail_response(self, code, message):
+        """send_error, or just drop the connection if a response is already under way
+
+        A relay that breaks mid-body can't be turned into an error page: the
+        status line and framing are already out, so the client only sees a
+        truncated body.
+        """
+        if getattr(self, 'response_status', None) is not None:
+            print(f"Response aborted after headers: {message}")
+            self.close_connection = True
+            return
+        self.send_error(code, message)
+
+    def read_json_body(self):
+        """Parse the JSON request body, or {} if there is none"""
+        content_length = int(self.headers.get('Content-Length', 0))
+        if content_length <= 0:
+            return {}
+        return json.loads(self.rfile.read(content_length))
+
+    def etag_matches(self, etag):
+        """True when the request's If-None-Match already names etag"""
+        if_none_match = self.headers.get('If-None-Match', '')
+        matches = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in matches or etag in matches
+
+    def serve_static(self):
+        """Serve a static file from memory with compression and ETag validation"""
+        request_path = self.parsed_url.path
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not request_path.endswith('/'):
+                return super().do_GET()  # Redirect to the trailing-slash URL
+            path = os.path.join(path, 'index.html')
+
+        asset = static_assets.get(path) if os.path.isfile(path) else None
+        if asset is None:
+            return super().do_GET()
+
+        encoding = choose_encoding(self.headers.get('Accept-Encoding'), asset.variants)
+        body, etag = asset.variants[encoding]
+
+        if self.etag_matches(etag):
+            static_assets.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', len(body))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        # Always revalidate so the version-check reload picks up new files
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Last-Modified', self.date_time_string(asset.mtime / 1e9))
+        self.end_headers()
+        self.wfile.write(body)
 
     def handle_get_weather_cache(self):
         """Return cached weather data"""
@@ -1064,59 +4427,114 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             response = json.dumps(data).encode()
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
-            self.send_header('Content-Length', len(response))
-            self.end_headers()
-            self.wfile.write(response)
+            self.send_payload(response, 'application/json')
         except Exception as e:
             self.send_error(500, f'Error getting weather cache: {e}')
 
     def handle_screenshot_request(self):
         """Serve the latest screenshot"""
-        global latest_screenshot, screenshot_timestamp
         with screenshot_lock:
-            if latest_screenshot:
-                import base64
-                try:
-                    # Strip data URL prefix if present
-                    image_data = latest_screenshot
-                    if image_data.startswith('data:'):
-                        image_data = image_data.split(',', 1)[1]
-                    image_bytes = base64.b64decode(image_data)
-                    
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'image/png')
-                    self.send_header('Content-Length', len(image_bytes))
-                    self.send_header('X-Screenshot-Timestamp', str(screenshot_timestamp))
-                    self.end_headers()
-                    self.wfile.write(image_bytes)
-                except Exception as e:
-                    self.send_error(500, f'Error decoding screenshot: {e}')
+            screenshot = latest_screenshot
+        if not screenshot:
+            self.send_error(404, 'No screenshot available')
+            return
+
+        if self.etag_matches(screenshot.etag):
+            self.send_response(304)
+            self.send_header('ETag', screenshot.etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', screenshot.content_type)
+        self.send_header('Content-Length', len(screenshot.data))
+        self.send_header('ETag', screenshot.etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Screenshot-Timestamp', str(screenshot.timestamp))
+        self.end_headers()
+        self.wfile.write(screenshot.data)
+
+    def handle_screenshot_history(self):
+        """List the screenshot history, newest first"""
+        self.send_json_response({'screenshots': screenshot_history.entries()})
+
+    def handle_screenshot_history_index(self, index):
+        """Serve a screenshot from history by index (0 = newest)"""
+        self.send_screenshot_record(screenshot_history.by_index(index))
+
+    def handle_screenshot_history_at(self):
+        """Serve the newest screenshot taken at or before ?time=<unix seconds>"""
+        try:
+            timestamp = float(self.query.get('time', [''])[0])
+        except ValueError:
+            self.send_error(400, 'time must be a Unix timestamp')
+            return
+        self.send_screenshot_record(screenshot_history.at(timestamp))
+
+    def send_screenshot_record(self, record):
+        """Send a history image, or its thumbnail with ?thumbnail=1"""
+        if record is None:
+            self.send_error(404, 'No screenshot in history')
+            return
+        try:
+            if self.query.get('thumbnail', ['0'])[0] in ('1', 'true'):
+                body = screenshot_history.thumbnail(record)
+                if body is None:
+                    self.send_error(501, 'Thumbnails need Pillow (pip install Pillow)')
+                    return
+                content_type, etag = 'image/jpeg', record.etag[:-1] + '-thumb"'
             else:
-                self.send_error(404, 'No screenshot available')
+                body, content_type, etag = None, record.content_type, record.etag
+            if self.etag_matches(etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            if body is None:
+                body = record.read()
+        except OSError:
+            self.send_error(404, 'Screenshot file missing')
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', len(body))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'max-age=86400, immutable')
+        self.send_header('X-Screenshot-Timestamp', str(record.timestamp))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_health(self):
+        """Kiosk health for watchdogs: 200 when healthy, 503 otherwise"""
+        health = kiosk_health.status()
+        response = json.dumps(health).encode()
+        self.send_response(200 if health['status'] == 'ok' else 503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_payload(response, 'application/json')
 
     def handle_take_screenshot(self):
         """Request a new screenshot and return it"""
         if mqtt_client:
             mqtt_client._request_screenshot()
         # Return immediately - screenshot will be available via /api/screenshot
+        response = json.dumps({'status': 'requested'}).encode()
         self.send_response(202)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', len(response))
         self.end_headers()
-        self.wfile.write(json.dumps({'status': 'requested'}).encode())
+        self.wfile.write(response)
 
     def handle_notifications_request(self):
         """Fetch persistent notifications via HA WebSocket API"""
         try:
-            import asyncio
             import websockets
             
             async def get_notifications():
                 uri = f"wss://{HA_URL.replace('https://', '')}/api/websocket"
-                ssl_ctx = ssl.create_default_context()
-                ssl_ctx.check_hostname = False
-                ssl_ctx.verify_mode = ssl.CERT_NONE
                 
-                async with websockets.connect(uri, ssl=ssl_ctx) as ws:
+                async with websockets.connect(uri, ssl=ssl_context) as ws:
                     await ws.recv()  # auth_required
                     await ws.send(json.dumps({
                         "type": "auth",
@@ -1146,61 +4564,397 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             print(f"Error fetching notifications: {e}")
             self.send_json_response({'success': False, 'error': str(e)})
 
-    def do_POST(self):
-        if self.path == '/api/weather/cache/daily':
-            self.handle_save_daily_forecast()
-        elif self.path == '/api/weather/cache/hourly':
-            self.handle_save_hourly_forecast()
-        elif self.path.startswith('/api/habits'):
-            self.handle_habits_request()
-        elif self.path.startswith('/api/'):
-            self.proxy_request('POST')
-        else:
-            self.send_error(405, "Method Not Allowed")
+    def handle_save_daily_forecast(self):
+        """Save daily forecast to cache"""
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(content_length)
+            data = json.loads(body)
+            forecasts = data.get('forecasts', [])
+            save_daily_forecast(forecasts)
+            
+            response = json.dumps({'status': 'ok', 'saved': len(forecasts)}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(response))
+            self.end_headers()
+            self.wfile.write(response)
+        except Exception as e:
+            self.send_error(500, f'Error saving daily forecast: {e}')
+
+    def handle_save_hourly_forecast(self):
+        """Save hourly forecast to cache"""
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(content_length)
+            data = json.loads(body)
+            forecasts = data.get('forecasts', [])
+            save_hourly_forecast(forecasts)
+            
+            response = json.dumps({'status': 'ok', 'saved': len(forecasts)}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', len(response))
+            self.end_headers()
+            self.wfile.write(response)
+        except Exception as e:
+            self.send_error(500, f'Error saving hourly forecast: {e}')
+
+    def handle_states(self):
+        """GET /api/states from the state mirror, or via the proxy while it is cold"""
+        if not ha_states.ready():
+            self.proxy_request('GET')
+            return
+        body, etag = ha_states.all()
+        # Strong ETags must differ per representation
+        encoding = self.negotiate_compression('application/json', len(body))
+        if encoding:
+            etag = f'{etag[:-1]}-{encoding}"'
+        if self.etag_matches(etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+        self.send_state_body(body, etag)
+
+    def handle_state(self, entity_id):
+        """GET /api/states/<entity_id> from the state mirror"""
+        if not ha_states.ready():
+            self.proxy_request('GET')
+            return
+        body = ha_states.get(entity_id)
+        if body is None:
+            self.send_error(404, 'Entity not found.')
+            return
+        self.send_state_body(body)
+
+    def send_state_body(self, body, etag=None):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Dashboard-Version', dashboard_version())
+        self.send_header('X-State-Source', 'mirror')
+        self.send_header('X-State-Age', f'{ha_states.age():.1f}')
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_payload(body, 'application/json')
+
+    def handle_calendar_get_events(self):
+        """calendar.get_events answered from the calendar cache, in HA's response shape"""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            request = json.loads(body or b'{}')
+            calendars = calendar_entities(request.get('entity_id'))
+            start = parse_calendar_time(request['start_date_time'])
+            end = parse_calendar_time(request['end_date_time'])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            calendars = None
+        wants_response = 'return_response' in urllib.parse.parse_qs(self.parsed_url.query, keep_blank_values=True)
+        if not CALENDAR_CACHE or not calendars or not wants_response:
+            # Durations, missing ranges etc. go to Home Assistant unchanged
+            self.proxy_request('POST', body)
+            return
+
+        response = {}
+        stale = False
+        try:
+            for calendar in calendars:
+                events, calendar_stale = calendar_store.events(calendar, start, end)
+                response[calendar] = {'events': events}
+                stale = stale or calendar_stale
+        except HAUnavailable:
+            self.send_ha_unavailable()
+            return
+        except urllib.error.HTTPError as e:
+            self.send_error(e.code, str(e.reason))
+            return
+        except Exception as e:
+            self.send_error(504 if is_ha_outage(e) else 500, str(e))
+            return
+
+        payload = json.dumps({'changed_states': [], 'service_response': response}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+        self.send_header('X-Dashboard-Version', dashboard_version())
+        self.send_header('X-Calendar-Cache', 'stale' if stale else 'ok')
+        self.send_payload(payload, 'application/json')
+
+    def handle_calendar_service(self, service):
+        """Proxy a calendar service call and drop the cached events it changes"""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.proxy_request('POST', body)
+        try:
+            calendars = calendar_entities(json.loads(body or b'{}').get('entity_id'))
+        except (ValueError, AttributeError):
+            calendars = []
+        for calendar in calendars or [None]:
+            calendar_store.invalidate(calendar)
+
+    def handle_todo_get_items(self):
+        """todo.get_items answered from the todo replica, in HA's response shape"""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            entity_id = json.loads(body or b'{}').get('entity_id')
+        except (ValueError, AttributeError):
+            entity_id = None
+        wants_response = 'return_response' in urllib.parse.parse_qs(self.parsed_url.query, keep_blank_values=True)
+        if not TODO_REPLICA or not isinstance(entity_id, str) or not wants_response:
+            self.proxy_request('POST', body)
+            return
+        try:
+            items = todo_replica.items(entity_id)
+        except HAUnavailable:
+            self.send_ha_unavailable()
+            return
+        except urllib.error.HTTPError as e:
+            self.send_error(e.code, str(e.reason))
+            return
+        except Exception as e:
+            self.send_error(504 if is_ha_outage(e) else 500, str(e))
+            return
+        payload = json.dumps({
+            'changed_states': [],
+            'service_response': {entity_id: {'items': items}},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+        self.send_header('X-Dashboard-Version', dashboard_version())
+        self.send_payload(payload, 'application/json')
+
+    def handle_todo_write(self, service):
+        """add_item/update_item/remove_item applied locally and forwarded to HA in the background"""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            data = None
+        if (not TODO_REPLICA or service not in TODO_WRITE_SERVICES or not isinstance(data, dict)
+                or not isinstance(data.get('entity_id'), str) or not data.get('item')):
+            self.proxy_request('POST', body)
+            return
+        delta = todo_replica.write(service, data)
+        self.send_json_response({'todo_delta': delta})
+
+    def handle_tts_get_url(self):
+        """tts_get_url answered from the TTS cache, rendering through HA on a miss"""
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            data = None
+        if (not TTS_CACHE or not isinstance(data, dict) or not isinstance(data.get('message'), str)
+                or data.get('cache') is False):
+            self.proxy_request('POST', body)
+            return
+        try:
+            name = tts_cache.get(data)
+        except HAUnavailable:
+            self.send_ha_unavailable()
+            return
+        except urllib.error.HTTPError as e:
+            self.send_error(e.code, str(e.reason))
+            return
+        except Exception as e:
+            tts_cache.counts['errors'] += 1
+            self.send_error(500, str(e))
+            return
+        url = f"/api/tts_cache/{name}"
+        self.send_json_response({'url': url, 'path': url})
+
+    def handle_tts_cache_file(self, name):
+        """Serve cached TTS audio; names are content hashes, so it never changes"""
+        if not DiskLRU.NAME.match(name):
+            self.send_error(404, "Not found")
+            return
+        try:
+            with open(tts_cache.files.path(name), 'rb') as f:
+                audio = f.read()
+        except OSError:
+            self.send_error(404, "Not found")
+            return
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        self.send_payload(audio, content_type)
+
+    def handle_tts_prerender(self):
+        """Queue phrases (e.g. the next hourly chime) for rendering in the background"""
+        data = self.read_json_body()
+        messages = data.get('messages')
+        if not isinstance(messages, list):
+            self.send_error(400, "messages must be a list")
+            return
+        base = {k: v for k, v in data.items() if k != 'messages'}
+        requests = [dict(base, message=m) for m in messages if isinstance(m, str) and m]
+        if TTS_CACHE:
+            tts_cache.prerender(requests)
+        self.send_json_response({'queued': len(requests) if TTS_CACHE else 0})
+
+    def handle_quran_api(self, path):
+        """alquran.cloud API response from the Quran cache (passed through when it is off)"""
+        if not QURAN_CACHE:
+            self.proxy_quran_api(path)
+            return
+        try:
+            name = quran_cache.api(path)
+        except urllib.error.HTTPError as e:
+            self.send_error(e.code, str(e.reason))
+            return
+        except Exception as e:
+            quran_cache.counts['errors'] += 1
+            self.send_error(502, str(e))
+            return
+        self.send_quran_file(name, 'application/json')
+
+    def proxy_quran_api(self, path):
+        """Uncached alquran.cloud API response; audio URLs are left pointing upstream"""
+        try:
+            content_type, body = fetch_url(f"{QURAN_API_URL.rstrip('/')}/v1/{path}")
+        except urllib.error.HTTPError as e:
+            self.send_error(e.code, str(e.reason))
+            return
+        except Exception as e:
+            self.send_error(502, str(e))
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_payload(body, content_type)
+
+    def handle_quran_audio(self):
+        """Recitation audio from the Quran cache"""
+        src = self.query.get('src', [''])[0]
+        if not QURAN_CACHE or not quran_cache.is_audio_url(src):
+            self.send_error(404, "Not found")
+            return
+        try:
+            name = quran_cache.audio(src)
+        except urllib.error.HTTPError as e:
+            self.send_error(e.code, str(e.reason))
+            return
+        except Exception as e:
+            quran_cache.counts['errors'] += 1
+            self.send_error(502, str(e))
+            return
+        self.send_quran_file(name, mimetypes.guess_type(name)[0] or 'application/octet-stream')
+
+    def send_quran_file(self, name, content_type):
+        try:
+            with open(quran_cache.files.path(name), 'rb') as f:
+                body = f.read()
+        except OSError:
+            self.send_error(404, "Not found")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'public, max-age=86400')
+        self.send_payload(body, content_type)
 
-    def do_DELETE(self):
-        if self.path.startswith('/api/habits'):
-            self.handle_habits_request()
-        else:
-            self.send_error(405, "Method Not Allowed")
+    def handle_camera_stream(self, entity_id):
+        """MJPEG stream for a camera, fed from the camera hub's shared upstream"""
+        self.run_long_lived(self.stream_camera, entity_id)
 
-    def handle_save_daily_forecast(self):
-        """Save daily forecast to cache"""
+    def stream_camera(self, entity_id):
+        if not CAMERA_HUB or not entity_id.startswith('camera.'):
+            self.proxy_request('GET')
+            return
+        if ha_breaker.state != 'closed':
+            self.send_ha_unavailable()
+            return
+        feed = camera_hub.feed(entity_id)
+        feed.acquire()
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
-            data = json.loads(body)
-            forecasts = data.get('forecasts', [])
-            save_daily_forecast(forecasts)
-            
+            # Last frame first (instant picture), then every new one
+            with feed.cond:
+                latest = (feed.seq, feed.content_type, feed.frame) if feed.frame is not None else None
+            latest = latest or feed.wait_frame(0)
+            if latest is None:
+                if ha_breaker.state != 'closed':
+                    self.send_ha_unavailable()
+                else:
+                    self.send_error(504, "No frame from camera")
+                return
+            self.close_connection = True
             self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+            self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+            self.send_header('Connection', 'close')
+            self.send_header('X-Dashboard-Version', dashboard_version())
             self.end_headers()
-            self.wfile.write(json.dumps({'status': 'ok', 'saved': len(forecasts)}).encode())
-        except Exception as e:
-            self.send_error(500, f'Error saving daily forecast: {e}')
-
-    def handle_save_hourly_forecast(self):
-        """Save hourly forecast to cache"""
+            while latest is not None:
+                seq, content_type, data = latest
+                self.wfile.write(
+                    f"--frame\r\nContent-Type: {content_type}\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+                    + data + b"\r\n"
+                )
+                self.wfile.flush()
+                latest = feed.wait_frame(seq)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Viewer closed
+        finally:
+            feed.release()
+
+    def handle_camera_snapshot(self, entity_id):
+        """Camera still from the camera hub; many polling screens share one upstream"""
+        if not CAMERA_HUB or not entity_id.startswith('camera.') or 'width' in self.query or 'height' in self.query:
+            self.proxy_request('GET')
+            return
+        if ha_breaker.state != 'closed':
+            self.send_ha_unavailable()
+            return
+        feed = camera_hub.feed(entity_id)
+        feed.acquire()
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
-            data = json.loads(body)
-            forecasts = data.get('forecasts', [])
-            save_hourly_forecast(forecasts)
-            
+            latest = feed.snapshot(max_age=CAMERA_SNAPSHOT_INTERVAL)
+        finally:
+            feed.release()
+        if latest is None:
+            if ha_breaker.state != 'closed':
+                self.send_ha_unavailable()
+            else:
+                self.send_error(504, "No frame from camera")
+            return
+        _, content_type, data = latest
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+        self.send_header('X-Dashboard-Version', dashboard_version())
+        self.send_payload(data, content_type)
+
+    def send_ha_unavailable(self):
+        """Answer while the HA breaker is open: last good copy of a GET, else 503"""
+        cached = ha_response_cache.get(self.path) if self.command == 'GET' else None
+        if cached:
+            content_type, body = cached
+            ha_response_cache.served += 1
             self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'status': 'ok', 'saved': len(forecasts)}).encode())
-        except Exception as e:
-            self.send_error(500, f'Error saving hourly forecast: {e}')
+            self.send_header('Content-Type', content_type)
+            self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+            self.send_header('X-Cache', 'STALE')
+            self.send_header('X-HA-Status', ha_breaker.state)
+            self.send_header('X-Dashboard-Version', dashboard_version())
+            self.send_payload(body, content_type)
+            return
+        status = ha_breaker.status()
+        payload = json.dumps({'error': 'Home Assistant unavailable', **status}).encode()
+        self.send_response(503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Retry-After', str(max(1, status['retry_after'])))
+        self.send_header('X-HA-Status', status['state'])
+        self.send_header('X-Dashboard-Version', dashboard_version())
+        self.send_payload(payload, 'application/json')
 
-    def proxy_request(self, method):
+    def proxy_request(self, method, body=None):
         try:
-            # Read request body for POST
-            body = None
-            if method == 'POST':
+            # Read request body for POST (unless the caller already did)
+            if method == 'POST' and body is None:
                 content_length = int(self.headers.get('Content-Length', 0))
                 body = self.rfile.read(content_length)
 
@@ -1210,30 +4964,68 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             req.add_header('Authorization', f'Bearer {HA_TOKEN}')
             req.add_header('Content-Type', 'application/json')
 
-            # Make request
-            with urllib.request.urlopen(req, context=ssl_context, timeout=30) as response:
-                data = response.read()
+            try:
+                response = ha_urlopen(req)
+            except HAUnavailable:
+                self.send_ha_unavailable()
+                return
+            except Exception as e:
+                if not is_ha_outage(e):
+                    raise
+                if ha_breaker.state != 'closed':
+                    self.send_ha_unavailable()
+                elif isinstance(e, urllib.error.HTTPError):
+                    self.send_error(e.code, str(e.reason))
+                else:
+                    self.send_error(504, f"Home Assistant did not answer: {e}")
+                return
 
-                # Send response
+            # Stream the body through (camera streams never end); small JSON GETs
+            # are buffered and remembered for when HA goes away
+            with response:
+                content_type = response.headers.get('Content-Type', 'application/json')
+                length = response.headers.get('Content-Length')
                 self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Type', content_type)
                 self.send_header('Access-Control-Allow-Origin', '*')
                 self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-                self.send_header('X-Dashboard-Version', DASHBOARD_VERSION)
-                self.end_headers()
-                self.wfile.write(data)
+                self.send_header('X-Dashboard-Version', dashboard_version())
+                if (method == 'GET' and content_type.startswith('application/json') and length
+                        and int(length) <= HAResponseCache.MAX_BODY and not response.headers.get('Content-Encoding')):
+                    payload = response.read()
+                    ha_response_cache.put(self.path, content_type, payload)
+                    self.send_payload(payload, content_type)
+                else:
+                    self.copy_upstream_body(response)
 
         except urllib.error.HTTPError as e:
-            self.send_error(e.code, str(e.reason))
+            self.fail_response(e.code, str(e.reason))
         except Exception as e:
-            self.send_error(500, str(e))
+            self.fail_response(500, str(e))
+
+    def get_folder_listing(self, path, lookup=None):
+        """Cached listing of a folder (or lookup(path)), or None after sending the error response"""
+        try:
+            return (lookup or folder_listings.get)(path)
+        except FileNotFoundError:
+            error = f'Path does not exist: {path}'
+        except PermissionError:
+            error = f'Permission denied: {path}'
+        except (NASTimeout, NASUnavailable) as e:
+            error = f'Folder not responding: {e}'
+        self.send_json_response({'success': False, 'error': error})
+        return None
 
     def handle_folder_browse(self):
-        """Handle folder browsing for photo source selection"""
+        """Handle folder browsing for photo source selection
+
+        Subfolders are paged with ?offset=&limit= (FOLDER_BROWSE_PAGE_SIZE by
+        default); next_offset is null on the last page.
+        """
         try:
-            parsed = urllib.parse.urlparse(self.path)
-            params = urllib.parse.parse_qs(parsed.query)
-            current_path = params.get('path', [''])[0]
+            current_path = self.query.get('path', [''])[0]
+            offset = max(0, int(self.query.get('offset', ['0'])[0]))
+            limit = max(1, int(self.query.get('limit', [str(FOLDER_BROWSE_PAGE_SIZE)])[0]))
 
             # Default starting locations
             if not current_path:
@@ -1242,60 +5034,18 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             # Normalize and resolve the path
             current_path = os.path.abspath(os.path.expanduser(current_path))
 
-            # Check if path exists
-            if not os.path.exists(current_path):
-                self.send_json_response({
-                    'success': False,
-                    'error': f'Path does not exist: {current_path}'
-                })
+            # List directories and check for images (cached; NAS I/O only if the folder changed)
+            listing = self.get_folder_listing(current_path)
+            if listing is None:
                 return
-
-            # If it's a file, go to parent directory
-            if os.path.isfile(current_path):
-                current_path = os.path.dirname(current_path)
+            current_path, directories, image_count, cached = listing
+            entries = directories[offset:offset + limit]
+            next_offset = offset + limit if offset + limit < len(directories) else None
+            has_images = image_count > 0
 
             # Get parent path
             parent_path = os.path.dirname(current_path)
 
-            # List directories and check for images
-            entries = []
-            has_images = False
-            image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
-            image_count = 0
-
-            try:
-                for entry in sorted(os.scandir(current_path), key=lambda e: e.name.lower()):
-                    if entry.name.startswith('.'):
-                        continue  # Skip hidden files/folders
-
-                    if entry.is_dir():
-                        # Check if directory is accessible
-                        try:
-                            os.listdir(entry.path)
-                            entries.append({
-                                'name': entry.name,
-                                'path': entry.path,
-                                'type': 'directory'
-                            })
-                        except PermissionError:
-                            entries.append({
-                                'name': entry.name,
-                                'path': entry.path,
-                                'type': 'directory',
-                                'locked': True
-                            })
-                    elif entry.is_file():
-                        ext = os.path.splitext(entry.name)[1].lower()
-                        if ext in image_extensions:
-                            has_images = True
-                            image_count += 1
-            except PermissionError:
-                self.send_json_response({
-                    'success': False,
-                    'error': f'Permission denied: {current_path}'
-                })
-                return
-
             # Common mount points to show as quick links
             quick_links = []
             common_paths = [
@@ -1314,9 +5064,13 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 'current_path': current_path,
                 'parent_path': parent_path if parent_path != current_path else None,
                 'entries': entries,
+                'total_entries': len(directories),
+                'offset': offset,
+                'next_offset': next_offset,
                 'has_images': has_images,
                 'image_count': image_count,
-                'quick_links': quick_links
+                'quick_links': quick_links,
+                'cached': cached
             })
 
         except Exception as e:
@@ -1326,14 +5080,20 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 'error': str(e)
             })
 
-    def handle_local_request(self):
+    def handle_folder_image_count(self):
+        """Photo count of one folder, fetched by the folder picker for subfolders on screen"""
+        path = os.path.abspath(os.path.expanduser(self.query.get('path', [''])[0] or '~'))
+        counted = self.get_folder_listing(path, folder_listings.image_count)
+        if counted is not None:
+            self.send_json_response({'success': True, 'path': counted[0], 'image_count': counted[1]})
+
+    def handle_local_request(self, endpoint):
         """Handle local folder photo requests"""
         try:
-            parsed = urllib.parse.urlparse(self.path)
-            params = urllib.parse.parse_qs(parsed.query)
+            params = self.query
             folder_path = params.get('path', [''])[0]
 
-            if '/api/local/photos' in self.path:
+            if endpoint == 'photos':
                 # List photos - CACHE FIRST to avoid blocking on slow NAS
                 photos = []
                 from_cache = False
@@ -1353,25 +5113,16 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                     print(f"Serving {len(photos)} photos from fresh cache")
                 else:
                     # Cache is stale or missing - try to refresh from source
-                    # But use a timeout to avoid blocking
-                    source_available = folder_path and os.path.isdir(folder_path)
+                    # through the NAS executor so a hung mount cannot block us
+                    try:
+                        source_available = bool(folder_path) and nas_io.call(folder_path, os.path.isdir, folder_path)
+                    except OSError as e:
+                        print(f"Source folder error: {e}, using stale cache")
+                        source_available = False
                     
                     if source_available:
-                        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
                         try:
-                            for entry in os.scandir(folder_path):
-                                if entry.is_file():
-                                    ext = os.path.splitext(entry.name)[1].lower()
-                                    if ext in image_extensions:
-                                        stat = entry.stat()
-                                        photos.append({
-                                            'name': entry.name,
-                                            'path': entry.path,
-                                            'mtime': stat.st_mtime,
-                                            'size': stat.st_size
-                                        })
-                            # Sort by modification time (newest first)
-                            photos.sort(key=lambda x: x['mtime'], reverse=True)
+                            photos = nas_io.call(folder_path, scan_photo_folder, folder_path, timeout=NAS_SCAN_TIMEOUT)
                             # Save photo list to cache
                             self.save_photo_list_cache(folder_path, photos)
                             print(f"Refreshed photo list: {len(photos)} photos")
@@ -1391,7 +5142,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
                 self.send_json_response({'success': True, 'photos': photos, 'cached': from_cache})
 
-            elif '/api/local/image' in self.path:
+            elif endpoint == 'image':
                 # Serve image file - CACHE FIRST to avoid blocking on slow NAS
                 image_path = params.get('path', [''])[0]
 
@@ -1425,15 +5176,20 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                     self.wfile.write(data)
                     return
                 
-                # Not in cache - must read from source (may block)
-                if not os.path.isfile(image_path):
+                # Not in cache - must read from source (NAS executor, with a deadline)
+                try:
+                    data = nas_io.call(image_path, read_photo, image_path)
+                except (NASTimeout, NASUnavailable) as e:
+                    self.send_error(503, f"Photo source not responding: {e}")
+                    return
+                except OSError as e:
+                    self.send_error(500, f"Cannot read image: {e}")
+                    return
+                if data is None:
                     self.send_error(404, "Image not found and not cached")
                     return
-                
+
                 try:
-                    real_path = os.path.realpath(image_path)
-                    with open(real_path, 'rb') as f:
-                        data = f.read()
                     # Cache the photo for future use
                     self.cache_photo(image_path, data)
                     
@@ -1548,15 +5304,97 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_payload(response, 'application/json')
+
+    def negotiate_compression(self, content_type, length=None):
+        """Return 'gzip'/'deflate' if this body should be compressed for this client"""
+        if not COMPRESSION_ENABLED or not is_compressible(content_type):
+            return None
+        if length is not None and length < COMPRESSION_MIN_SIZE:
+            return None
+        encoding = choose_encoding(self.headers.get('Accept-Encoding'), DYNAMIC_ENCODINGS, DYNAMIC_ENCODINGS)
+        return None if encoding == 'identity' else encoding
+
+    def send_payload(self, body, content_type):
+        """Finish headers and write a buffered body, compressed when worthwhile"""
+        encoding = self.negotiate_compression(content_type, len(body))
+        if is_compressible(content_type):
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            compressor = make_compressor(encoding)
+            compressed = compressor.compress(body) + compressor.flush()
+            record_compression(len(body), len(compressed))
+            body = compressed
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def copy_upstream_body(self, response):
+        """Finish headers and relay an upstream body without buffering it
+
+        Text bodies are compressed on the fly for clients that accept it.
+        Uses the upstream Content-Length when the body passes through
+        unchanged, chunked encoding for HTTP/1.1 clients otherwise, and closes
+        the connection as a last resort.
+        """
+        length = response.headers.get('Content-Length')
+        content_type = response.headers.get('Content-Type', '')
+        encoding = None
+        if not response.headers.get('Content-Encoding'):
+            encoding = self.negotiate_compression(content_type, int(length) if length else None)
+        if is_compressible(content_type):
+            self.send_header('Vary', 'Accept-Encoding')
+
+        if encoding is None and length is not None:
+            self.send_header('Content-Length', length)
+            self.end_headers()
+            shutil.copyfileobj(response, self.wfile, 64 * 1024)
+            return
+
+        compressor = None
+        if encoding:
+            compressor = make_compressor(encoding)
+            self.send_header('Content-Encoding', encoding)
+
+        chunked = self.request_version == 'HTTP/1.1' and self.protocol_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
         self.end_headers()
-        self.wfile.write(response)
 
-    def proxy_synology_request(self):
+        def write(data):
+            if not data:
+                return
+            if chunked:
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            else:
+                self.wfile.write(data)
+
+        bytes_in = bytes_out = 0
+        while True:
+            chunk = response.read1(64 * 1024)
+            if not chunk:
+                break
+            bytes_in += len(chunk)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            bytes_out += len(chunk)
+            write(chunk)
+        if compressor:
+            tail = compressor.flush()
+            bytes_out += len(tail)
+            write(tail)
+            record_compression(bytes_in, bytes_out)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def proxy_synology_request(self, endpoint):
         """Proxy requests to Synology Photos API"""
         try:
-            # Parse the request path and query parameters
-            parsed = urllib.parse.urlparse(self.path)
-            params = urllib.parse.parse_qs(parsed.query)
+            params = self.query
 
             base_url = params.get('baseUrl', [''])[0]
             passphrase = params.get('passphrase', [''])[0]
@@ -1565,7 +5403,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_error(400, "Missing baseUrl or passphrase")
                 return
 
-            if '/api/synology/photos' in self.path:
+            if endpoint == 'photos':
                 # List photos from shared album
                 api_url = f"{base_url}/webapi/entry.cgi"
                 query_params = urllib.parse.urlencode({
@@ -1581,15 +5419,12 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
                 req = urllib.request.Request(full_url)
                 with urllib.request.urlopen(req, context=ssl_context, timeout=30) as response:
-                    data = response.read()
-
                     self.send_response(200)
                     self.send_header('Content-Type', 'application/json')
                     self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(data)
+                    self.copy_upstream_body(response)
 
-            elif '/api/synology/thumbnail' in self.path:
+            elif endpoint == 'thumbnail':
                 # Get thumbnail/image
                 photo_id = params.get('id', [''])[0]
                 size = params.get('size', ['xl'])[0]
@@ -1613,156 +5448,333 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
                 req = urllib.request.Request(full_url)
                 with urllib.request.urlopen(req, context=ssl_context, timeout=30) as response:
-                    data = response.read()
                     content_type = response.headers.get('Content-Type', 'image/jpeg')
 
                     self.send_response(200)
                     self.send_header('Content-Type', content_type)
                     self.send_header('Access-Control-Allow-Origin', '*')
                     self.send_header('Cache-Control', 'public, max-age=86400')
-                    self.end_headers()
-                    self.wfile.write(data)
+                    self.copy_upstream_body(response)
 
             else:
                 self.send_error(404, "Synology endpoint not found")
 
         except urllib.error.HTTPError as e:
-            self.send_error(e.code, str(e.reason))
+            self.fail_response(e.code, str(e.reason))
         except Exception as e:
             print(f"Synology proxy error: {e}")
-            self.send_error(500, str(e))
+            self.fail_response(500, str(e))
 
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
-    def handle_habits_request(self):
-        """Handle all habits API requests"""
+    def handle_habits_list(self):
+        """GET /api/habits - List all habits with today's status"""
+        habits = get_habits_with_stats(days=30)
+        
+        for habit in habits:
+            # Parse schedule_data if it's JSON
+            if habit['schedule_data']:
+                try:
+                    habit['schedule_data'] = json.loads(habit['schedule_data'])
+                except:
+                    pass
+        
+        self.send_json_response({'habits': habits})
+
+    def handle_habits_stats(self):
+        """GET /api/habits/stats - Get stats for all habits"""
+        habits = get_habits_with_stats(days=30)
+        stats = {habit['id']: habit['stats'] for habit in habits}
+        self.send_json_response({'stats': stats})
+
+    def handle_habits_completions(self):
+        """GET /api/habits/completions - Get completion history"""
+        habit_id = self.query.get('habit_id', [None])[0]
+        start_date = self.query.get('start', [None])[0]
+        end_date = self.query.get('end', [None])[0]
+        completions = get_completions(
+            habit_id=int(habit_id) if habit_id else None,
+            start_date=start_date,
+            end_date=end_date
+        )
+        self.send_json_response({'completions': completions})
+
+    def handle_habit_create(self):
+        """POST /api/habits - Create new habit"""
+        body = self.read_json_body()
+        habit_id = create_habit(
+            name=body['name'],
+            person=body.get('person', 'Everyone'),
+            schedule_type=body.get('schedule_type', 'daily'),
+            schedule_data=body.get('schedule_data'),
+            icon=body.get('icon', '✓'),
+            category=body.get('category', 'general')
+        )
+        self.send_json_response({'success': True, 'id': habit_id})
+
+    def handle_habits_batch(self):
+        """POST /api/habits/batch - Apply many complete/uncomplete operations at once"""
+        operations = self.read_json_body().get('operations', [])
+        if not isinstance(operations, list):
+            self.send_json_response({'success': False, 'error': 'operations must be a list'})
+            return
+        
         try:
-            parsed = urllib.parse.urlparse(self.path)
-            path_parts = parsed.path.split('/')
-            params = urllib.parse.parse_qs(parsed.query)
-            
-            # GET /api/habits - List all habits with today's status
-            if self.command == 'GET' and parsed.path == '/api/habits':
-                habits = get_habits()
-                today = datetime.now().strftime('%Y-%m-%d')
-                completions_today = get_completions(start_date=today, end_date=today)
-                completed_ids = {c['habit_id'] for c in completions_today}
-                
-                # Add completion status and stats to each habit
-                for habit in habits:
-                    habit['completed_today'] = habit['id'] in completed_ids
-                    stats = get_habit_stats(habit['id'], days=30)
-                    habit['stats'] = stats
-                    
-                    # Parse schedule_data if it's JSON
-                    if habit['schedule_data']:
-                        try:
-                            habit['schedule_data'] = json.loads(habit['schedule_data'])
-                        except:
-                            pass
-                
-                self.send_json_response({'habits': habits})
-                return
-            
-            # GET /api/habits/stats - Get stats for all habits
-            if self.command == 'GET' and parsed.path == '/api/habits/stats':
-                habits = get_habits()
-                stats = {}
-                for habit in habits:
-                    stats[habit['id']] = get_habit_stats(habit['id'], days=30)
-                self.send_json_response({'stats': stats})
-                return
-            
-            # GET /api/habits/completions - Get completion history
-            if self.command == 'GET' and parsed.path == '/api/habits/completions':
-                habit_id = params.get('habit_id', [None])[0]
-                start_date = params.get('start', [None])[0]
-                end_date = params.get('end', [None])[0]
-                completions = get_completions(
-                    habit_id=int(habit_id) if habit_id else None,
-                    start_date=start_date,
-                    end_date=end_date
-                )
-                self.send_json_response({'completions': completions})
-                return
-            
-            # POST /api/habits - Create new habit
-            if self.command == 'POST' and parsed.path == '/api/habits':
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = json.loads(self.rfile.read(content_length))
-                
-                habit_id = create_habit(
-                    name=body['name'],
-                    person=body.get('person', 'Everyone'),
-                    schedule_type=body.get('schedule_type', 'daily'),
-                    schedule_data=body.get('schedule_data'),
-                    icon=body.get('icon', '✓'),
-                    category=body.get('category', 'general')
-                )
-                self.send_json_response({'success': True, 'id': habit_id})
-                return
-            
-            # POST /api/habits/{id}/complete - Mark habit complete
-            if self.command == 'POST' and '/complete' in parsed.path:
-                habit_id = int(path_parts[3])
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = {}
-                if content_length > 0:
-                    body = json.loads(self.rfile.read(content_length))
-                
-                date = body.get('date', datetime.now().strftime('%Y-%m-%d'))
-                notes = body.get('notes')
-                success = complete_habit(habit_id, date, notes)
-                self.send_json_response({'success': success})
-                return
-            
-            # POST /api/habits/{id}/uncomplete - Remove completion
-            if self.command == 'POST' and '/uncomplete' in parsed.path:
-                habit_id = int(path_parts[3])
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = {}
-                if content_length > 0:
-                    body = json.loads(self.rfile.read(content_length))
-                
-                date = body.get('date', datetime.now().strftime('%Y-%m-%d'))
-                uncomplete_habit(habit_id, date)
-                self.send_json_response({'success': True})
-                return
-            
-            # DELETE /api/habits/{id} - Delete habit
-            if self.command == 'DELETE' and len(path_parts) >= 4:
-                habit_id = int(path_parts[3])
-                delete_habit(habit_id)
-                self.send_json_response({'success': True})
-                return
-            
-            self.send_error(404, "Habit endpoint not found")
-            
-        except Exception as e:
-            print(f"Habits API error: {e}")
-            import traceback
-            traceback.print_exc()
-            self.send_error(500, f'Habits API error: {e}')
+            affected = apply_habit_operations(operations)
+        except (KeyError, TypeError, ValueError) as e:
+            self.send_json_response({'success': False, 'error': f'Invalid operation: {e}'})
+            return
+        
+        stats = self.notify_habit_stats(affected) if affected else {}
+        self.send_json_response({'success': True, 'applied': len(operations), 'habits': stats})
+
+    def handle_habit_complete(self, habit_id):
+        """POST /api/habits/{id}/complete - Mark habit complete"""
+        body = self.read_json_body()
+        date = body.get('date', datetime.now().strftime('%Y-%m-%d'))
+        success = complete_habit(habit_id, date, body.get('notes'))
+        if success:
+            self.notify_habit_stats({habit_id})
+        self.send_json_response({'success': success})
+
+    def handle_habit_uncomplete(self, habit_id):
+        """POST /api/habits/{id}/uncomplete - Remove completion"""
+        body = self.read_json_body()
+        date = body.get('date', datetime.now().strftime('%Y-%m-%d'))
+        uncomplete_habit(habit_id, date)
+        self.notify_habit_stats({habit_id})
+        self.send_json_response({'success': True})
+
+    def handle_habit_delete(self, habit_id):
+        """DELETE /api/habits/{id} - Delete habit"""
+        delete_habit(habit_id)
+        self.send_json_response({'success': True})
+
+    def notify_habit_stats(self, habit_ids):
+        """Fetch fresh stats for the given habits and push them to other screens"""
+        stats = {
+            h['id']: {'completed_today': h['completed_today'], 'stats': h['stats']}
+            for h in get_habits_with_stats(days=30, habit_ids=habit_ids)
+        }
+        notify_habits_changed(stats)
+        return stats
 
     def log_message(self, format, *args):
         print(f"[{self.log_date_time_string()}] {args[0]}")
 
 
+# ==================== ROUTING ====================
+
+class Route:
+    """One entry in the routing table, with its timing counters"""
+
+    def __init__(self, method, template, handler, name=None):
+        self.method = method
+        self.template = template
+        self.handler = handler
+        self.name = name or f"{method} {template}"
+        self.params = []  # (name, converter)
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def pattern(self, group):
+        """Regex for this template; parameter groups are prefixed with the route group"""
+        converters = {'int': (r'\d+', int), 'path': (r'.+', str), 'str': (r'[^/]+', str)}
+        regex = ''
+        for literal, param in re.findall(r'([^{]*)(?:\{([^}]+)\})?', self.template):
+            regex += re.escape(literal)
+            if param:
+                name, _, kind = param.partition(':')
+                part, convert = converters[kind or 'str']
+                self.params.append((name, convert))
+                regex += f'(?P<{group}_{name}>{part})'
+        return f'(?P<{group}>{regex})'
+
+
+class Router:
+    """Method + path-template routing table
+
+    Templates look like '/api/habits/{habit_id:int}/complete'. Literal paths
+    are looked up in a dict; templated routes for each method are compiled
+    into one alternation regex, tried in registration order. Timing hooks are
+    called as hook(route, seconds, status) after every routed request.
+    """
+
+    def __init__(self):
+        self.routes = []
+        self.exact = {}
+        self.compiled = {}
+        self.dirty = True
+        self.timing_hooks = []
+
+    def add(self, method, template, handler, name=None):
+        route = Route(method, template, handler, name)
+        self.routes.append(route)
+        self.dirty = True
+        return route
+
+    def _compile(self):
+        self.exact.clear()
+        self.compiled.clear()
+        groups = {}
+        for index, route in enumerate(self.routes):
+            route.params = []
+            if '{' not in route.template:
+                self.exact.setdefault((route.method, route.template), route)
+            else:
+                groups.setdefault(route.method, []).append((f'r{index}', route))
+        for method, entries in groups.items():
+            regex = '|'.join(route.pattern(group) for group, route in entries)
+            self.compiled[method] = (re.compile(f'^(?:{regex})$'), dict(entries))
+        self.dirty = False
+
+    def match(self, method, path):
+        """Return (route, params) or (None, None)"""
+        if self.dirty:
+            self._compile()
+        route = self.exact.get((method, path))
+        if route is not None:
+            return route, {}
+        entry = self.compiled.get(method)
+        if entry is None:
+            return None, None
+        regex, by_group = entry
+        m = regex.match(path)
+        if m is None:
+            return None, None
+        # The route group encloses its parameter groups, so it closes last
+        route = by_group[m.lastgroup]
+        return route, {name: convert(m.group(f'{m.lastgroup}_{name}')) for name, convert in route.params}
+
+    def record(self, route, seconds, status):
+        route.count += 1
+        route.total_time += seconds
+        route.max_time = max(route.max_time, seconds)
+        if status is not None and status >= 500:
+            route.errors += 1
+        for hook in self.timing_hooks:
+            try:
+                hook(route, seconds, status)
+            except Exception as e:
+                print(f"Route timing hook error: {e}")
+
+    def metrics(self):
+        return {
+            route.name: {
+                'count': route.count,
+                'errors': route.errors,
+                'avg_ms': round(route.total_time / route.count * 1000, 2),
+                'max_ms': round(route.max_time * 1000, 2),
+            }
+            for route in self.routes if route.count
+        }
+
+
+def log_slow_route(route, seconds, status):
+    """Timing hook: report requests that held a worker for a long time"""
+    if seconds > 5:
+        print(f"Slow request: {route.name} took {seconds:.1f}s (status {status})")
+
+
+def not_found(message):
+    return lambda handler, **params: handler.send_error(404, message)
+
+
+ROUTES = Router()
+ROUTES.timing_hooks.append(log_slow_route)
+
+# GET
+ROUTES.add('GET', '/api/local/browse', ProxyHandler.handle_folder_browse)
+ROUTES.add('GET', '/api/local/browse/count', ProxyHandler.handle_folder_image_count)
+ROUTES.add('GET', '/api/local/{endpoint:path}', ProxyHandler.handle_local_request)
+ROUTES.add('GET', '/api/synology/{endpoint:path}', ProxyHandler.proxy_synology_request)
+ROUTES.add('GET', '/api/notifications', ProxyHandler.handle_notifications_request)
+ROUTES.add('GET', '/api/screenshot', ProxyHandler.handle_screenshot_request)
+ROUTES.add('GET', '/api/screenshot/take', ProxyHandler.handle_take_screenshot)
+ROUTES.add('GET', '/api/health', ProxyHandler.handle_health)
+ROUTES.add('GET', '/api/screenshot/history', ProxyHandler.handle_screenshot_history)
+ROUTES.add('GET', '/api/screenshot/history/at', ProxyHandler.handle_screenshot_history_at)
+ROUTES.add('GET', '/api/screenshot/history/{index:int}', ProxyHandler.handle_screenshot_history_index)
+ROUTES.add('GET', '/api/weather/cache', ProxyHandler.handle_get_weather_cache)
+ROUTES.add('GET', '/api/server/metrics', lambda h: h.send_json_response(get_server_metrics(h.server)))
+ROUTES.add('GET', '/api/habits', ProxyHandler.handle_habits_list)
+ROUTES.add('GET', '/api/habits/stats', ProxyHandler.handle_habits_stats)
+ROUTES.add('GET', '/api/habits/completions', ProxyHandler.handle_habits_completions)
+ROUTES.add('GET', '/api/habits/{rest:path}', not_found("Habit endpoint not found"))
+ROUTES.add('GET', '/api/tts_cache/{name}', ProxyHandler.handle_tts_cache_file)
+ROUTES.add('GET', '/api/quran/audio', ProxyHandler.handle_quran_audio)
+ROUTES.add('GET', '/api/quran/{path:path}', ProxyHandler.handle_quran_api)
+ROUTES.add('GET', '/api/camera_proxy_stream/{entity_id}', ProxyHandler.handle_camera_stream)
+ROUTES.add('GET', '/api/camera_proxy/{entity_id}', ProxyHandler.handle_camera_snapshot)
+ROUTES.add('GET', '/api/states', ProxyHandler.handle_states)
+ROUTES.add('GET', '/api/states/{entity_id}', ProxyHandler.handle_state)
+ROUTES.add('GET', '/api/{path:path}', lambda h, path: h.proxy_request('GET'), name='GET /api/* (proxy)')
+
+# POST
+ROUTES.add('POST', '/api/weather/cache/daily', ProxyHandler.handle_save_daily_forecast)
+ROUTES.add('POST', '/api/weather/cache/hourly', ProxyHandler.handle_save_hourly_forecast)
+ROUTES.add('POST', '/api/habits', ProxyHandler.handle_habit_create)
+ROUTES.add('POST', '/api/habits/batch', ProxyHandler.handle_habits_batch)
+ROUTES.add('POST', '/api/habits/{habit_id:int}/complete', ProxyHandler.handle_habit_complete)
+ROUTES.add('POST', '/api/habits/{habit_id:int}/uncomplete', ProxyHandler.handle_habit_uncomplete)
+ROUTES.add('POST', '/api/habits/{rest:path}', not_found("Habit endpoint not found"))
+ROUTES.add('POST', '/api/services/calendar/get_events', ProxyHandler.handle_calendar_get_events)
+ROUTES.add('POST', '/api/services/calendar/{service}', ProxyHandler.handle_calendar_service)
+ROUTES.add('POST', '/api/tts_get_url', ProxyHandler.handle_tts_get_url)
+ROUTES.add('POST', '/api/tts_cache/prerender', ProxyHandler.handle_tts_prerender)
+ROUTES.add('POST', '/api/services/todo/get_items', ProxyHandler.handle_todo_get_items)
+ROUTES.add('POST', '/api/services/todo/{service}', ProxyHandler.handle_todo_write)
+ROUTES.add('POST', '/api/{path:path}', lambda h, path: h.proxy_request('POST'), name='POST /api/* (proxy)')
+
+# DELETE
+ROUTES.add('DELETE', '/api/habits/{habit_id:int}', ProxyHandler.handle_habit_delete)
+ROUTES.add('DELETE', '/api/habits/{rest:path}', not_found("Habit endpoint not found"))
+
+
+def benchmark_router(iterations=20000):
+    """Measure ROUTES.match cost for a sample path of every route"""
+    samples = {'int': '42', 'path': 'sample/path', 'str': 'sample'}
+    total = 0.0
+    print(f"Router benchmark: {len(ROUTES.routes)} routes, {iterations} lookups each")
+    for route in ROUTES.routes:
+        path = re.sub(r'\{[^}:]+(?::(\w+))?\}', lambda m: samples[m.group(1) or 'str'], route.template)
+        matched, _ = ROUTES.match(route.method, path)
+        t0 = time.perf_counter()
+        for _ in range(iterations):
+            ROUTES.match(route.method, path)
+        per_call = (time.perf_counter() - t0) / iterations
+        total += per_call
+        mark = '' if matched is route else f'  (matched {matched.name if matched else None})'
+        print(f"  {route.name:<45} {per_call * 1e9:8.0f} ns{mark}")
+    print(f"  {'mean':<45} {total / len(ROUTES.routes) * 1e9:8.0f} ns")
+
+
 # ==================== HABIT TRACKER DATABASE ====================
 
 HABITS_DB_PATH = os.path.join(os.path.dirname(__file__), 'habits.db')
 
-def init_habits_db():
-    """Initialize the habits tracking database"""
+# Set by check_habit_query_plans() to record every statement the API issues
+_habits_db_trace = None
+
+def _habits_connect():
+    """Open a connection to the habits database, initializing it on first use"""
+    if _habits_db_ready != HABITS_DB_PATH:
+        init_habits_db()
     conn = sqlite3.connect(HABITS_DB_PATH)
-    c = conn.cursor()
-    
-    # Habits table
+    if _habits_db_trace:
+        conn.set_trace_callback(_habits_db_trace)
+    return conn
+
+def _migrate_base_tables(c):
+    """v1: habits and completions tables"""
     c.execute('''
         CREATE TABLE IF NOT EXISTS habits (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -1776,8 +5788,6 @@ def init_habits_db():
             active INTEGER DEFAULT 1
         )
     ''')
-    
-    # Completions table
     c.execute('''
         CREATE TABLE IF NOT EXISTS completions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -1789,14 +5799,77 @@ def init_habits_db():
             UNIQUE(habit_id, completed_date)
         )
     ''')
+
+def _migrate_habit_stats(c):
+    """v2: materialized streak state, maintained by complete_habit/uncomplete_habit"""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS habit_stats (
+            habit_id INTEGER PRIMARY KEY,
+            streak INTEGER NOT NULL DEFAULT 0,  -- length of the run ending at last_completed
+            streak_start DATE,
+            last_completed DATE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (habit_id) REFERENCES habits(id)
+        )
+    ''')
+    _rebuild_habit_stats(c)
+
+def _migrate_indexes(c):
+    """v3: indexes for date-range completion queries and the habit list"""
+    # Today's completions, 30-day counts and date-only history filters;
+    # covering for the per-habit count aggregation
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_completions_date_habit
+        ON completions (completed_date, habit_id)
+    ''')
+    # WHERE active = 1 ORDER BY person, category, name without a sort
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_habits_active_order
+        ON habits (active, person, category, name)
+    ''')
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Append new steps; never edit or reorder released ones.
+HABITS_MIGRATIONS = [
+    (1, _migrate_base_tables),
+    (2, _migrate_habit_stats),
+    (3, _migrate_indexes),
+]
+
+def init_habits_db():
+    """Initialize the habits tracking database and apply pending migrations"""
+    global _habits_db_ready
+    with _db_init_lock:
+        if _habits_db_ready == HABITS_DB_PATH:
+            return
+        _init_habits_db()
+        _habits_db_ready = HABITS_DB_PATH
+
+def _init_habits_db():
+    conn = sqlite3.connect(HABITS_DB_PATH)
+    c = conn.cursor()
+    
+    version = c.execute('PRAGMA user_version').fetchone()[0]
+    for target, migrate in HABITS_MIGRATIONS:
+        if version >= target:
+            continue
+        try:
+            migrate(c)
+            c.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            conn.close()
+            raise
+        print(f"Habits database migrated to v{target}: {migrate.__doc__.split(':', 1)[1].strip()}")
+        version = target
     
-    conn.commit()
     conn.close()
-    print(f"Habits database initialized: {HABITS_DB_PATH}")
+    print(f"Habits database initialized: {HABITS_DB_PATH} (schema v{version})")
 
 def get_habits():
     """Get all active habits"""
-    conn = sqlite3.connect(HABITS_DB_PATH)
+    conn = _habits_connect()
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
     c.execute('SELECT * FROM habits WHERE active = 1 ORDER BY person, category, name')
@@ -1806,7 +5879,7 @@ def get_habits():
 
 def create_habit(name, person='Everyone', schedule_type='daily', schedule_data=None, icon='✓', category='general'):
     """Create a new habit"""
-    conn = sqlite3.connect(HABITS_DB_PATH)
+    conn = _habits_connect()
     c = conn.cursor()
     c.execute('''
         INSERT INTO habits (name, person, schedule_type, schedule_data, icon, category)
@@ -1819,7 +5892,7 @@ def create_habit(name, person='Everyone', schedule_type='daily', schedule_data=N
 
 def delete_habit(habit_id):
     """Soft delete a habit"""
-    conn = sqlite3.connect(HABITS_DB_PATH)
+    conn = _habits_connect()
     c = conn.cursor()
     c.execute('UPDATE habits SET active = 0 WHERE id = ?', (habit_id,))
     conn.commit()
@@ -1829,13 +5902,14 @@ def complete_habit(habit_id, date=None, notes=None):
     """Mark a habit as complete for a date"""
     if date is None:
         date = datetime.now().strftime('%Y-%m-%d')
-    conn = sqlite3.connect(HABITS_DB_PATH)
+    conn = _habits_connect()
     c = conn.cursor()
     try:
         c.execute('''
             INSERT OR REPLACE INTO completions (habit_id, completed_date, notes)
             VALUES (?, ?, ?)
         ''', (habit_id, date, notes))
+        _update_stats_on_complete(c, habit_id, date)
         conn.commit()
         success = True
     except Exception as e:
@@ -1848,15 +5922,52 @@ def uncomplete_habit(habit_id, date=None):
     """Remove completion for a date"""
     if date is None:
         date = datetime.now().strftime('%Y-%m-%d')
-    conn = sqlite3.connect(HABITS_DB_PATH)
+    conn = _habits_connect()
     c = conn.cursor()
     c.execute('DELETE FROM completions WHERE habit_id = ? AND completed_date = ?', (habit_id, date))
+    _update_stats_on_uncomplete(c, habit_id, date)
     conn.commit()
     conn.close()
 
+def apply_habit_operations(operations):
+    """Apply a batch of complete/uncomplete operations in a single transaction
+
+    Each operation is a dict with 'habit_id', 'action' ('complete' or
+    'uncomplete') and optional 'date' and 'notes'. Returns the set of
+    affected habit ids. Nothing is written if any operation fails.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    conn = _habits_connect()
+    c = conn.cursor()
+    affected = set()
+    try:
+        for op in operations:
+            habit_id = int(op['habit_id'])
+            date = op.get('date') or today
+            action = op.get('action', 'complete')
+            if action == 'complete':
+                c.execute('''
+                    INSERT OR REPLACE INTO completions (habit_id, completed_date, notes)
+                    VALUES (?, ?, ?)
+                ''', (habit_id, date, op.get('notes')))
+                _update_stats_on_complete(c, habit_id, date)
+            elif action == 'uncomplete':
+                c.execute('DELETE FROM completions WHERE habit_id = ? AND completed_date = ?', (habit_id, date))
+                _update_stats_on_uncomplete(c, habit_id, date)
+            else:
+                raise ValueError(f"Unknown habit action: {action}")
+            affected.add(habit_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return affected
+
 def get_completions(habit_id=None, start_date=None, end_date=None):
     """Get completions with optional filters"""
-    conn = sqlite3.connect(HABITS_DB_PATH)
+    conn = _habits_connect()
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
     
@@ -1879,12 +5990,140 @@ def get_completions(habit_id=None, start_date=None, end_date=None):
     conn.close()
     return completions
 
+def _parse_schedule(schedule_type, schedule_data):
+    """Return (schedule_type, schedule dict) with schedule_data decoded"""
+    data = schedule_data
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            data = None
+    return schedule_type or 'daily', data or {}
+
+def _streak_unbroken(schedule_type, schedule_data, earlier, later):
+    """True if no due occurrence was missed strictly between two dates
+
+    Dates are 'YYYY-MM-DD' strings. Weekly weekdays use JavaScript numbering
+    (0=Sunday) to match the frontend.
+    """
+    gap = (datetime.strptime(later, '%Y-%m-%d') - datetime.strptime(earlier, '%Y-%m-%d')).days
+    if gap <= 1:
+        return True
+    if schedule_type == 'interval':
+        try:
+            interval = max(1, int(schedule_data.get('days', 1)))
+        except (TypeError, ValueError):
+            interval = 1
+        return gap <= interval
+    if schedule_type == 'weekly' and schedule_data.get('weekdays'):
+        weekdays = set(schedule_data['weekdays'])
+        if gap > 7:
+            return False
+        start = datetime.strptime(earlier, '%Y-%m-%d').date()
+        for offset in range(1, gap):
+            day = start + timedelta(days=offset)
+            if (day.weekday() + 1) % 7 in weekdays:
+                return False
+        return True
+    # Daily (and weekly without weekdays): every day is due
+    return False
+
+def _get_schedule(c, habit_id):
+    """Look up a habit's parsed schedule using an open cursor"""
+    c.execute('SELECT schedule_type, schedule_data FROM habits WHERE id = ?', (habit_id,))
+    row = c.fetchone()
+    if row is None:
+        return 'daily', {}
+    return _parse_schedule(row[0], row[1])
+
+def _recompute_habit_stats(c, habit_id):
+    """Recompute one habit's streak by walking back from its latest completion"""
+    schedule_type, schedule_data = _get_schedule(c, habit_id)
+    rows = c.execute('''
+        SELECT completed_date FROM completions
+        WHERE habit_id = ?
+        ORDER BY completed_date DESC
+    ''', (habit_id,))
+
+    streak = 0
+    last_completed = None
+    streak_start = None
+    for (date_str,) in rows:
+        if last_completed is None:
+            last_completed = date_str
+        elif not _streak_unbroken(schedule_type, schedule_data, date_str, streak_start):
+            break
+        streak += 1
+        streak_start = date_str
+
+    c.execute('''
+        INSERT OR REPLACE INTO habit_stats (habit_id, streak, streak_start, last_completed, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', (habit_id, streak, streak_start, last_completed))
+
+def _update_stats_on_complete(c, habit_id, date):
+    """Extend the materialized streak for a new completion"""
+    c.execute('SELECT streak, last_completed FROM habit_stats WHERE habit_id = ?', (habit_id,))
+    row = c.fetchone()
+    if row is None or row[1] is None or date < row[1]:
+        # New habit or backfilled date - recompute from history
+        _recompute_habit_stats(c, habit_id)
+        return
+    streak, last_completed = row
+    if date == last_completed:
+        return
+
+    schedule_type, schedule_data = _get_schedule(c, habit_id)
+    if _streak_unbroken(schedule_type, schedule_data, last_completed, date):
+        c.execute('''
+            UPDATE habit_stats SET streak = ?, last_completed = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE habit_id = ?
+        ''', (streak + 1, date, habit_id))
+    else:
+        c.execute('''
+            UPDATE habit_stats SET streak = 1, streak_start = ?, last_completed = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE habit_id = ?
+        ''', (date, date, habit_id))
+
+def _update_stats_on_uncomplete(c, habit_id, date):
+    """Shrink the materialized streak if the removed date was part of it"""
+    c.execute('SELECT streak_start, last_completed FROM habit_stats WHERE habit_id = ?', (habit_id,))
+    row = c.fetchone()
+    if row is None or row[0] is None or row[0] <= date <= row[1]:
+        _recompute_habit_stats(c, habit_id)
+
+def _rebuild_habit_stats(c):
+    """Recompute every habit's stats row using an open cursor"""
+    c.execute('DELETE FROM habit_stats')
+    habit_ids = [row[0] for row in c.execute('SELECT id FROM habits').fetchall()]
+    for habit_id in habit_ids:
+        _recompute_habit_stats(c, habit_id)
+    return len(habit_ids)
+
+def rebuild_habit_stats():
+    """Recompute the habit_stats table from the full completion history"""
+    conn = _habits_connect()
+    count = _rebuild_habit_stats(conn.cursor())
+    conn.commit()
+    conn.close()
+    print(f"Habit stats rebuilt for {count} habits")
+    return count
+
+def _current_streak(schedule_type, schedule_data, streak, last_completed, today):
+    """Materialized streak if it is still alive today, otherwise 0"""
+    if not streak or not last_completed or last_completed > today:
+        return 0
+    if _streak_unbroken(schedule_type, schedule_data, last_completed, today):
+        return streak
+    return 0
+
 def get_habit_stats(habit_id, days=30):
     """Get stats for a habit"""
-    conn = sqlite3.connect(HABITS_DB_PATH)
+    conn = _habits_connect()
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
     
+    today = datetime.now().strftime('%Y-%m-%d')
     start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
     
     # Count completions
@@ -1894,29 +6133,271 @@ def get_habit_stats(habit_id, days=30):
     ''', (habit_id, start_date))
     count = c.fetchone()['count']
     
-    # Get streak
+    # Streak from the materialized table
     c.execute('''
-        SELECT completed_date FROM completions 
-        WHERE habit_id = ? 
-        ORDER BY completed_date DESC
+        SELECT h.schedule_type, h.schedule_data, hs.streak, hs.last_completed
+        FROM habits h LEFT JOIN habit_stats hs ON hs.habit_id = h.id
+        WHERE h.id = ?
     ''', (habit_id,))
-    
-    dates = [row['completed_date'] for row in c.fetchall()]
+    row = c.fetchone()
     streak = 0
-    today = datetime.now().date()
-    
-    for i, date_str in enumerate(dates):
-        expected = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-        if date_str == expected:
-            streak += 1
-        else:
-            break
+    if row:
+        schedule_type, schedule_data = _parse_schedule(row['schedule_type'], row['schedule_data'])
+        streak = _current_streak(schedule_type, schedule_data, row['streak'], row['last_completed'], today)
     
     conn.close()
     return {'count': count, 'streak': streak, 'days': days}
 
-# Initialize habits database
-init_habits_db()
+def get_habits_with_stats(days=30, today=None, habit_ids=None):
+    """Get all active habits with stats and today's status in a single query
+
+    Streaks come from the materialized habit_stats table; only the rolling
+    30-day count is aggregated from completions.
+    """
+    if today is None:
+        today = datetime.now().strftime('%Y-%m-%d')
+    start_date = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=days)).strftime('%Y-%m-%d')
+
+    conn = _habits_connect()
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute('''
+        WITH counts AS (
+            SELECT habit_id,
+                   COUNT(*) AS count,
+                   MAX(completed_date = :today) AS completed_today
+            FROM completions
+            WHERE completed_date >= :start_date
+            GROUP BY habit_id
+        )
+        SELECT h.*,
+               COALESCE(counts.count, 0) AS stat_count,
+               COALESCE(counts.completed_today, 0) AS stat_completed_today,
+               hs.streak AS stat_streak,
+               hs.last_completed AS stat_last_completed
+        FROM habits h
+        LEFT JOIN counts ON counts.habit_id = h.id
+        LEFT JOIN habit_stats hs ON hs.habit_id = h.id
+        WHERE h.active = 1
+        ORDER BY h.person, h.category, h.name
+    ''', {'today': today, 'start_date': start_date})
+
+    habits = []
+    for row in c.fetchall():
+        if habit_ids is not None and row['id'] not in habit_ids:
+            continue
+        habit = dict(row)
+        schedule_type, schedule_data = _parse_schedule(habit['schedule_type'], habit['schedule_data'])
+        streak = _current_streak(schedule_type, schedule_data, habit.pop('stat_streak'),
+                                 habit.pop('stat_last_completed'), today)
+        habit['completed_today'] = bool(habit.pop('stat_completed_today'))
+        habit['stats'] = {
+            'count': habit.pop('stat_count'),
+            'streak': streak,
+            'days': days
+        }
+        habits.append(habit)
+    conn.close()
+    return habits
+
+def check_habit_query_plans():
+    """Run every habits API query on a scratch database and check its query plan
+
+    Statements are recorded with a trace callback while the API functions
+    run, then each one is passed through EXPLAIN QUERY PLAN. Returns a list
+    of problems; a full scan of habits, completions or habit_stats is one.
+    """
+    import tempfile
+
+    global HABITS_DB_PATH, _habits_db_trace
+    original_path = HABITS_DB_PATH
+    tmp_dir = tempfile.mkdtemp(prefix='skylight-plan-')
+    HABITS_DB_PATH = os.path.join(tmp_dir, 'habits.db')
+    statements = []
+    try:
+        init_habits_db()
+        today = datetime.now().strftime('%Y-%m-%d')
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        last_week = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+
+        _habits_db_trace = statements.append
+        daily = create_habit('Daily')
+        weekly = create_habit('Weekly', schedule_type='weekly', schedule_data={'weekdays': [1, 3]})
+        complete_habit(daily, yesterday)
+        complete_habit(daily, today)
+        complete_habit(weekly, last_week)
+        uncomplete_habit(daily, yesterday)
+        apply_habit_operations([
+            {'habit_id': weekly, 'action': 'complete'},
+            {'habit_id': daily, 'action': 'uncomplete'},
+        ])
+        get_habits()
+        get_habits_with_stats(days=30)
+        get_habits_with_stats(days=30, habit_ids={daily})
+        get_habit_stats(daily)
+        get_completions()
+        get_completions(habit_id=daily)
+        get_completions(start_date=today, end_date=today)
+        get_completions(habit_id=daily, start_date=last_week, end_date=today)
+        delete_habit(weekly)
+        _habits_db_trace = None
+
+        conn = sqlite3.connect(HABITS_DB_PATH)
+        full_scan = re.compile(r'^SCAN (?:TABLE )?(habits|completions|habit_stats)\b(?!.*\bUSING\b)')
+        problems = []
+        seen = set()
+        for sql in statements:
+            sql = sql.strip()
+            if sql in seen or not sql.split(None, 1)[0].upper() in ('SELECT', 'WITH', 'UPDATE', 'DELETE'):
+                continue
+            seen.add(sql)
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+            for detail in plan:
+                if full_scan.match(detail):
+                    problems.append(f"{detail}: {' '.join(sql.split())}")
+        conn.close()
+        print(f"Query plans: checked {len(seen)} statements, {len(problems)} problem(s)")
+        for problem in problems:
+            print(f"  {problem}")
+        return problems
+    finally:
+        _habits_db_trace = None
+        HABITS_DB_PATH = original_path
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def benchmark_habit_stats(years=5, habit_count=40, rounds=5):
+    """Compare per-habit history scans with the aggregated habit_stats query on synthetic data"""
+    import random
+    import tempfile
+
+    global HABITS_DB_PATH
+    original_path = HABITS_DB_PATH
+    tmp_dir = tempfile.mkdtemp(prefix='skylight-bench-')
+    HABITS_DB_PATH = os.path.join(tmp_dir, 'habits.db')
+    try:
+        init_habits_db()
+        rng = random.Random(42)
+        today = datetime.now().date()
+        conn = _habits_connect()
+        c = conn.cursor()
+        for i in range(habit_count):
+            c.execute('INSERT INTO habits (name, person, schedule_type) VALUES (?, ?, ?)',
+                      (f'Habit {i}', f'Person {i % 5}', 'daily'))
+            habit_id = c.lastrowid
+            # Recent streak of varying length, then sparse history
+            streak_len = rng.randint(0, 60)
+            rows = []
+            for day in range(years * 365):
+                if day < streak_len or (day > streak_len and rng.random() < 0.7):
+                    date_str = (today - timedelta(days=day)).strftime('%Y-%m-%d')
+                    rows.append((habit_id, date_str))
+            c.executemany('INSERT INTO completions (habit_id, completed_date) VALUES (?, ?)', rows)
+        conn.commit()
+        total = c.execute('SELECT COUNT(*) FROM completions').fetchone()[0]
+        conn.close()
+        rebuild_habit_stats()
+
+        today_str = today.strftime('%Y-%m-%d')
+        start_date = (today - timedelta(days=30)).strftime('%Y-%m-%d')
+
+        def legacy_stats(habit_id):
+            # Pre-habit_stats baseline: walk the whole completion history per habit
+            conn = _habits_connect()
+            c = conn.cursor()
+            count = c.execute('''
+                SELECT COUNT(*) FROM completions
+                WHERE habit_id = ? AND completed_date >= ?
+            ''', (habit_id, start_date)).fetchone()[0]
+            schedule_type, schedule_data = _get_schedule(c, habit_id)
+            rows = c.execute('''
+                SELECT completed_date FROM completions
+                WHERE habit_id = ?
+                ORDER BY completed_date DESC
+            ''', (habit_id,)).fetchall()
+            streak = 0
+            streak_start = None
+            for (date_str,) in rows:
+                if streak_start is not None and not _streak_unbroken(schedule_type, schedule_data, date_str, streak_start):
+                    break
+                streak += 1
+                streak_start = date_str
+            last_completed = rows[0][0] if rows else None
+            conn.close()
+            streak = _current_streak(schedule_type, schedule_data, streak, last_completed, today_str)
+            return {'count': count, 'streak': streak, 'days': 30}
+
+        def legacy():
+            habits = get_habits()
+            completed_ids = {r['habit_id'] for r in get_completions(start_date=today_str, end_date=today_str)}
+            return {h['id']: (legacy_stats(h['id']), h['id'] in completed_ids) for h in habits}
+
+        def aggregated():
+            return {h['id']: (h['stats'], h['completed_today']) for h in get_habits_with_stats(days=30)}
+
+        if legacy() != aggregated():
+            print("Benchmark: WARNING - aggregated results differ from per-habit results")
+
+        print(f"Benchmark: {habit_count} habits, {total} completions over {years} years")
+        for name, fn in (('per-habit', legacy), ('aggregated', aggregated)):
+            timings = []
+            for _ in range(rounds):
+                t0 = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - t0)
+            print(f"  {name:>10}: best {min(timings) * 1000:.1f} ms, mean {sum(timings) / len(timings) * 1000:.1f} ms")
+    finally:
+        HABITS_DB_PATH = original_path
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# ==================== STARTUP ====================
+
+# Budget for `import server` (cumulative, per python -X importtime)
+IMPORT_TIME_BUDGET_MS = 120
+
+
+def warm_up():
+    """Prepare databases and optional modules off the startup path
+
+    Everything here is also done lazily on first use, so requests that arrive
+    before warm-up finishes are still served correctly.
+    """
+    started = time.monotonic()
+    dashboard_version()
+    init_weather_db()
+    init_habits_db()
+    for module in ('websockets', 'paho.mqtt.client'):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    print(f"Startup: warm-up finished in {(time.monotonic() - started) * 1000:.0f} ms")
+
+
+def check_import_time(budget_ms=IMPORT_TIME_BUDGET_MS, runs=3):
+    """Measure `import server` with python -X importtime; True if within budget"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import server'],
+            cwd=script_dir, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"Import failed:\n{result.stderr[-2000:]}")
+            return False
+        for line in result.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == 'server':
+                cumulative_ms = int(fields[1]) / 1000
+                best = cumulative_ms if best is None else min(best, cumulative_ms)
+    if best is None:
+        print("Import time: could not find 'server' in importtime output")
+        return False
+    ok = best <= budget_ms
+    print(f"Import time: {best:.1f} ms (budget {budget_ms} ms) - {'OK' if ok else 'OVER BUDGET'}")
+    return ok
+
 
 # ==================== MAIN ====================
 
@@ -1924,14 +6405,27 @@ def main():
     global mqtt_client
 
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    unified = HTTP_SERVER_MODE == "asyncio"
+
+    # Databases and optional modules load while the server starts accepting
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+    if not unified:
+        # Start WebSocket server in background thread (always, for HA subscriptions)
+        ws_thread = threading.Thread(target=run_websocket_server, daemon=True)
+        ws_thread.start()
+        print(f"WebSocket bridge running on ws://localhost:{WS_PORT}")
 
-    # Start WebSocket server in background thread (always, for HA subscriptions)
-    ws_thread = threading.Thread(target=run_websocket_server, daemon=True)
-    ws_thread.start()
-    print(f"WebSocket bridge running on ws://localhost:{WS_PORT}")
+        # Start HA WebSocket subscription (for real-time updates)
+        start_ha_websocket_thread()
 
-    # Start HA WebSocket subscription (for real-time updates)
-    start_ha_websocket_thread()
+    # Periodic screenshot checks for /api/health
+    if HEALTH_CHECK_INTERVAL > 0:
+        threading.Thread(target=run_health_monitor, name="health-monitor", daemon=True).start()
+
+    # Quiet-hours download of the Quran surahs/reciters in QURAN_PREFETCH
+    if QURAN_CACHE:
+        quran_cache.start_prefetch()
 
     # Start MQTT client if enabled
     if MQTT_ENABLED:
@@ -1944,12 +6438,22 @@ def main():
     else:
         print("MQTT integration disabled (set MQTT_ENABLED=True in config.py to enable)")
 
-    # Start HTTP server (threaded to prevent blocking, allow reuse of address)
-    class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-        allow_reuse_address = True
-        daemon_threads = True  # Don't wait for threads on shutdown
-    
-    with ThreadedTCPServer(("0.0.0.0", PORT), ProxyHandler) as httpd:
+    if unified:
+        print(f"Dashboard server running at http://0.0.0.0:{PORT}/index.html (asyncio runtime)")
+        print(f"Proxying API requests to {HA_URL}")
+        print("Press Ctrl+C to stop")
+        try:
+            run_asyncio_runtime(ProxyHandler)
+        except KeyboardInterrupt:
+            print("\nShutting down...")
+            if mqtt_client:
+                mqtt_client.disconnect()
+        return
+
+    # Start HTTP server (thread per connection, or a bounded worker pool)
+    with create_http_server(("0.0.0.0", PORT), ProxyHandler) as httpd:
+        if HTTP_SERVER_MODE == "pool":
+            print(f"HTTP worker pool: {HTTP_WORKERS} workers, queue {HTTP_QUEUE_SIZE}, timeout {HTTP_REQUEST_TIMEOUT}s")
         print(f"Dashboard server running at http://0.0.0.0:{PORT}/index.html")
         print(f"Proxying API requests to {HA_URL}")
         print("Press Ctrl+C to stop")
@@ -1962,5 +6466,16 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if '--benchmark-habits' in sys.argv:
+        benchmark_habit_stats()
+    elif '--rebuild-habit-stats' in sys.argv:
+        rebuild_habit_stats()
+    elif '--benchmark-router' in sys.argv:
+        benchmark_router()
+    elif '--check-import-time' in sys.argv:
+        sys.exit(0 if check_import_time() else 1)
+    elif '--check-query-plans' in sys.argv:
+        sys.exit(1 if check_habit_query_plans() else 0)
+    else:
+        main()
 